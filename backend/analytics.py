@@ -0,0 +1,244 @@
+"""
+Incrementally maintained analytics: every ingested threat and response updates
+a set of counters so the overview is O(1) to serve regardless of history size.
+Rows moved to the archive are retired again, so the aggregates always describe
+the retained data.
+"""
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+import config
+
+HOURS_TRACKED = 24
+
+TREND_BUCKETS = {'day': 1, 'week': 7}
+
+
+def _hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class DailySeries:
+    """Per-day threat counts broken down by severity and type, with bounded retention"""
+
+    def __init__(self, retention_days=None):
+        self.retention_days = retention_days or config.TREND_RETENTION_DAYS
+        self.days = {}  # date -> {'count': int, 'severity': Counter, 'type': Counter}
+
+    def record(self, moment, severity, threat_type, delta=1):
+        day = moment.date()
+        bucket = self.days.get(day)
+        if bucket is None:
+            if delta < 0 or day <= date.today() - timedelta(days=self.retention_days):
+                return
+            bucket = self.days[day] = {'count': 0, 'severity': Counter(), 'type': Counter()}
+            self._prune()
+        bucket['count'] += delta
+        bucket['severity'][severity] += delta
+        bucket['type'][threat_type] += delta
+        if delta < 0:
+            bucket['severity'] += Counter()  # Drop categories that reached zero
+            bucket['type'] += Counter()
+            if bucket['count'] <= 0:
+                del self.days[day]
+
+    def _prune(self):
+        oldest = date.today() - timedelta(days=self.retention_days - 1)
+        for day in [day for day in self.days if day < oldest]:
+            del self.days[day]
+
+    def state(self):
+        """Marshal-able copy of the buckets (snapshots)"""
+        return {
+            day.isoformat(): {'count': bucket['count'], 'severity': dict(bucket['severity']),
+                              'type': dict(bucket['type'])}
+            for day, bucket in self.days.items()
+        }
+
+    def restore(self, state):
+        self.days = {
+            date.fromisoformat(day): {'count': bucket['count'], 'severity': Counter(bucket['severity']),
+                                      'type': Counter(bucket['type'])}
+            for day, bucket in state.items()
+        }
+        self._prune()
+
+    def trend(self, days, bucket_days, today=None):
+        """Oldest-first buckets of bucket_days days covering the last `days` days"""
+        today = today or date.today()
+        first = today - timedelta(days=days - 1)
+        trends = []
+
+        start = first
+        while start <= today:
+            end = min(start + timedelta(days=bucket_days - 1), today)
+            severity = Counter({name: 0 for name in config.THREAT_SEVERITIES})
+            types = Counter()
+            count = 0
+
+            day = start
+            while day <= end:
+                bucket = self.days.get(day)
+                if bucket:
+                    count += bucket['count']
+                    severity.update(bucket['severity'])
+                    types.update(bucket['type'])
+                day += timedelta(days=1)
+
+            entry = {
+                'date': start.isoformat(),
+                'count': count,
+                'severity': dict(severity),
+                'types': dict(types)
+            }
+            if bucket_days > 1:
+                entry['endDate'] = end.isoformat()
+            trends.append(entry)
+            start = end + timedelta(days=1)
+
+        return trends
+
+
+class AnalyticsAggregator:
+    """Severity/type/status counters, rolling hourly buckets and response success ratio"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total_threats = 0
+        self.user_submitted = 0
+        self.severity_counts = Counter()
+        self.type_counts = Counter()
+        self.status_counts = Counter()
+        self.hourly_counts = Counter()  # hour start -> threats seen in that hour
+        self.total_responses = 0
+        self.successful_responses = 0
+        self.daily = DailySeries()
+
+    def record_threat(self, threat, delta=1):
+        """Fold one ingested threat into the aggregates (delta=-1 takes it back out)"""
+        moment = datetime.fromisoformat(threat['timestamp'])
+        hour = _hour_start(moment)
+
+        with self.lock:
+            self.total_threats += delta
+            if threat.get('userSubmitted'):
+                self.user_submitted += delta
+            self.severity_counts[threat['severity']] += delta
+            self.type_counts[threat['type']] += delta
+            self.status_counts[threat['status']] += delta
+            if hour in self.hourly_counts or delta > 0:
+                self.hourly_counts[hour] += delta
+            self.daily.record(moment, threat['severity'], threat['type'], delta)
+
+    def record_response(self, response_log, delta=1):
+        """Fold one automated response into the aggregates (delta=-1 takes it back out)"""
+        with self.lock:
+            self.total_responses += delta
+            if response_log['status'] == 'Success':
+                self.successful_responses += delta
+
+    def retire(self, threats=(), responses=()):
+        """Remove rows that left the retained window (archived) from the aggregates"""
+        for threat in threats:
+            self.record_threat(threat, -1)
+        for response_log in responses:
+            self.record_response(response_log, -1)
+
+        with self.lock:
+            # Keep distributions free of categories that no longer occur
+            self.severity_counts += Counter()
+            self.type_counts += Counter()
+            self.status_counts += Counter()
+            self.hourly_counts += Counter()
+
+    def _prune_hours(self, now):
+        """Drop hourly buckets that have rolled out of the window"""
+        oldest = _hour_start(now) - timedelta(hours=HOURS_TRACKED - 1)
+        for hour in [hour for hour in self.hourly_counts if hour < oldest]:
+            del self.hourly_counts[hour]
+
+    def overview(self, now=None):
+        """Current aggregates in the shape served by /api/analytics/overview"""
+        now = now or datetime.now()
+        current_hour = _hour_start(now)
+
+        with self.lock:
+            self._prune_hours(now)
+            # Oldest hour first so the chart reads left to right
+            hourly_trends = {}
+            for offset in range(HOURS_TRACKED - 1, -1, -1):
+                hour = current_hour - timedelta(hours=offset)
+                hourly_trends[hour.strftime('%H:00')] = self.hourly_counts.get(hour, 0)
+
+            response_rate = round(
+                (self.successful_responses / self.total_responses * 100) if self.total_responses > 0 else 0, 2
+            )
+
+            return {
+                'totalThreats': self.total_threats,
+                'userSubmittedThreats': self.user_submitted,
+                'blockedThreats': self.status_counts.get('Blocked', 0),
+                'activeMonitoring': self.status_counts.get('Monitoring', 0),
+                'severityDistribution': dict(self.severity_counts),
+                'threatTypeDistribution': dict(self.type_counts),
+                'hourlyTrends': hourly_trends,
+                'responseEffectiveness': response_rate
+            }
+
+    def trend(self, days, bucket='day'):
+        """Threat trend over the last `days` days in day or week buckets"""
+        with self.lock:
+            return self.daily.trend(days, TREND_BUCKETS[bucket])
+
+    def state(self):
+        """Marshal-able copy of every aggregate (snapshots)"""
+        with self.lock:
+            return {
+                'totalThreats': self.total_threats,
+                'userSubmitted': self.user_submitted,
+                'severity': dict(self.severity_counts),
+                'type': dict(self.type_counts),
+                'status': dict(self.status_counts),
+                'hourly': {hour.isoformat(): count for hour, count in self.hourly_counts.items()},
+                'totalResponses': self.total_responses,
+                'successfulResponses': self.successful_responses,
+                'daily': self.daily.state()
+            }
+
+    def restore(self, state):
+        """Replace the aggregates with a state() copy"""
+        with self.lock:
+            self.total_threats = state['totalThreats']
+            self.user_submitted = state['userSubmitted']
+            self.severity_counts = Counter(state['severity'])
+            self.type_counts = Counter(state['type'])
+            self.status_counts = Counter(state['status'])
+            self.hourly_counts = Counter({
+                datetime.fromisoformat(hour): count for hour, count in state['hourly'].items()
+            })
+            self.total_responses = state['totalResponses']
+            self.successful_responses = state['successfulResponses']
+            self.daily.restore(state['daily'])
+
+    @classmethod
+    def recompute(cls, threats, responses):
+        """Build aggregates from scratch over the full stores (for consistency checks)"""
+        aggregator = cls()
+        for threat in threats:
+            aggregator.record_threat(threat)
+        for response_log in responses:
+            aggregator.record_response(response_log)
+        return aggregator
+
+    def compare(self, other, now=None):
+        """Fields whose values differ between two aggregators' overviews"""
+        now = now or datetime.now()
+        mine = self.overview(now)
+        theirs = other.overview(now)
+        mine['dailyTrend'] = self.trend(config.TREND_RETENTION_DAYS)
+        theirs['dailyTrend'] = other.trend(config.TREND_RETENTION_DAYS)
+        return [
+            {'field': field, 'incremental': mine[field], 'recomputed': theirs[field]}
+            for field in mine
+            if mine[field] != theirs[field]
+        ]
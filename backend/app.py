@@ -1,23 +1,60 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from datetime import datetime
 import atexit
+import os
+import threading
+import time
 from database import init_db, get_db, close_db
 from services import background_services
+from pagination import parse_history_query, FILTER_FIELDS, MAX_PAGE_SIZE
+from ledger import load_verifier, verify_ledger, find_inclusion_proof
+from analytics import TREND_BUCKETS
+from events import event_broker, sse_response
+from response_cache import response_cache, install_json_provider
+from compression import init_compression
+from exports import export_response
+from enforcement import init_enforcement, BLOCK, parse_duration
+from auth import admin_denied, require_admin
+from archive import archive, RETENTION_DAYS
+from mongo_repository import MongoRepository
+import mongo_analytics
+import mongo_archive
 import config
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend access
+install_json_provider(app)
+init_compression(app)
 
-# Initialize MongoDB
-db = init_db()
+# MongoDB and the background services are started per process by start_services(),
+# never at import: a MongoClient and threads do not survive gunicorn forking its
+# workers, and the debug reloader's parent process only watches files
+repository = None  # Same collections app_enhanced.py uses with STORAGE_BACKEND = 'mongo'
+services_lock = threading.Lock()
 
-# Start background services
-background_services.start()
+def start_services():
+    """Connect to MongoDB and start this process's background services (once per process)"""
+    global repository
+    with services_lock:
+        if repository is not None:
+            return
+        # Nodes and AI status are seeded by whichever process wins the leader lease
+        db = init_db(static_data=False)
+        repository = MongoRepository(db)
+        background_services.start(repository)
+        atexit.register(cleanup)
+
+@app.before_request
+def ensure_services():
+    # Under any WSGI server the first request starts the process (gunicorn.conf.py does it sooner)
+    if repository is None:
+        start_services()
+
+init_enforcement(app, background_services.enforcement)
 
-# Cleanup on shutdown
-@atexit.register
 def cleanup():
+    """Stop the background services (handing the leader lease over) and disconnect"""
     background_services.stop()
     close_db()
 
@@ -35,16 +72,13 @@ def home():
     })
 
 @app.route('/api/live-threats')
+@response_cache.cached(config.COLLECTIONS['LIVE_THREATS'])
 def get_live_threats():
     """
     GET /api/live-threats
-    Returns the last 10 dummy threats from MongoDB
+    Returns the last 10 dummy threats from the in-process live window
     """
-    db = get_db()
-    live_threats = list(db[config.COLLECTIONS['LIVE_THREATS']].find(
-        {},
-        {'_id': 0}  # Exclude MongoDB _id field
-    ).sort('timestamp', -1).limit(10))
+    live_threats = background_services.get_live_threats()
     
     return jsonify({
         'success': True,
@@ -52,25 +86,96 @@ def get_live_threats():
         'threats': live_threats
     })
 
+@app.route('/api/stream')
+def stream_events():
+    """
+    GET /api/stream
+    Server-Sent Events: threat, block, response and node deltas as they happen.
+    Reconnects resume from Last-Event-ID; a 'resync' event means refetch via REST.
+    """
+    return sse_response(event_broker, request)
+
 @app.route('/api/threat-history')
+@response_cache.cached(config.COLLECTIONS['THREAT_HISTORY'])
 def get_threat_history():
     """
     GET /api/threat-history
-    Returns all stored dummy threats from MongoDB
+    Returns one page of stored threats, newest first.
+    Query: limit, cursor (from nextCursor), severity, type, nodeId, ip, since, until
     """
-    db = get_db()
-    threat_history = list(db[config.COLLECTIONS['THREAT_HISTORY']].find(
-        {},
-        {'_id': 0}
-    ).sort('timestamp', -1).limit(100))  # Limit to last 100 for performance
+    try:
+        threat_history, next_cursor = repository.threat_page(parse_history_query(request.args))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
         'count': len(threat_history),
-        'threats': threat_history
+        'threats': threat_history,
+        'nextCursor': next_cursor,
+        'hasMore': next_cursor is not None
+    })
+
+@app.route('/api/threats/<threat_id>')
+def get_threat(threat_id):
+    """
+    GET /api/threats/<threat_id>
+    Returns one stored threat (unique threatId index lookup) and the block holding it
+    """
+    threat = repository.get_threat(threat_id)
+    if threat is None:
+        return jsonify({
+            'success': False,
+            'error': 'Threat not found (archived threats are served by /api/archive/threat-history)'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'threat': threat,
+        'blockNumber': repository.block_number_of(threat_id)  # None until its block is sealed
+    })
+
+@app.route('/api/ip/<addr>')
+def get_ip_reputation(addr):
+    """
+    GET /api/ip/<addr>
+    Returns threats, severities and responses recorded for one IP address
+    """
+    try:
+        stats = background_services.ip_index.lookup(addr)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if stats is None:
+        return jsonify({'success': False, 'error': 'No threats or responses recorded for this address'}), 404
+    
+    return jsonify({
+        'success': True,
+        'ip': addr,
+        'stats': stats,
+        # False while the rows stored before startup are still being counted
+        'complete': background_services.ip_index_loaded.is_set()
+    })
+
+@app.route('/api/cidr/<path:prefix>')
+def get_network_reputation(prefix):
+    """
+    GET /api/cidr/<prefix>
+    Returns totals for every address in an IPv4 CIDR prefix, e.g. /api/cidr/10.0.0.0/8
+    """
+    try:
+        stats = background_services.ip_index.network(prefix)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'prefix': prefix,
+        'stats': stats,
+        'complete': background_services.ip_index_loaded.is_set()
     })
 
 @app.route('/api/blockchain-ledger')
+@response_cache.cached(config.COLLECTIONS['BLOCKCHAIN_LEDGER'], config.COLLECTIONS['LEDGER_CHECKPOINT'])
 def get_blockchain_ledger():
     """
     GET /api/blockchain-ledger
@@ -79,26 +184,73 @@ def get_blockchain_ledger():
     db = get_db()
     blocks = list(db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].find(
         {},
-        {'_id': 0}
+        {'_id': 0, 'transactions': 0, 'threatIds': 0}  # Per-threat data is served by /proof
     ).sort('blockNumber', -1).limit(50))  # Last 50 blocks
     
+    # Status reflects the last verification checkpoint, not a stored constant
+    verifier = load_verifier()
+    for block in blocks:
+        block['verificationStatus'] = verifier.status_for(block)
+    
     return jsonify({
         'success': True,
         'totalBlocks': len(blocks),
         'blocks': blocks
     })
 
+@app.route('/api/blockchain-ledger/verify')
+def verify_blockchain_ledger():
+    """
+    GET /api/blockchain-ledger/verify
+    Verifies the hash chain and every Merkle root of the blocks appended since
+    the last checkpoint (?full=true rescans from genesis, admin only)
+    """
+    full = request.args.get('full', 'false').lower() == 'true'
+    if full:
+        # A rescan from genesis reads the whole ledger and archive: admins only
+        denied = admin_denied()
+        if denied:
+            return denied
+    result, verifier = verify_ledger(full=full)
+    
+    return jsonify({
+        'success': True,
+        'verification': result,
+        # The chain head counts archived blocks too
+        'blockchainIntegrity': verifier.integrity(background_services.chain_head.block_number)
+    })
+
+@app.route('/api/blockchain-ledger/proof/<threat_id>')
+def get_inclusion_proof(threat_id):
+    """
+    GET /api/blockchain-ledger/proof/<threat_id>
+    Returns the Merkle inclusion proof of a threat in its batch block
+    """
+    proof, archived = find_inclusion_proof(threat_id)
+    if proof and archived:
+        return jsonify({'success': True, 'archived': True, 'proof': proof})
+    if proof:
+        return jsonify({'success': True, 'proof': proof})
+    
+    # A stored threat without a block is still pending: in the leader's batch, or
+    # (after a change of leader) waiting for the new leader's ledger sweep
+    if threat_id in background_services.block_builder.pending_ids() or repository.get_threat(threat_id):
+        return jsonify({
+            'success': False,
+            'pending': True,
+            'message': 'Threat is waiting to be sealed into the next block'
+        }), 202
+    
+    return jsonify({'success': False, 'error': 'Threat not found in ledger'}), 404
+
 @app.route('/api/nodes-status')
+@response_cache.cached(config.COLLECTIONS['NODES_STATUS'])
 def get_nodes_status():
     """
     GET /api/nodes-status
     Returns 3 nodes with status information from MongoDB
     """
-    db = get_db()
-    nodes = list(db[config.COLLECTIONS['NODES_STATUS']].find(
-        {},
-        {'_id': 0}
-    ))
+    nodes = repository.list_nodes()
     
     return jsonify({
         'success': True,
@@ -107,16 +259,13 @@ def get_nodes_status():
     })
 
 @app.route('/api/ai-status')
+@response_cache.cached(config.COLLECTIONS['AI_STATUS'])
 def get_ai_status():
     """
     GET /api/ai-status
     Returns AI model status information from MongoDB
     """
-    db = get_db()
-    ai_status = db[config.COLLECTIONS['AI_STATUS']].find_one(
-        {},
-        {'_id': 0}
-    )
+    ai_status = repository.get_ai_status()
     
     return jsonify({
         'success': True,
@@ -124,16 +273,13 @@ def get_ai_status():
     })
 
 @app.route('/api/response-logs')
+@response_cache.cached(config.COLLECTIONS['RESPONSE_LOGS'])
 def get_response_logs():
     """
     GET /api/response-logs
     Returns automated response actions from MongoDB
     """
-    db = get_db()
-    logs = list(db[config.COLLECTIONS['RESPONSE_LOGS']].find(
-        {},
-        {'_id': 0}
-    ).sort('timestamp', -1).limit(50))  # Last 50 response logs
+    logs = repository.latest_responses(50)
     
     return jsonify({
         'success': True,
@@ -141,6 +287,302 @@ def get_response_logs():
         'logs': logs
     })
 
+@app.route('/api/ingest/metrics')
+def get_ingest_metrics():
+    """
+    GET /api/ingest/metrics
+    Returns batched ingest pipeline counters and flush latency
+    """
+    return jsonify({
+        'success': True,
+        'metrics': background_services.pipeline.get_metrics()
+    })
+
+@app.route('/api/scheduler/metrics')
+def get_scheduler_metrics():
+    """
+    GET /api/scheduler/metrics
+    Returns this process's periodic jobs: schedule, counters and run time histograms
+    """
+    return jsonify({
+        'success': True,
+        'process': background_services.lease.owner,
+        'leader': background_services.is_leader(),
+        'metrics': background_services.scheduler.metrics()
+    })
+
+# ==================== BULK EXPORTS ====================
+
+# dataset -> (collection, sort, projection); each sort is served by an index from init_db
+EXPORT_DATASETS = {
+    'threat-history': (
+        config.COLLECTIONS['THREAT_HISTORY'],
+        [('timestamp', 1), ('_id', 1)],
+        {'_id': 0, 'createdAt': 0}
+    ),
+    'blockchain-ledger': (
+        config.COLLECTIONS['BLOCKCHAIN_LEDGER'],
+        [('blockNumber', 1)],
+        {'_id': 0, 'transactions': 0, 'threatIds': 0}
+    ),
+    'response-logs': (
+        config.COLLECTIONS['RESPONSE_LOGS'],
+        [('timestamp', 1)],
+        {'_id': 0, 'createdAt': 0}
+    )
+}
+
+def export_rows(dataset):
+    """Cursor over a whole collection, fetched in export-sized batches"""
+    collection, sort, projection = EXPORT_DATASETS[dataset]
+    cursor = get_db()[collection].find({}, projection).sort(sort).batch_size(config.EXPORT_BATCH_ROWS)
+    if dataset != 'blockchain-ledger':
+        return cursor
+    
+    verifier = load_verifier()
+    return (dict(block, verificationStatus=verifier.status_for(block)) for block in cursor)
+
+@app.route('/api/export/<dataset>')
+def export_dataset(dataset):
+    """
+    GET /api/export/<dataset>?format=ndjson|columnar|arrow
+    Streams a whole collection (threat-history, blockchain-ledger, response-logs),
+    oldest first, compressed when the client accepts gzip or brotli
+    """
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown dataset: expected one of {', '.join(EXPORT_DATASETS)}"
+        }), 404
+    
+    try:
+        return export_response(export_rows(dataset), request.args.get('format', 'ndjson'), dataset)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+# ==================== ENFORCEMENT ====================
+
+@app.route('/api/enforcement')
+def get_enforcement():
+    """
+    GET /api/enforcement?limit=100
+    Returns active blocklist / rate-limit rules (latest expiry first) and counters
+    """
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit: expected an integer'}), 400
+    
+    return jsonify({
+        'success': True,
+        'rules': background_services.enforcement.active_rules(limit),
+        'metrics': background_services.enforcement.get_metrics()
+    })
+
+@app.route('/api/enforcement/check/<addr>')
+def check_enforcement(addr):
+    """
+    GET /api/enforcement/check/<addr>
+    Returns allow, block or throttle for a request from addr, without
+    counting it against addr's rate limit
+    """
+    return jsonify({'success': True, 'ip': addr, 'verdict': background_services.enforcement.verdict(addr)})
+
+@app.route('/api/enforcement/rules', methods=['POST'])
+@require_admin
+def add_enforcement_rule():
+    """
+    POST /api/enforcement/rules
+    Adds a manual rule: {"target": ip or CIDR, "action": "block"|"throttle", "duration": seconds}
+    (admin: Authorization: Bearer <ADMIN_TOKEN>)
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    
+    try:
+        duration = parse_duration(data.get('duration', 3600))
+        rule = background_services.enforcement.add_rule(
+            data.get('action', BLOCK),
+            data.get('target'),
+            time.time() + duration,
+            str(data.get('reason', 'Manual rule'))[:200]
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'rule': rule.to_dict()}), 201
+
+@app.route('/api/enforcement/rules/<action>/<path:target>', methods=['DELETE'])
+@require_admin
+def remove_enforcement_rule(action, target):
+    """
+    DELETE /api/enforcement/rules/<action>/<target>
+    Lifts a rule early (admin)
+    """
+    try:
+        removed = background_services.enforcement.remove_rule(action, target)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not removed:
+        return jsonify({'success': False, 'error': 'No such rule'}), 404
+    return jsonify({'success': True})
+
+# ==================== ARCHIVE ====================
+
+@app.route('/api/archive')
+def get_archive():
+    """
+    GET /api/archive
+    Returns retention settings and the archived day partitions per dataset
+    """
+    return jsonify({
+        'success': True,
+        'retentionDays': RETENTION_DAYS,
+        'partitions': {dataset: archive.partitions(dataset) for dataset in RETENTION_DAYS}
+    })
+
+@app.route('/api/archive/run', methods=['POST'])
+@require_admin
+def run_archiver():
+    """
+    POST /api/archive/run
+    Moves rows past retention to the archive now (admin, served by the leader only)
+    """
+    # Only the leader deletes rows, so a run never races its scheduled one in another process
+    if not background_services.is_leader():
+        return jsonify({
+            'success': False,
+            'leader': False,
+            'error': 'This process is not the leader; the archiver runs in the leader process'
+        }), 409
+    return jsonify({'success': True, 'archived': mongo_archive.archive_expired()})
+
+@app.route('/api/archive/<dataset>')
+def query_archive(dataset):
+    """
+    GET /api/archive/<dataset>?since=&until=&limit=
+    Returns archived rows oldest first (equality filters: severity, type, nodeId, ip),
+    or streams them all with ?format=ndjson|columnar|arrow
+    """
+    if dataset not in RETENTION_DAYS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown dataset: expected one of {', '.join(RETENTION_DAYS)}"
+        }), 404
+    
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit: expected an integer'}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'success': False, 'error': f'Invalid limit: must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    
+    rows = archive.query(
+        dataset,
+        request.args.get('since'),
+        request.args.get('until'),
+        {field: request.args[field] for field in FILTER_FIELDS if field in request.args}
+    )
+    
+    if 'format' in request.args:
+        try:
+            return export_response(rows, request.args['format'], f"{dataset}-archive")
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    
+    results = []
+    for row in rows:
+        results.append(row)
+        if len(results) == limit:
+            break
+    return jsonify({
+        'success': True,
+        'count': len(results),
+        'rows': results
+    })
+
+@app.route('/api/cache/metrics')
+def get_cache_metrics():
+    """
+    GET /api/cache/metrics
+    Returns response cache hit, miss and 304 counters
+    """
+    return jsonify({
+        'success': True,
+        'metrics': response_cache.get_metrics()
+    })
+
+
+# ==================== ANALYTICS ====================
+
+@app.route('/api/analytics/overview')
+@response_cache.cached(
+    config.COLLECTIONS['THREAT_HISTORY'],
+    config.COLLECTIONS['THREAT_ROLLUPS'],
+    config.COLLECTIONS['RESPONSE_LOGS'],
+    config.COLLECTIONS['NODES_STATUS'],
+    config.COLLECTIONS['BLOCKCHAIN_LEDGER'],
+    config.COLLECTIONS['LEDGER_CHECKPOINT']
+)  # TTL covers hourlyTrends rolling over
+def get_analytics_overview():
+    """
+    GET /api/analytics/overview
+    Returns threat distributions, hourly trends and response effectiveness,
+    computed by aggregation pipelines inside MongoDB
+    """
+    db = get_db()
+    overview = mongo_analytics.overview()
+    
+    nodes = list(db[config.COLLECTIONS['NODES_STATUS']].find(
+        {},
+        {'_id': 0, 'nodeId': 1, 'location': 1, 'threatsDetected': 1, 'uptime': 1}
+    ))
+    
+    # Ledger integrity from the incremental verifier (only new blocks are hashed)
+    _, verifier = verify_ledger()
+    total_blocks = background_services.chain_head.block_number
+    
+    return jsonify({
+        'success': True,
+        'analytics': dict(
+            overview,
+            nodePerformance=nodes,
+            blockchainIntegrity=verifier.integrity(total_blocks)
+        )
+    })
+
+@app.route('/api/analytics/threats-trend')
+@response_cache.cached(config.COLLECTIONS['THREAT_HISTORY'], config.COLLECTIONS['THREAT_ROLLUPS'])
+def get_threats_trend():
+    """
+    GET /api/analytics/threats-trend?days=7&bucket=day|week
+    Returns per-bucket threat counts with severity and type breakdowns
+    """
+    try:
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid days: expected an integer'}), 400
+    bucket = request.args.get('bucket', 'day')
+    
+    if not 1 <= days <= config.TREND_RETENTION_DAYS:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid days: must be between 1 and {config.TREND_RETENTION_DAYS}'
+        }), 400
+    if bucket not in TREND_BUCKETS:
+        return jsonify({
+            'success': False,
+            'error': f"Invalid bucket: expected one of {', '.join(TREND_BUCKETS)}"
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'days': days,
+        'bucket': bucket,
+        'trends': mongo_analytics.trend(days, TREND_BUCKETS[bucket])  # Oldest first
+    })
+
 
 # ==================== ERROR HANDLERS ====================
 
@@ -170,11 +612,30 @@ if __name__ == '__main__':
     print("=" * 60)
     print("\nAvailable Endpoints:")
     print("  GET /api/live-threats       - Last 10 dummy threats")
-    print("  GET /api/threat-history     - All stored threats")
+    print("  GET /api/stream             - Live push stream (SSE)")
+    print("  GET /api/threat-history     - Stored threats (paginated, filterable)")
+    print("  GET /api/threats/<id>       - One threat by ID")
+    print("  GET /api/ip/<addr>          - IP reputation")
+    print("  GET /api/cidr/<prefix>      - Network reputation (IPv4 CIDR)")
+    print("  GET /api/enforcement[/check/<ip>] - Blocklist, rate limits and verdicts")
+    print("  POST /api/enforcement/rules - Manual block / rate limit (DELETE to lift, admin)")
     print("  GET /api/blockchain-ledger  - Simulated blockchain blocks")
+    print("  GET /api/blockchain-ledger/verify - Incremental chain verification")
+    print("  GET /api/blockchain-ledger/proof/<id> - Merkle inclusion proof")
     print("  GET /api/nodes-status       - Node status information")
     print("  GET /api/ai-status          - AI model status")
     print("  GET /api/response-logs      - Automated response actions")
+    print("  GET /api/analytics/overview - Aggregated analytics")
+    print("  GET /api/analytics/threats-trend - Daily/weekly trends")
+    print("  GET /api/ingest/metrics     - Ingest pipeline metrics")
+    print("  GET /api/scheduler/metrics  - Background job timings")
+    print("  GET /api/cache/metrics      - Response cache metrics")
+    print("  GET /api/export/<dataset>   - Streamed bulk export (ndjson/columnar/arrow)")
+    print("  GET /api/archive[/<dataset>] - Archived partitions / on-demand archive query")
+    print("  POST /api/archive/run       - Run the retention archiver now (admin, leader)")
     print("=" * 60)
     
+    # Only in the serving process: with debug=True the reloader's parent just watches files
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_services()
     app.run(debug=True, host='0.0.0.0', port=5001)
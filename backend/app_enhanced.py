@@ -2,173 +2,466 @@ from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import random
-import hashlib
 import io
-from collections import Counter
+import os
+import atexit
+import gc
+import threading
+import time
+import queue
+from itertools import chain, islice
+import config
+from stores import LiveWindow
+from records import ThreatRecord, ResponseRecord
+from repository import open_repository, by_time
+from simulation import generate_threat, generate_response
+from pagination import parse_history_query, FILTER_FIELDS, MAX_PAGE_SIZE
+from analytics import AnalyticsAggregator, TREND_BUCKETS
+from blockchain import GENESIS_HASH, BlockBuilder, LedgerVerifier, block_event, inclusion_proof
+from events import event_broker, sse_response, ChangeTracker
+from response_cache import response_cache, install_json_provider
+from compression import init_compression
+from exports import export_response
+from archive import Archive, RETENTION_DAYS, retention_cutoff
+from ids import new_id
+from ip_index import IpIndex
+from enforcement import EnforcementEngine, init_enforcement, BLOCK, parse_duration
+from auth import admin_denied, require_admin
+from submissions import SubmissionQueue, validate_submission, coerce_submission, parse_batch
+from snapshot import SnapshotReader, SnapshotError, write_snapshot, split_hot, split_chunks
+from scheduler import Scheduler
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend access
+install_json_provider(app)
+init_compression(app)
 
-# ==================== IN-MEMORY DATA STORES (No DB) ====================
-
-threat_history = []
-live_threats = []
-blockchain_ledger = []
-response_logs = []
-user_submitted_threats = []
-
-# Static data
-nodes_status = [
-    {'nodeId': 'Node-A', 'location': 'Bangalore', 'status': 'Online', 'threatsDetected': 0, 'uptime': '99.9%', 'latency': '25ms'},
-    {'nodeId': 'Node-B', 'location': 'Mumbai', 'status': 'Online', 'threatsDetected': 0, 'uptime': '99.8%', 'latency': '30ms'},
-    {'nodeId': 'Node-C', 'location': 'Delhi', 'status': 'Online', 'threatsDetected': 0, 'uptime': '99.7%', 'latency': '28ms'}
-]
-
-ai_status = {
-    'modelType': 'Anomaly Detection Neural Network',
-    'accuracy': 93.5,
-    'trainingStatus': 'Active',
-    'lastRetrainTime': (datetime.now() - timedelta(days=2)).isoformat(),
-    'modelVersion': '2.1.4',
-    'activeModels': ['DDoS Detector', 'Malware Classifier', 'Anomaly Detector'],
-    'threatsAnalyzed': 0,
-    'falsePositiveRate': 1.5,
-    'nextRetrainScheduled': (datetime.now() + timedelta(hours=12)).isoformat()
-}
+# Cache invalidation sources (named after the MongoDB collections they mirror)
+THREATS = config.COLLECTIONS['THREAT_HISTORY']
+LIVE = config.COLLECTIONS['LIVE_THREATS']
+BLOCKS = config.COLLECTIONS['BLOCKCHAIN_LEDGER']
+CHECKPOINT = config.COLLECTIONS['LEDGER_CHECKPOINT']
+RESPONSES = config.COLLECTIONS['RESPONSE_LOGS']
+
+# ==================== DATA STORES ====================
+
+# Threats, ledger, response logs, nodes and AI status live in the repository
+# chosen by config.STORAGE_BACKEND (in-memory stores by default, see repository.py)
+repository = open_repository()
+live_threats = LiveWindow(config.LIVE_THREATS_LIMIT, key=by_time('threatId'))
 
-# Configuration
-THREAT_TYPES = ['DDoS Attack', 'SQL Injection', 'XSS Attack', 'Brute Force', 'Malware Detection', 
-                'Port Scanning', 'Phishing Attempt', 'Zero-Day Exploit', 'Ransomware', 'Data Exfiltration']
-THREAT_SEVERITIES = ['Critical', 'High', 'Medium', 'Low']
-THREAT_SOURCES = ['External', 'Internal', 'Unknown']
-THREAT_STATUSES = ['Blocked', 'Isolated', 'Monitoring', 'Mitigated']
+# Single-writer lock: one threat is ingested (history, ledger, responses,
+# counters) at a time so block numbers and the previousHash chain stay intact
+write_lock = threading.RLock()
 
 block_counter = 1
+ledger_verifier = LedgerVerifier()
+ip_index = IpIndex()  # per-IP and per-network threat/response stats
+enforcement = EnforcementEngine()  # blocklist / rate limits from automated responses
+init_enforcement(app, enforcement)
+analytics = AnalyticsAggregator()  # updated on every ingested threat/response
+scheduler = Scheduler(name='app')  # periodic archiver and snapshot jobs, started by start_background()
+# Rows past retention. In-memory rows live only as long as the process (or its
+# snapshots), so without snapshots each run archives to its own directory.
+if repository.persistent or config.SNAPSHOT_ENABLED:
+    archive = Archive(os.path.join(config.ARCHIVE_DIR, repository.name))
+else:
+    archive = Archive(os.path.join(config.ARCHIVE_DIR, 'memory', datetime.now().strftime('%Y%m%d-%H%M%S')))
 
 # ==================== HELPER FUNCTIONS ====================
 
-def generate_random_ip():
-    return f"{random.randint(1, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 255)}"
-
-def generate_threat_hash(threat_type, timestamp):
-    data = f"{threat_type}{timestamp}{random.random()}"
-    return hashlib.sha256(data.encode()).hexdigest()[:16]
-
-def generate_realistic_threat():
-    """Generate realistic threat with proper metadata"""
-    threat_type = random.choice(THREAT_TYPES)
-    severity = random.choice(THREAT_SEVERITIES)
-    source_ip = generate_random_ip()
-    timestamp = datetime.now()
-    node = random.choice(nodes_status)
-    
-    threat = {
-        'threatId': f"THR-{random.randint(1000, 9999)}",
-        'type': threat_type,
-        'severity': severity,
-        'source': random.choice(THREAT_SOURCES),
-        'ip': source_ip,
-        'timestamp': timestamp.isoformat(),
-        'status': random.choice(THREAT_STATUSES),
-        'description': f'Suspicious {threat_type.lower()} activity detected from {source_ip}',
-        'nodeId': node['nodeId'],
-        'location': node['location'],
-        'protocol': random.choice(['TCP', 'UDP', 'HTTP', 'HTTPS']),
-        'port': random.choice([80, 443, 22, 3389, 8080, 3306]),
-        'attackVector': random.choice(['Network', 'Application', 'System', 'Database']),
-        'confidence': round(random.uniform(75, 99), 2)
-    }
+def append_block(build_block):
+    """Link a sealed batch block to the end of the ledger"""
+    global block_counter
+    
+    with write_lock:
+        last_block = repository.last_block()
+        previous_hash = last_block['currentHash'] if last_block else GENESIS_HASH
+        block = build_block(block_counter, previous_hash)
+        
+        repository.append_block(block)
+        block_counter += 1
     
-    return threat
+    response_cache.bump(BLOCKS)
+    event_broker.publish('block', block_event(block))
+    return block
+
+block_builder = BlockBuilder(append_block)
 
 def create_blockchain_block(threat):
-    """Create blockchain block for threat"""
+    """Add threat to the pending Merkle block; returns the block number it will land in"""
+    with write_lock:
+        block = block_builder.add(threat, threat['nodeId'])
+        return block['blockNumber'] if block else block_counter
+
+def seal_due_blocks():
+    """Seal the pending block if its interval has elapsed"""
+    # write_lock first, then the builder's lock: the same order as the ingest path
+    with write_lock:
+        block_builder.tick()
+
+def ingest_threat(threat, live=True):
+    """
+    Single write path for a new threat: history, live window, analytics,
+    blockchain and automated response. Returns (block_number, response_log).
+    """
+    return ingest_threats([threat], live)[0]
+
+def ingest_threats(threats, live=True):
+    """ingest_threat for a batch under one write_lock acquisition; one result per threat"""
+    results = []
+    # One repository transaction for the threats, blocks, responses and counters
+    with write_lock, repository.batch():
+        for threat in threats:
+            # Stamped under the lock so concurrent submissions reach the history in time order
+            threat.setdefault('timestamp', datetime.now().isoformat())
+        # The batch is stored first, so the blocks sealed below only name stored threats
+        repository.add_threats(threats)
+        
+        detected = {}
+        for threat in threats:
+            analytics.record_threat(threat)
+            ip_index.record_threat(threat)
+            if live:
+                live_threats.append(ThreatRecord.from_dict(threat))
+            detected[threat['nodeId']] = detected.get(threat['nodeId'], 0) + 1
+            
+            block_number = create_blockchain_block(threat)
+            response = generate_automated_response(threat)
+            results.append((block_number, response))
+        
+        response_logs = [response for _, response in results if response]
+        repository.add_responses(response_logs)
+        for node_id, count in detected.items():
+            repository.update_node(node_id, increments={'threatsDetected': count})
+        repository.update_ai_status({'updatedAt': datetime.now().isoformat()}, {'threatsAnalyzed': len(threats)})
+    
+    response_cache.bump(THREATS)
+    if live:
+        response_cache.bump(LIVE)
+    if response_logs:
+        response_cache.bump(RESPONSES)
+    for threat in threats:
+        event_broker.publish('threat', threat)
+    for response_log in response_logs:
+        event_broker.publish('response', response_log)
+    return results
+
+def generate_automated_response(threat):
+    """Automated response to a threat, if its severity calls for one; the caller stores it"""
+    response_log = generate_response(threat)
+    if response_log is not None:
+        analytics.record_response(response_log)
+        ip_index.record_response(response_log)
+        enforcement.apply_response(response_log)
+    return response_log
+
+def load_from_repository():
+    """Rebuild the in-process indexes from a persistent backend that already holds data"""
     global block_counter
     
-    threat_hash = generate_threat_hash(threat['type'], threat['timestamp'])
-    previous_hash = blockchain_ledger[-1]['currentHash'] if blockchain_ledger else '0' * 16
-    
-    block = {
-        'blockNumber': block_counter,
-        'threatHash': threat_hash,
-        'currentHash': generate_threat_hash(str(block_counter), threat_hash),
-        'previousHash': previous_hash,
-        'threatType': threat['type'],
-        'threatId': threat['threatId'],
-        'timestamp': threat['timestamp'],
-        'verificationStatus': '✅ Verified',
-        'nodeId': threat['nodeId'],
-        'severity': threat['severity'],
-        'minedBy': threat['nodeId'],
-        'transactionCount': 1
-    }
+    for threat in repository.iter_threats():
+        analytics.record_threat(threat)
+        ip_index.record_threat(threat)
+    # Only responses recent enough to still be in force become enforcement rules
+    for response_log in repository.iter_responses():
+        analytics.record_response(response_log)
+        ip_index.record_response(response_log)
+        enforcement.apply_response(response_log)
     
-    blockchain_ledger.append(block)
-    block_counter += 1
-    return block
+    latest, _ = repository.threat_page(parse_history_query({'limit': config.LIVE_THREATS_LIMIT}))
+    for threat in reversed(latest):
+        live_threats.append(ThreatRecord.from_dict(threat))
+    
+    last_block = repository.last_block()
+    if last_block:
+        block_counter = last_block['blockNumber'] + 1
+    print(f"📂 Loaded {repository.count_threats()} threats, {repository.count_responses()} responses "
+          f"and {repository.count_blocks()} blocks from the {repository.name} repository")
 
-def generate_automated_response(threat):
-    """Generate automated response based on severity"""
-    actions = {
-        'Critical': ['IP Blocked', 'Firewall Rule Updated', 'Port Closed', 'Session Terminated'],
-        'High': ['IP Blocked', 'Firewall Rule Updated', 'Alert Sent'],
-        'Medium': ['Traffic Throttled', 'Rate Limit Applied', 'Alert Sent'],
-        'Low': ['Alert Sent', 'Monitoring Enabled']
+# ==================== SNAPSHOTS ====================
+
+snapshot_path = os.path.join(config.SNAPSHOT_DIR, f"snapshot-{repository.name}.bin")
+# Set once every restored row is back in the stores (the memory backend loads cold history in the background)
+history_loaded = threading.Event()
+# (reader, state) of a restore whose cold history is still to load; see wait_for_history
+cold_history = None
+cold_history_lock = threading.Lock()
+# One writer of the snapshot file at a time (scheduled, after archiving, at exit)
+snapshot_lock = threading.Lock()
+
+def save_snapshot():
+    """
+    Write the in-process state to the snapshot file: counters, indexes, live
+    window, pending block and, for the memory backend, every row. The state is
+    captured under write_lock; encoding and writing happen after it is released.
+    """
+    wait_for_history()  # Taken mid-restore, a snapshot would miss the cold rows
+    with snapshot_lock:
+        _save_snapshot()
+
+def _save_snapshot():
+    started = time.perf_counter()
+    with write_lock:
+        state = {
+            'backend': repository.name,
+            'blockCounter': block_counter,
+            'checkpoint': dict(ledger_verifier.checkpoint),
+            'live': [threat.to_dict() for threat in live_threats.snapshot()],
+            'pending': block_builder.pending_threats(),
+            'enforcement': enforcement.state()
+        }
+        sections = {'state': state, 'analytics': analytics.state(), 'ipIndex': ip_index.state()}
+        if repository.persistent:
+            # Where a restore resumes replaying rows written after the snapshot
+            newest, _ = repository.threat_page(parse_history_query({'limit': 1}))
+            state['after'] = {
+                'threats': replay_mark(repository.iter_threats, newest, 'threatId'),
+                'responses': replay_mark(repository.iter_responses, repository.latest_responses(1), 'logId')
+            }
+        else:
+            views = repository.snapshot_views()
+    
+    if not repository.persistent:
+        state['nodes'] = views['nodes']
+        state['aiStatus'] = views['aiStatus']
+        state['segmentSize'] = config.STORE_SEGMENT_SIZE
+        state['coldChunks'] = {}
+        # A block weighs about as much as the threats it holds
+        per_block = config.BLOCK_MAX_TRANSACTIONS
+        for name, encode, hot_rows, chunk_rows in (
+            ('threats', ThreatRecord.to_columns, config.SNAPSHOT_HOT_ROWS, config.SNAPSHOT_COLD_CHUNK_ROWS),
+            ('responses', ResponseRecord.to_columns, config.SNAPSHOT_HOT_ROWS, config.SNAPSHOT_COLD_CHUNK_ROWS),
+            ('blocks', list, max(config.SNAPSHOT_HOT_ROWS // per_block, 1), config.SNAPSHOT_COLD_CHUNK_ROWS // per_block)
+        ):
+            cold, hot = split_hot(list(views[name]), hot_rows, config.STORE_SEGMENT_SIZE)
+            sections[name] = encode(hot)
+            chunks = split_chunks(cold, chunk_rows, config.STORE_SEGMENT_SIZE)
+            for index, chunk in enumerate(chunks):
+                sections[f'{name}Cold{index}'] = encode(chunk)
+            state['coldChunks'][name] = len(chunks)
+    
+    size = write_snapshot(snapshot_path, sections)
+    print(f"📸 Snapshot written: {size / 1e6:.1f} MB in {time.perf_counter() - started:.2f}s")
+
+def replay_mark(rows_after, newest, id_field):
+    """
+    Replay position for one dataset: SNAPSHOT_REPLAY_OVERLAP before its newest
+    row, plus the ids from there on that the snapshot already counts. Rows are
+    not always stored in (timestamp, id) order (batched ingest, other writers,
+    re-sequenced log keys), so a restore re-reads the overlap and skips these.
+    """
+    if not newest:
+        return None
+    since = (datetime.fromisoformat(newest[0]['timestamp'])
+             - timedelta(seconds=config.SNAPSHOT_REPLAY_OVERLAP)).isoformat(timespec='microseconds')
+    return {
+        'since': since,
+        'newest': newest[0][id_field],
+        'seen': [row[id_field] for row in rows_after([since, ''])]
     }
+
+def replay_rows(rows_after, mark, id_field):
+    """Rows written after the snapshot that produced mark (every row without one)"""
+    if mark is None:
+        yield from rows_after()
+        return
+    seen = set(mark['seen'])
+    for row in rows_after([mark['since'], '']):
+        if row[id_field] not in seen:
+            yield row
+
+def restore_snapshot():
+    """
+    Boot from the snapshot file instead of rebuilding. Persistent backends get
+    their counters back and replay only the rows written after the snapshot;
+    the memory backend gets its newest rows back now and the rest from a
+    background thread. Returns False when there is no usable snapshot.
+    """
+    global block_counter, cold_history
+    if not config.SNAPSHOT_ENABLED or not os.path.exists(snapshot_path):
+        return False
+    started = time.perf_counter()
     
-    if threat['severity'] in ['Critical', 'High'] or (threat['severity'] == 'Medium' and random.random() < 0.7):
-        action = random.choice(actions.get(threat['severity'], ['Alert Sent']))
-        
-        response_log = {
-            'logId': f"LOG-{random.randint(1000, 9999)}",
-            'action': action,
-            'targetIp': threat['ip'],
-            'threatType': threat['type'],
-            'threatId': threat['threatId'],
-            'timestamp': datetime.now().isoformat(),
-            'status': 'Success' if random.random() > 0.1 else 'Pending',
-            'nodeId': threat['nodeId'],
-            'severity': threat['severity'],
-            'responseTime': f"{random.randint(10, 500)}ms",
-            'automated': True
-        }
-        
-        response_logs.append(response_log)
-        return response_log
-    return None
+    try:
+        reader = SnapshotReader(snapshot_path)
+        state = reader.load('state')
+        if state['backend'] != repository.name:
+            return False
+        if repository.persistent:
+            after = state['after']
+            # The repository was reset or replaced since: the counters describe other data
+            if after['threats'] and repository.get_threat(after['threats']['newest']) is None:
+                print("⚠️  Snapshot does not match the repository; rebuilding instead")
+                return False
+        else:
+            threats = ThreatRecord.from_columns(reader.load('threats'))
+            responses = ResponseRecord.from_columns(reader.load('responses'))
+            blocks = reader.load('blocks')
+            cold = state['segmentSize'] != config.STORE_SEGMENT_SIZE
+            if cold:
+                # The cold rows only fit in front as whole segments of the size they were cut to
+                threats = load_cold(reader, state, 'threats') + threats
+                responses = load_cold(reader, state, 'responses') + responses
+                blocks = load_cold(reader, state, 'blocks') + blocks
+        analytics_state = reader.load('analytics')
+        ip_state = reader.load('ipIndex')
+    except (OSError, KeyError, SnapshotError) as e:
+        print(f"⚠️  Snapshot not restored ({e}); rebuilding instead")
+        return False
+    
+    if not repository.persistent:
+        repository.restore(threats, responses, blocks, state['nodes'], state['aiStatus'])
+    analytics.restore(analytics_state)
+    ip_index.restore(ip_state)
+    enforcement.restore(state['enforcement'])
+    ledger_verifier.checkpoint = dict(state['checkpoint'])
+    for threat in state['live']:
+        live_threats.append(ThreatRecord.from_dict(threat))
+    
+    pending = state['pending']
+    if repository.persistent:
+        # Rows written between the snapshot and the shutdown
+        caught_up = 0
+        for threat in replay_rows(repository.iter_threats, state['after']['threats'], 'threatId'):
+            analytics.record_threat(threat)
+            ip_index.record_threat(threat)
+            live_threats.append(ThreatRecord.from_dict(threat))
+            pending.append(threat)
+            caught_up += 1
+        for response_log in replay_rows(repository.iter_responses, state['after']['responses'], 'logId'):
+            analytics.record_response(response_log)
+            ip_index.record_response(response_log)
+            enforcement.apply_response(response_log)
+        pending = [threat for threat in pending if repository.block_number_of(threat['threatId']) is None]
+        print(f"📂 Caught up {caught_up} threats written after the snapshot")
+    
+    last_block = repository.last_block()
+    block_counter = last_block['blockNumber'] + 1 if last_block else state['blockCounter']
+    # Threats that were waiting for a block when the process stopped
+    for threat in pending:
+        create_blockchain_block(threat)
+    
+    print(f"📸 Restored snapshot from {reader.created_at} in {(time.perf_counter() - started) * 1000:.0f}ms: "
+          f"{repository.count_threats()} threats, {repository.count_blocks()} blocks")
+    if repository.persistent or cold:
+        history_loaded.set()
+    else:
+        cold_history = (reader, state)
+    return True
+
+def start_cold_history():
+    """
+    Start loading the cold history a restore left, once. It is started with the
+    background workers rather than by the restore: on a busy or single core it
+    would otherwise slow the rest of the boot down to the first request.
+    """
+    global cold_history
+    with cold_history_lock:
+        pending, cold_history = cold_history, None
+    if pending is not None:
+        threading.Thread(target=load_cold_history, args=pending, daemon=True).start()
+
+def wait_for_history():
+    """Block until every restored row is back in the stores"""
+    start_cold_history()
+    history_loaded.wait()
+
+COLD_DECODERS = {'threats': ThreatRecord.from_columns, 'responses': ResponseRecord.from_columns, 'blocks': list}
+
+def load_cold(reader, state, name, chunks=None):
+    """A dataset's cold rows from the snapshot, oldest first: the given chunks (0 is the oldest), or all"""
+    count = state['coldChunks'][name]
+    rows = []
+    for index in (range(count) if chunks is None else chunks):
+        if 0 <= index < count:
+            rows += COLD_DECODERS[name](reader.load(f'{name}Cold{index}'))
+    return rows
+
+def load_cold_history(reader, state):
+    """Background half of a memory-backend restore: the rows older than the hot set, in front of it"""
+    started = time.perf_counter()
+    counts = state['coldChunks']
+    try:
+        # A chunk per dataset at a time, newest first, so the stored history grows backwards without gaps
+        for back in range(max(counts.values(), default=0)):
+            repository.restore_older(*(
+                load_cold(reader, state, name, [counts[name] - 1 - back])
+                for name in ('threats', 'responses', 'blocks')
+            ))
+            response_cache.bump(THREATS, BLOCKS, RESPONSES)
+        gc.freeze()  # Like the hot rows at boot: kept out of every later collection
+        print(f"📂 Cold history restored in {time.perf_counter() - started:.2f}s: "
+              f"{repository.count_threats()} threats, {repository.count_blocks()} blocks")
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ Cold history not restored: {e}")
+    finally:
+        history_loaded.set()
+    response_cache.bump(THREATS, BLOCKS, RESPONSES)
 
 def initialize_sample_data():
-    """Initialize with realistic sample data (not DB dependent)"""
-    global ai_status
-    
-    # Generate initial threat history
-    for i in range(30):
-        threat = generate_realistic_threat()
-        threat['timestamp'] = (datetime.now() - timedelta(minutes=random.randint(10, 1440))).isoformat()
-        threat_history.append(threat)
-        
-        # Create blockchain block
-        create_blockchain_block(threat)
-        
-        # Generate response
-        generate_automated_response(threat)
+    """Initialize with realistic sample data"""
+    # Generate initial threat history (back-dated, oldest first: the log backend expects time order)
+    ages = sorted((random.randint(10, 1440) for _ in range(30)), reverse=True)
+    for i, minutes_ago in enumerate(ages):
+        threat = generate_threat()
+        threat['timestamp'] = (datetime.now() - timedelta(minutes=minutes_ago)).isoformat()
+        ingest_threat(threat, live=False)
         
-        # Update node threats
-        for node in nodes_status:
-            if node['nodeId'] == threat['nodeId']:
-                node['threatsDetected'] += 1
+        # Sample ledger gets a block per 10 threats
+        if i % 10 == 9:
+            with write_lock:
+                block_builder.flush()
     
     # Generate live threats
     for i in range(10):
-        threat = generate_realistic_threat()
+        threat = generate_threat()
         threat['timestamp'] = (datetime.now() - timedelta(minutes=random.randint(0, 30))).isoformat()
-        live_threats.append(threat)
-    
-    # Update AI status
-    ai_status['threatsAnalyzed'] = len(threat_history)
+        live_threats.append(ThreatRecord.from_dict(threat))
 
-# Initialize on startup
-initialize_sample_data()
+# Initialize on startup: from the snapshot, else from the repository, else sample data.
+# A restore allocates millions of long-lived objects and no garbage: collections
+# meanwhile would only rescan them, and once frozen later ones skip them too.
+gc.disable()
+try:
+    restored = restore_snapshot()
+finally:
+    gc.freeze()
+    gc.enable()
+if not restored:
+    if repository.count_threats() or repository.count_blocks():
+        load_from_repository()
+    else:
+        initialize_sample_data()
+    history_loaded.set()
+
+# ==================== BACKGROUND WORKERS ====================
+
+background_started = False
+background_lock = threading.Lock()
+
+def start_background():
+    """Start the ingest workers, the node sync, archiver and snapshot jobs and the exit snapshot (once per process)"""
+    global background_started
+    with background_lock:
+        if background_started:
+            return
+        start_cold_history()
+        submission_queue.start()
+        scheduler.add('node-sync', sync_nodes, config.NODE_SYNC_INTERVAL)
+        if config.ARCHIVE_ENABLED:
+            scheduler.add('retention-archiver', archive_job, config.ARCHIVE_INTERVAL)
+        if config.SNAPSHOT_ENABLED:
+            scheduler.add('snapshot', save_snapshot, config.SNAPSHOT_INTERVAL)
+            atexit.register(save_snapshot)
+        scheduler.start()
+        background_started = True
+
+@app.before_request
+def ensure_background():
+    # Under any WSGI server the first request starts them; the debug server's serving process does it at boot
+    if not background_started:
+        start_background()
 
 # ==================== API ROUTES ====================
 
@@ -183,124 +476,246 @@ def home():
     })
 
 @app.route('/api/live-threats')
+@response_cache.cached(LIVE)
 def get_live_threats():
     """Get last 10 live threats"""
+    threats = [threat.to_dict() for threat in reversed(live_threats.snapshot())]  # Newest first
     return jsonify({
         'success': True,
-        'count': len(live_threats),
-        'threats': sorted(live_threats, key=lambda x: x['timestamp'], reverse=True)[:10]
+        'count': len(threats),
+        'threats': threats
     })
 
+@app.route('/api/stream')
+def stream_events():
+    """Server-Sent Events push stream of threat, block, response and node deltas"""
+    return sse_response(event_broker, request)
+
 @app.route('/api/threat-history')
+@response_cache.cached(THREATS)
 def get_threat_history():
-    """Get all threat history"""
+    """Get one page of threat history, newest first (cursor + filters)"""
+    try:
+        threats, next_cursor = repository.threat_page(parse_history_query(request.args))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'count': len(threats),
+        'total': repository.count_threats(),
+        'threats': threats,
+        'nextCursor': next_cursor,
+        'hasMore': next_cursor is not None
+    })
+
+@app.route('/api/threats/<threat_id>')
+def get_threat(threat_id):
+    """One threat from the history by ID, with the block it was sealed into"""
+    threat = repository.get_threat(threat_id)
+    if threat is None:
+        return jsonify({
+            'success': False,
+            'error': 'Threat not found (archived threats are served by /api/archive/threat-history)'
+        }), 404
+    
     return jsonify({
         'success': True,
-        'count': len(threat_history),
-        'threats': sorted(threat_history, key=lambda x: x['timestamp'], reverse=True)
+        'threat': threat,
+        'blockNumber': repository.block_number_of(threat_id)  # None until its block is sealed
     })
 
+@app.route('/api/ip/<addr>')
+def get_ip_reputation(addr):
+    """Threats, severities and responses recorded for one IP address"""
+    try:
+        stats = ip_index.lookup(addr)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if stats is None:
+        return jsonify({'success': False, 'error': 'No threats or responses recorded for this address'}), 404
+    
+    return jsonify({'success': True, 'ip': addr, 'stats': stats})
+
+@app.route('/api/cidr/<path:prefix>')
+def get_network_reputation(prefix):
+    """Totals for every address in an IPv4 CIDR prefix, e.g. /api/cidr/10.0.0.0/8"""
+    try:
+        stats = ip_index.network(prefix)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'prefix': prefix, 'stats': stats})
+
 @app.route('/api/blockchain-ledger')
 def get_blockchain_ledger():
     """Get blockchain blocks"""
+    seal_due_blocks()
+    return blockchain_ledger_page()
+
+@response_cache.cached(BLOCKS, CHECKPOINT, THREATS)  # THREATS: pendingTransactions
+def blockchain_ledger_page():
+    blocks = repository.latest_blocks(50)
+    return jsonify({
+        'success': True,
+        'totalBlocks': repository.count_blocks(),
+        'pendingTransactions': len(block_builder.pending_ids()),
+        'blocks': [block_summary(block) for block in blocks]
+    })
+
+def block_summary(block):
+    """Block as listed by the API: header fields only, per-threat data is served by /proof"""
+    summary = block_event(block)
+    summary['verificationStatus'] = ledger_verifier.status_for(block)
+    return summary
+
+def verify_ledger():
+    """Verify only the blocks appended since the last checkpoint"""
+    seal_due_blocks()
+    first = repository.first_block_number()
+    base = first if first is not None else block_counter
+    start = ledger_verifier.checkpoint['blockNumber']
+    blocks = repository.iter_blocks(after=start)
+    if start + 1 < base:
+        # A rescan from before the hot window replays the archived blocks first
+        archived = (
+            block for block in archive.read('blockchain-ledger')
+            if start < block['blockNumber'] < base
+        )
+        blocks = chain(archived, blocks)
+    result = ledger_verifier.verify(blocks)
+    if result['blocksChecked']:
+        response_cache.bump(CHECKPOINT)
+    return result
+
+@app.route('/api/blockchain-ledger/verify')
+def verify_blockchain_ledger():
+    """Verify the hash chain and Merkle roots incrementally (?full=true rescans from genesis, admin only)"""
+    if request.args.get('full', 'false').lower() == 'true':
+        # A rescan from genesis reads the whole ledger and archive: admins only
+        denied = admin_denied()
+        if denied:
+            return denied
+        ledger_verifier.reset()
+    result = verify_ledger()
+    
     return jsonify({
         'success': True,
-        'totalBlocks': len(blockchain_ledger),
-        'blocks': sorted(blockchain_ledger, key=lambda x: x['blockNumber'], reverse=True)[:50]
+        'verification': result,
+        'blockchainIntegrity': ledger_verifier.integrity(block_counter - 1)
     })
 
+@app.route('/api/blockchain-ledger/proof/<threat_id>')
+def get_inclusion_proof(threat_id):
+    """Merkle inclusion proof of a threat in its batch block"""
+    seal_due_blocks()
+    block_number = repository.block_number_of(threat_id)
+    block = repository.get_block(block_number) if block_number is not None else None
+    if block is not None:
+        return jsonify({'success': True, 'proof': inclusion_proof(block, threat_id)})
+    
+    # Blocks past retention are only on disk
+    block = archive.find_block(threat_id)
+    if block is not None:
+        return jsonify({'success': True, 'archived': True, 'proof': inclusion_proof(block, threat_id)})
+    
+    if threat_id in block_builder.pending_ids():
+        return jsonify({
+            'success': False,
+            'pending': True,
+            'blockNumber': block_counter,
+            'message': 'Threat is waiting to be sealed into the next block'
+        }), 202
+    
+    return jsonify({'success': False, 'error': 'Threat not found in ledger'}), 404
+
+node_changes = ChangeTracker(config.NODE_EVENT_FIELDS)
+
+def sync_nodes():
+    """Refresh every node's sync time and latency (every NODE_SYNC_INTERVAL seconds)"""
+    with write_lock, repository.batch():
+        for node in config.NODES:
+            update = {'lastSyncTime': datetime.now().isoformat(), 'latency': f"{random.randint(10, 100)}ms"}
+            repository.update_node(node['nodeId'], update)
+            # Pushed only when the node's state changed, not on every refresh
+            if node_changes.changed(node['nodeId'], dict(node, **update)):
+                event_broker.publish('node', dict(update, nodeId=node['nodeId'], status=node['status']))
+
 @app.route('/api/nodes-status')
 def get_nodes_status():
     """Get nodes status"""
-    # Update sync times
-    for node in nodes_status:
-        node['lastSyncTime'] = datetime.now().isoformat()
-        node['latency'] = f"{random.randint(10, 100)}ms"
-    
+    nodes = repository.list_nodes()
     return jsonify({
         'success': True,
-        'totalNodes': len(nodes_status),
-        'nodes': nodes_status
+        'totalNodes': len(nodes),
+        'nodes': nodes
     })
 
 @app.route('/api/ai-status')
 def get_ai_status():
     """Get AI model status"""
-    ai_status['threatsAnalyzed'] = len(threat_history) + len(user_submitted_threats)
-    ai_status['updatedAt'] = datetime.now().isoformat()
-    
     return jsonify({
         'success': True,
-        'aiStatus': ai_status
+        'aiStatus': repository.get_ai_status()
     })
 
 @app.route('/api/response-logs')
+@response_cache.cached(RESPONSES)
 def get_response_logs():
     """Get response logs"""
+    logs = repository.latest_responses(50)
     return jsonify({
         'success': True,
-        'count': len(response_logs),
-        'logs': sorted(response_logs, key=lambda x: x['timestamp'], reverse=True)[:50]
+        'count': len(logs),
+        'logs': logs
     })
 
 # ==================== USER INPUT ENDPOINT ====================
 
+def threat_from_submission(data):
+    """Threat record for a user or sensor submission"""
+    node_id = random.choice(config.NODES)['nodeId']
+    return {
+        'threatId': new_id('USR', node_id),
+        'type': data['threatType'],
+        'severity': data['severity'],
+        'source': data.get('source', 'User Submitted'),
+        'ip': data['ip'],
+        'status': 'Monitoring',
+        'description': data.get('description', f'User submitted {data["threatType"]} from {data["ip"]}'),
+        'nodeId': node_id,
+        'location': data.get('location', 'Unknown'),
+        'protocol': data.get('protocol', 'Unknown'),
+        'port': data.get('port', 0),
+        'attackVector': data.get('attackVector', 'Unknown'),
+        'confidence': 100.0,
+        'userSubmitted': True
+    }
+
+# Batches from /api/submit-threats are ingested by background workers (started with the server)
+submission_queue = SubmissionQueue(ingest_threats)
+
 @app.route('/api/submit-threat', methods=['POST'])
 def submit_threat():
     """Accept user-submitted threat for monitoring"""
     try:
-        data = request.json
-        
-        # Validate required fields
-        required_fields = ['ip', 'threatType', 'severity']
-        if not all(field in data for field in required_fields):
-            return jsonify({
-                'success': False,
-                'message': 'Missing required fields: ip, threatType, severity'
-            }), 400
-        
-        # Create threat object
-        threat = {
-            'threatId': f"USR-{random.randint(1000, 9999)}",
-            'type': data['threatType'],
-            'severity': data['severity'],
-            'source': data.get('source', 'User Submitted'),
-            'ip': data['ip'],
-            'timestamp': datetime.now().isoformat(),
-            'status': 'Monitoring',
-            'description': data.get('description', f'User submitted {data["threatType"]} from {data["ip"]}'),
-            'nodeId': random.choice(nodes_status)['nodeId'],
-            'location': data.get('location', 'Unknown'),
-            'protocol': data.get('protocol', 'Unknown'),
-            'port': data.get('port', 0),
-            'attackVector': data.get('attackVector', 'Unknown'),
-            'confidence': 100.0,
-            'userSubmitted': True
-        }
-        
-        # Add to storage
-        user_submitted_threats.append(threat)
-        threat_history.append(threat)
-        live_threats.append(threat)
-        
-        # Keep only last 10 live threats
-        if len(live_threats) > 10:
-            live_threats.pop(0)
-        
-        # Create blockchain block
-        block = create_blockchain_block(threat)
-        
-        # Generate automated response
-        response = generate_automated_response(threat)
+        # Lenient about extra fields and numbers sent as strings (or vice versa), strict about the rest
+        data = coerce_submission(request.get_json(silent=True))
+        validate_submission(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid submission: {e}'}), 400
+    
+    try:
+        threat = threat_from_submission(data)
         
-        # Update AI status
-        ai_status['threatsAnalyzed'] += 1
+        # Store, add to the pending blockchain block and respond (one writer at a time)
+        block_number, response = ingest_threat(threat)
         
         return jsonify({
             'success': True,
             'message': 'Threat submitted successfully and is now being monitored',
             'threat': threat,
-            'blockNumber': block['blockNumber'],
+            'blockNumber': block_number,
             'response': response['action'] if response else 'Monitoring',
             'monitoring': {
                 'status': 'Active',
@@ -315,32 +730,66 @@ def submit_threat():
             'message': f'Error processing threat: {str(e)}'
         }), 500
 
-# ==================== ANALYTICS ENDPOINTS ====================
-
-@app.route('/api/analytics/overview')
-def get_analytics_overview():
-    """Get comprehensive analytics overview"""
-    all_threats = threat_history + user_submitted_threats
+@app.route('/api/submit-threats', methods=['POST'])
+def submit_threats():
+    """
+    Accept a batch of sensor threats (JSON array, or NDJSON with
+    Content-Type: application/x-ndjson). Valid threats are queued for the
+    ingest workers and answered 202 with their IDs; invalid ones are listed
+    by index and skipped.
+    """
+    try:
+        items = parse_batch(request.get_data(), request.mimetype)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if len(items) > config.SUBMIT_BATCH_MAX:
+        return jsonify({
+            'success': False,
+            'error': f'Batch too large: at most {config.SUBMIT_BATCH_MAX} threats per request'
+        }), 413
     
-    # Severity distribution
-    severity_counts = Counter([t['severity'] for t in all_threats])
+    threats = []
+    rejected = []
+    for index, item in enumerate(items):
+        try:
+            validate_submission(item)
+        except ValueError as e:
+            rejected.append({'index': index, 'error': str(e)})
+            continue
+        threats.append(threat_from_submission(item))
     
-    # Threat type distribution
-    type_counts = Counter([t['type'] for t in all_threats])
+    if not threats:
+        return jsonify({'success': False, 'error': 'No valid threats in batch', 'rejected': rejected}), 400
     
-    # Hourly trends (last 24 hours)
-    hourly_threats = {}
-    now = datetime.now()
-    for i in range(24):
-        hour = (now - timedelta(hours=i)).strftime('%H:00')
-        hourly_threats[hour] = 0
+    try:
+        submission_queue.submit(threats, rejected=len(rejected))
+    except queue.Full:
+        response = jsonify({'success': False, 'error': 'Ingest queue is full, retry later'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     
-    for threat in all_threats:
-        threat_time = datetime.fromisoformat(threat['timestamp'])
-        if (now - threat_time).total_seconds() < 86400:
-            hour = threat_time.strftime('%H:00')
-            if hour in hourly_threats:
-                hourly_threats[hour] += 1
+    return jsonify({
+        'success': True,
+        'accepted': len(threats),
+        'threatIds': [threat['threatId'] for threat in threats],
+        'rejected': rejected
+    }), 202
+
+@app.route('/api/ingest/metrics')
+def get_ingest_metrics():
+    """Batch submission queue and worker counters"""
+    return jsonify({
+        'success': True,
+        'metrics': submission_queue.get_metrics()
+    })
+
+# ==================== ANALYTICS ENDPOINTS ====================
+
+@app.route('/api/analytics/overview')
+@response_cache.cached(THREATS, RESPONSES, BLOCKS, CHECKPOINT)  # TTL covers hourlyTrends
+def get_analytics_overview():
+    """Get comprehensive analytics overview (?consistency=true checks against a full recompute)"""
+    overview = analytics.overview()
     
     # Node performance
     node_performance = [
@@ -351,55 +800,267 @@ def get_analytics_overview():
             'uptime': node['uptime'],
             'efficiency': round(random.uniform(85, 99), 2)
         }
-        for node in nodes_status
+        for node in repository.list_nodes()
     ]
     
-    # Response effectiveness
-    successful_responses = len([r for r in response_logs if r['status'] == 'Success'])
-    total_responses = len(response_logs)
-    response_rate = round((successful_responses / total_responses * 100) if total_responses > 0 else 0, 2)
+    # Ledger integrity from the incremental verifier (only new blocks are hashed)
+    verify_ledger()
     
-    return jsonify({
+    result = {
         'success': True,
-        'analytics': {
-            'totalThreats': len(all_threats),
-            'userSubmittedThreats': len(user_submitted_threats),
-            'blockedThreats': len([t for t in all_threats if t['status'] == 'Blocked']),
-            'activeMonitoring': len([t for t in all_threats if t['status'] == 'Monitoring']),
-            'severityDistribution': dict(severity_counts),
-            'threatTypeDistribution': dict(type_counts),
-            'hourlyTrends': hourly_threats,
-            'nodePerformance': node_performance,
-            'responseEffectiveness': response_rate,
-            'blockchainIntegrity': '100%',
-            'averageResponseTime': f"{random.randint(50, 200)}ms"
+        'analytics': dict(
+            overview,
+            nodePerformance=node_performance,
+            blockchainIntegrity=ledger_verifier.integrity(block_counter - 1),
+            averageResponseTime=f"{random.randint(50, 200)}ms"
+        )
+    }
+    
+    if request.args.get('consistency', 'false').lower() == 'true':
+        recomputed = AnalyticsAggregator.recompute(repository.iter_threats(), repository.iter_responses())
+        mismatches = analytics.compare(recomputed)
+        result['consistency'] = {
+            'consistent': not mismatches,
+            'mismatches': mismatches
         }
-    })
+    
+    return jsonify(result)
 
 @app.route('/api/analytics/threats-trend')
+@response_cache.cached(THREATS)
 def get_threats_trend():
-    """Get threat trends over time"""
-    all_threats = threat_history + user_submitted_threats
-    
-    # Last 7 days trend
-    trends = []
-    for i in range(7):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-        count = len([t for t in all_threats if t['timestamp'].startswith(date)])
-        trends.append({
-            'date': date,
-            'count': count,
-            'severity': {
-                'Critical': random.randint(0, 5),
-                'High': random.randint(2, 10),
-                'Medium': random.randint(5, 15),
-                'Low': random.randint(3, 8)
-            }
-        })
+    """Get threat trends over time (?days=7&bucket=day|week)"""
+    try:
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid days: expected an integer'}), 400
+    bucket = request.args.get('bucket', 'day')
+    
+    if not 1 <= days <= config.TREND_RETENTION_DAYS:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid days: must be between 1 and {config.TREND_RETENTION_DAYS}'
+        }), 400
+    if bucket not in TREND_BUCKETS:
+        return jsonify({
+            'success': False,
+            'error': f"Invalid bucket: expected one of {', '.join(TREND_BUCKETS)}"
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'days': days,
+        'bucket': bucket,
+        'trends': analytics.trend(days, bucket)  # Oldest first
+    })
+
+# ==================== BULK EXPORTS ====================
+
+EXPORT_DATASETS = {
+    'threat-history': lambda: repository.iter_threats(),
+    'blockchain-ledger': lambda: (block_summary(block) for block in repository.iter_blocks()),
+    'response-logs': lambda: repository.iter_responses()
+}
+
+@app.route('/api/export/<dataset>')
+def export_dataset(dataset):
+    """Stream a whole store, oldest first (?format=ndjson|columnar|arrow)"""
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown dataset: expected one of {', '.join(EXPORT_DATASETS)}"
+        }), 404
+    
+    try:
+        # Rows come from a snapshot taken now; later writes are not part of the export
+        return export_response(EXPORT_DATASETS[dataset](), request.args.get('format', 'ndjson'), dataset)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+# ==================== ENFORCEMENT ====================
+
+@app.route('/api/enforcement')
+def get_enforcement():
+    """Active blocklist / rate-limit rules (latest expiry first) and enforcement counters"""
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit: expected an integer'}), 400
+    
+    return jsonify({
+        'success': True,
+        'rules': enforcement.active_rules(limit),
+        'metrics': enforcement.get_metrics()
+    })
+
+@app.route('/api/enforcement/check/<addr>')
+def check_enforcement(addr):
+    """Verdict for a request from addr: allow, block or throttle (a lookup: takes no token, counts nothing)"""
+    return jsonify({'success': True, 'ip': addr, 'verdict': enforcement.verdict(addr)})
+
+@app.route('/api/enforcement/rules', methods=['POST'])
+@require_admin
+def add_enforcement_rule():
+    """Add a manual rule (admin): {"target": ip or CIDR, "action": "block"|"throttle", "duration": seconds}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    
+    try:
+        duration = parse_duration(data.get('duration', 3600))
+        rule = enforcement.add_rule(
+            data.get('action', BLOCK),
+            data.get('target'),
+            time.time() + duration,
+            str(data.get('reason', 'Manual rule'))[:200]
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'rule': rule.to_dict()}), 201
+
+@app.route('/api/enforcement/rules/<action>/<path:target>', methods=['DELETE'])
+@require_admin
+def remove_enforcement_rule(action, target):
+    """Lift a rule early (admin)"""
+    try:
+        removed = enforcement.remove_rule(action, target)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not removed:
+        return jsonify({'success': False, 'error': 'No such rule'}), 404
+    return jsonify({'success': True})
+
+# ==================== RETENTION & ARCHIVE ====================
+
+archive_status = {'lastRunAt': None, 'archived': {}}
+
+def archive_expired(now=None):
+    """
+    Move rows past their retention window from the hot stores to the archive.
+    Runs under write_lock so no ingest can land in the range being moved.
+    """
+    global archive_status
+    now = now or datetime.now()
+    archived = {}
+    wait_for_history()  # Expiring mid-restore would leave older cold rows behind
+    
+    with write_lock:
+        # History and responses: the time-ordered prefix older than the cutoff
+        # Each expire writes (and fsyncs) the archive before it removes anything
+        for dataset, expire in (('threat-history', repository.expire_threats),
+                                ('response-logs', repository.expire_responses)):
+            rows = expire(retention_cutoff(dataset, now), lambda rows, dataset=dataset: archive.write(dataset, rows))
+            if rows:
+                if dataset == 'threat-history':
+                    analytics.retire(threats=rows)
+                else:
+                    analytics.retire(responses=rows)
+            archived[dataset] = len(rows)
+        
+        # Ledger: only blocks the verifier has already checked leave the hot chain,
+        # and the tip always stays so the next block can link to its hash
+        last_block = repository.last_block()
+        blocks = []
+        if last_block:
+            through = min(ledger_verifier.checkpoint['blockNumber'], last_block['blockNumber'] - 1)
+            blocks = repository.expire_blocks(
+                through,
+                retention_cutoff('blockchain-ledger', now),
+                lambda rows: archive.write('blockchain-ledger', rows)
+            )
+        archived['blockchain-ledger'] = len(blocks)
+    
+    # Days entirely past retention are merged into one file each
+    for dataset in RETENTION_DAYS:
+        archive.compact(dataset, retention_cutoff(dataset, now)[:10])
+    
+    response_cache.bump(THREATS, LIVE, BLOCKS, RESPONSES)
+    archive_status = {'lastRunAt': now.isoformat(), 'archived': archived}
+    return archived
+
+def archive_job():
+    """Background archiver run, every ARCHIVE_INTERVAL seconds"""
+    archived = archive_expired()
+    if any(archived.values()):
+        print(f"🗄️  Archived {archived}")
+        # Archived rows would otherwise come back from the last snapshot
+        if config.SNAPSHOT_ENABLED:
+            save_snapshot()
+
+@app.route('/api/archive')
+def get_archive():
+    """Archived partitions per dataset and the last archiver run"""
+    return jsonify({
+        'success': True,
+        'retentionDays': RETENTION_DAYS,
+        'lastRun': archive_status,
+        'partitions': {dataset: archive.partitions(dataset) for dataset in RETENTION_DAYS}
+    })
+
+@app.route('/api/archive/run', methods=['POST'])
+@require_admin
+def run_archiver():
+    """Run the archiver now (admin)"""
+    return jsonify({'success': True, 'archived': archive_expired()})
+
+@app.route('/api/archive/<dataset>')
+def query_archive(dataset):
+    """
+    Query archived rows on demand (?since=&until=, equality filters, limit=),
+    or stream them all with ?format=ndjson|columnar|arrow
+    """
+    if dataset not in RETENTION_DAYS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown dataset: expected one of {', '.join(RETENTION_DAYS)}"
+        }), 404
     
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit: expected an integer'}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'success': False, 'error': f'Invalid limit: must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    
+    rows = archive.query(
+        dataset,
+        request.args.get('since'),
+        request.args.get('until'),
+        {field: request.args[field] for field in FILTER_FIELDS if field in request.args}
+    )
+    
+    if 'format' in request.args:
+        try:
+            return export_response(rows, request.args['format'], f"{dataset}-archive")
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    
+    results = []
+    for row in rows:
+        results.append(row)
+        if len(results) == limit:
+            break
+    return jsonify({
+        'success': True,
+        'count': len(results),
+        'rows': results  # Oldest first
+    })
+
+@app.route('/api/cache/metrics')
+def get_cache_metrics():
+    """Response cache hit, miss and 304 counters"""
+    return jsonify({
+        'success': True,
+        'metrics': response_cache.get_metrics()
+    })
+
+@app.route('/api/scheduler/metrics')
+def get_scheduler_metrics():
+    """Periodic jobs: schedule, counters and run time histograms"""
     return jsonify({
         'success': True,
-        'trends': trends[::-1]  # Reverse to show oldest first
+        'metrics': scheduler.metrics()
     })
 
 # ==================== PDF REPORT GENERATION ====================
@@ -439,7 +1100,7 @@ def generate_report(section):
             
             # Table data
             data = [['Threat ID', 'Type', 'Severity', 'IP', 'Status']]
-            for threat in live_threats[:20]:
+            for threat in live_threats.snapshot()[:20]:
                 data.append([
                     threat['threatId'],
                     threat['type'][:20],
@@ -454,7 +1115,7 @@ def generate_report(section):
             elements.append(Spacer(1, 0.5*inch))
             
             data = [['Threat ID', 'Type', 'Severity', 'IP', 'Timestamp']]
-            for threat in threat_history[:30]:
+            for threat in islice(repository.iter_threats(), 30):
                 data.append([
                     threat['threatId'],
                     threat['type'][:20],
@@ -468,13 +1129,14 @@ def generate_report(section):
             elements.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
             elements.append(Spacer(1, 0.5*inch))
             
-            data = [['Block #', 'Threat Hash', 'Type', 'Status', 'Node']]
-            for block in blockchain_ledger[:30]:
+            data = [['Block #', 'Merkle Root', 'Threats', 'Type', 'Status', 'Node']]
+            for block in islice(repository.iter_blocks(), 30):
                 data.append([
                     str(block['blockNumber']),
-                    block['threatHash'][:12],
+                    block['merkleRoot'][:12],
+                    str(block['transactionCount']),
                     block['threatType'][:20],
-                    block['verificationStatus'],
+                    ledger_verifier.status_for(block),
                     block['nodeId']
                 ])
         
@@ -484,7 +1146,7 @@ def generate_report(section):
             elements.append(Spacer(1, 0.5*inch))
             
             data = [['Node ID', 'Location', 'Status', 'Threats', 'Uptime']]
-            for node in nodes_status:
+            for node in repository.list_nodes():
                 data.append([
                     node['nodeId'],
                     node['location'],
@@ -499,7 +1161,7 @@ def generate_report(section):
             elements.append(Spacer(1, 0.5*inch))
             
             data = [['Log ID', 'Action', 'IP', 'Severity', 'Status']]
-            for log in response_logs[:30]:
+            for log in islice(repository.iter_responses(), 30):
                 data.append([
                     log['logId'],
                     log['action'][:20],
@@ -585,15 +1247,36 @@ if __name__ == '__main__':
     print("=" * 70)
     print("\n📡 Available Endpoints:")
     print("  GET  /api/live-threats          - Live threats")
-    print("  GET  /api/threat-history        - All threats")
+    print("  GET  /api/stream                - Live push stream (SSE)")
+    print("  GET  /api/threat-history        - Threat history (paginated)")
+    print("  GET  /api/threats/<id>          - One threat by ID")
+    print("  GET  /api/ip/<addr>             - IP reputation")
+    print("  GET  /api/cidr/<prefix>         - Network reputation (IPv4 CIDR)")
+    print("  GET  /api/enforcement[/check/<ip>] - Blocklist, rate limits and verdicts")
+    print("  POST /api/enforcement/rules     - Manual block / rate limit (DELETE to lift, admin)")
     print("  GET  /api/blockchain-ledger     - Blockchain")
+    print("  GET  /api/blockchain-ledger/verify - Verify hash chain")
+    print("  GET  /api/blockchain-ledger/proof/<id> - Merkle inclusion proof")
     print("  GET  /api/nodes-status          - Nodes")
     print("  GET  /api/ai-status             - AI Model")
     print("  GET  /api/response-logs         - Responses")
     print("  POST /api/submit-threat         - Submit threat (USER INPUT)")
+    print("  POST /api/submit-threats        - Batch submit, JSON array or NDJSON (202, async)")
+    print("  GET  /api/ingest/metrics        - Batch submission queue")
     print("  GET  /api/analytics/overview    - Analytics")
     print("  GET  /api/analytics/threats-trend - Trends")
+    print("  GET  /api/cache/metrics         - Response cache")
+    print("  GET  /api/scheduler/metrics     - Background job timings")
+    print("  GET  /api/export/<dataset>      - Streamed bulk export (ndjson/columnar/arrow)")
+    print("  GET  /api/archive[/<dataset>]   - Archived partitions / on-demand archive query")
+    print("  POST /api/archive/run           - Run the archiver now (admin)")
     print("  POST /api/reports/generate/<section> - PDF Reports")
     print("=" * 70)
     
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # The reloader's parent imports this module too, so it would hold the log
+    # backend's directory lock and the serving child could not open the log
+    use_reloader = repository.name != 'log'
+    # Only in the serving process: with the reloader, the parent just watches files
+    if not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background()
+    app.run(debug=True, host='0.0.0.0', port=5001, use_reloader=use_reloader)
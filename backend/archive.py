@@ -0,0 +1,252 @@
+"""
+On-disk archive for rows that fell out of the retention window.
+
+Rows are partitioned by day (from their timestamp) into gzip-compressed NDJSON
+files under ARCHIVE_DIR/<dataset>/. Each archiver run writes new part files
+atomically and durably (temp file, fsync, rename, directory fsync), so write()
+returning means the rows survive a crash and may be deleted at the source; once a day is entirely past the cutoff its
+parts are compacted into a single file. A compacted file is named after the
+highest part number it absorbed, so parts it already covers are ignored even
+if a crash left them behind.
+
+    <day>.<seq>.part.ndjson.gz   rows written by one run
+    <day>.<seq>.ndjson.gz        compacted day, covers parts up to <seq>
+
+A row is written at most once: write() skips rows whose id is already in
+their day's files, so rows archived again after a crash (expired before the
+source delete or the next snapshot took effect) do not come back twice.
+
+Archived ledger blocks are found by threat through the range of threatIds
+each ledger file holds. Threat IDs sort in creation order (ids.py) and a
+block seals threats seconds apart, so the ranges of different files barely
+overlap and a lookup reads only the file or two whose range covers the id.
+The index costs two IDs per file, not one entry per archived threat, and
+forgets files that compaction removed. Ranges are noted when this process
+writes a file and read once from files written by others.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import timedelta
+import config
+
+# dataset -> days its rows stay in the hot store
+RETENTION_DAYS = {
+    'threat-history': config.HISTORY_RETENTION_DAYS,
+    'blockchain-ledger': config.LEDGER_RETENTION_DAYS,
+    'response-logs': config.RESPONSE_RETENTION_DAYS
+}
+
+LEDGER_DATASET = 'blockchain-ledger'
+
+# dataset -> field identifying a row
+ID_FIELDS = {
+    'threat-history': 'threatId',
+    'blockchain-ledger': 'blockNumber',
+    'response-logs': 'logId'
+}
+
+FILE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})\.(\d{6})(\.part)?\.ndjson\.gz$')
+
+
+def _threat_range(blocks):
+    """(lowest, highest) threatId in the blocks, or None if they hold none"""
+    threat_ids = [threat_id for block in blocks for threat_id in block.get('threatIds', ())]
+    return (min(threat_ids), max(threat_ids)) if threat_ids else None
+
+
+def retention_cutoff(dataset, now):
+    """ISO timestamp before which the dataset's rows are archived"""
+    return (now - timedelta(days=RETENTION_DAYS[dataset])).isoformat()
+
+
+class Archive:
+    """Day-partitioned, compressed row archive for a set of datasets"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or config.ARCHIVE_DIR
+        self.lock = threading.Lock()
+        self.block_ranges = {}  # Live ledger file -> (lowest, highest) threatId in it, None if it holds none
+        self.day_ids = {}  # (dataset, day) -> (files read, ids in them) for the days last written
+
+    # ==================== WRITING ====================
+
+    def write(self, dataset, rows):
+        """
+        Append rows (dicts with an ISO timestamp) to their day partitions,
+        skipping any already archived; returns the number written
+        """
+        id_field = ID_FIELDS[dataset]
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row['timestamp'][:10], []).append(row)
+
+        written = 0
+        with self.lock:
+            # Per dataset, only the days being written stay cached (normally the one just past retention)
+            self.day_ids = {
+                (cached, day): value for (cached, day), value in self.day_ids.items()
+                if cached != dataset or day in by_day
+            }
+            for day, day_rows in sorted(by_day.items()):
+                archived = self._archived_ids(dataset, day)
+                day_rows = [row for row in day_rows if row[id_field] not in archived]
+                if not day_rows:
+                    continue
+                seq = self._next_seq(dataset)
+                name = f"{day}.{seq:06d}.part.ndjson.gz"
+                self._write_file(dataset, name, day_rows)
+                if dataset == LEDGER_DATASET:
+                    self.block_ranges[name] = _threat_range(day_rows)
+                archived.update(row[id_field] for row in day_rows)
+                self.day_ids[(dataset, day)][0].add(name)
+                written += len(day_rows)
+        return written
+
+    def compact(self, dataset, before_day):
+        """Merge the files of each day earlier than before_day into one"""
+        compacted = 0
+        with self.lock:
+            for day, files in self._files_by_day(dataset).items():
+                if day >= before_day or (len(files) == 1 and not files[0][2]):
+                    continue
+                rows = [row for _, name, _ in files for row in self._read_file(dataset, name)]
+                seq = max(file_seq for file_seq, _, _ in files)
+                compacted_name = f"{day}.{seq:06d}.ndjson.gz"
+                self._write_file(dataset, compacted_name, rows)
+                for _, name, _ in files:
+                    os.remove(self._path(dataset, name))
+                if dataset == LEDGER_DATASET:
+                    for _, name, _ in files:
+                        self.block_ranges.pop(name, None)
+                    self.block_ranges[compacted_name] = _threat_range(rows)
+                compacted += 1
+        return compacted
+
+    def _write_file(self, dataset, name, rows):
+        folder = os.path.join(self.directory, dataset)
+        os.makedirs(folder, exist_ok=True)
+        path = self._path(dataset, name)
+        temp = path + '.tmp'
+        with open(temp, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=config.GZIP_LEVEL) as handle:
+                for row in rows:
+                    handle.write(json.dumps(row, separators=(',', ':'), default=str).encode() + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp, path)
+        # The rename itself is durable only once the directory is synced
+        directory = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def _archived_ids(self, dataset, day):
+        """Ids in the day's archive files, reading only files not seen before (lock held)"""
+        files, ids = self.day_ids.setdefault((dataset, day), (set(), set()))
+        id_field = ID_FIELDS[dataset]
+        for _, name, _ in self._files_by_day(dataset).get(day, []):
+            if name not in files:
+                ids.update(row[id_field] for row in self._read_file(dataset, name))
+                files.add(name)
+        return ids
+
+    def _next_seq(self, dataset):
+        seqs = [seq for files in self._files_by_day(dataset, live_only=False).values() for seq, _, _ in files]
+        return max(seqs, default=0) + 1
+
+    # ==================== READING ====================
+
+    def read(self, dataset, since=None, until=None):
+        """Archived rows with since <= timestamp < until, in day order"""
+        for day, files in self._files_by_day(dataset).items():
+            if since and day < since[:10]:
+                continue
+            if until and day > until[:10]:
+                break
+            for _, name, _ in files:
+                for row in self._read_file(dataset, name):
+                    if since and row['timestamp'] < since:
+                        continue
+                    if until and row['timestamp'] >= until:
+                        continue
+                    yield row
+
+    def query(self, dataset, since=None, until=None, filters=None):
+        """read() narrowed to rows whose fields equal the (string) filter values"""
+        filters = filters or {}
+        for row in self.read(dataset, since, until):
+            if all(str(row.get(field)) == value for field, value in filters.items()):
+                yield row
+
+    def find_block(self, threat_id):
+        """The archived ledger block holding a threat, or None"""
+        with self.lock:
+            names = [name for files in self._files_by_day(LEDGER_DATASET).values() for _, name, _ in files]
+            # Files compacted away (by any process) drop out of the index
+            self.block_ranges = {name: self.block_ranges[name] for name in names if name in self.block_ranges}
+            for name in names:
+                if name not in self.block_ranges:
+                    self.block_ranges[name] = _threat_range(self._read_file(LEDGER_DATASET, name))
+                threat_range = self.block_ranges[name]
+                if threat_range is None or not threat_range[0] <= threat_id <= threat_range[1]:
+                    continue
+                for block in self._read_file(LEDGER_DATASET, name):
+                    if threat_id in block.get('threatIds', ()):
+                        return block
+        return None
+
+    def partitions(self, dataset):
+        """Per-day file count and compressed size"""
+        result = []
+        for day, files in self._files_by_day(dataset).items():
+            result.append({
+                'day': day,
+                'files': len(files),
+                'bytes': sum(os.path.getsize(self._path(dataset, name)) for _, name, _ in files)
+            })
+        return result
+
+    def _read_file(self, dataset, name):
+        with gzip.open(self._path(dataset, name), 'rb') as handle:
+            for line in handle:
+                yield json.loads(line)
+
+    def _files_by_day(self, dataset, live_only=True):
+        """
+        day -> [(seq, name, is_part)] in read order. With live_only, parts
+        already absorbed by the day's newest compacted file are skipped.
+        """
+        folder = os.path.join(self.directory, dataset)
+        if not os.path.isdir(folder):
+            return {}
+
+        days = {}
+        for name in os.listdir(folder):
+            match = FILE_PATTERN.match(name)
+            if match:
+                day, seq, part = match.groups()
+                days.setdefault(day, []).append((int(seq), name, bool(part)))
+
+        result = {}
+        for day in sorted(days):
+            files = sorted(days[day])
+            if live_only:
+                covered = max((seq for seq, _, part in files if not part), default=None)
+                if covered is not None:
+                    files = [
+                        entry for entry in files
+                        if entry[0] > covered or (entry[0] == covered and not entry[2])
+                    ]
+            result[day] = files
+        return result
+
+    def _path(self, dataset, name):
+        return os.path.join(self.directory, dataset, name)
+
+
+# Global instance
+archive = Archive()
@@ -0,0 +1,35 @@
+"""
+Admin authorization for the operator endpoints that change server state:
+manual enforcement rules, on-demand archiver runs and full ledger rescans. A request must carry
+`Authorization: Bearer <config.ADMIN_TOKEN>`. With no token configured those
+endpoints are refused outright, so a deployment never exposes them by accident.
+"""
+import hmac
+from functools import wraps
+from flask import jsonify, request
+import config
+
+
+def is_admin():
+    """Whether the current request carries the admin token"""
+    if not config.ADMIN_TOKEN:
+        return False
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip().encode(), config.ADMIN_TOKEN.encode())
+
+
+def admin_denied():
+    """Error response for a request that is not an admin's, or None: 403 while no admin token is configured, else 401"""
+    if not config.ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Admin endpoints are disabled: ADMIN_TOKEN is not set'}), 403
+    if not is_admin():
+        return jsonify({'success': False, 'error': 'Admin authorization required'}), 401
+    return None
+
+
+def require_admin(view):
+    """Route decorator: the view runs only for admin requests (admin_denied)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return admin_denied() or view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,96 @@
+"""
+Benchmark: enforcement check(ip) hot path
+
+Loads a blocklist of single addresses and CIDR ranges plus rate-limited
+addresses, compiles it, then times check() on one core for a repeating
+working set of client addresses (memoized verdicts), for addresses seen
+once (full evaluation) and for the bare compiled matcher.
+
+Usage:
+    python benchmarks/bench_enforcement.py --blocked 100000 --ranges 5000 --checks 2000000
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enforcement import EnforcementEngine, BLOCK, THROTTLE, ip_key
+
+
+def dotted(value):
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+
+def rate(label, count, seconds):
+    print(f"  {label:<32} {count / seconds:>12,.0f} checks/s  ({seconds / count * 1e9:,.0f} ns each)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--blocked', type=int, default=100_000, help='blocked single addresses')
+    parser.add_argument('--ranges', type=int, default=5_000, help='blocked CIDR ranges (/16 to /28)')
+    parser.add_argument('--limited', type=int, default=10_000, help='rate-limited addresses')
+    parser.add_argument('--clients', type=int, default=50_000, help='distinct client addresses in the working set')
+    parser.add_argument('--checks', type=int, default=2_000_000, help='checks per measurement')
+    args = parser.parse_args()
+
+    random.seed(7)
+    engine = EnforcementEngine()
+    expires = time.time() + 3600
+
+    started = time.perf_counter()
+    for _ in range(args.blocked):
+        engine.add_rule(BLOCK, dotted(random.getrandbits(32)), expires, 'bench')
+    for _ in range(args.ranges):
+        engine.add_rule(BLOCK, f"{dotted(random.getrandbits(32))}/{random.randint(16, 28)}", expires, 'bench')
+    for _ in range(args.limited):
+        engine.add_rule(THROTTLE, dotted(random.getrandbits(32)), expires, 'bench')
+    loaded = time.perf_counter() - started
+
+    now = time.time() + 5  # Past the compile interval, so the first check compiles
+    started = time.perf_counter()
+    engine.check('0.0.0.0', now)
+    compiled = time.perf_counter() - started
+    metrics = engine.get_metrics()
+    print(f"{metrics['rules']:,} rules loaded in {loaded:.2f}s, compiled in {compiled * 1000:.0f} ms "
+          f"({metrics['blockedAddresses']:,} addresses, {metrics['blockedRanges']:,} merged ranges, "
+          f"{metrics['rateLimitedAddresses']:,} rate-limited)")
+
+    clients = [dotted(random.getrandbits(32)) for _ in range(args.clients)]
+    workload = [clients[random.randrange(len(clients))] for _ in range(args.checks)]
+    check = engine.check
+
+    for ip in clients:  # Warm the memo
+        check(ip, now)
+    started = time.perf_counter()
+    for ip in workload:
+        check(ip, now)
+    rate('memoized working set', len(workload), time.perf_counter() - started)
+
+    fresh = [dotted(random.getrandbits(32)) for _ in range(min(args.checks, 500_000))]
+    started = time.perf_counter()
+    for ip in fresh:
+        check(ip, now)
+    rate('first sight (parse + evaluate)', len(fresh), time.perf_counter() - started)
+
+    matcher = engine.matcher
+    keys = [ip_key(ip) for ip in workload]
+    evaluate = matcher.evaluate
+    started = time.perf_counter()
+    for key in keys:
+        evaluate(key)
+    rate('compiled matcher, integer keys', len(keys), time.perf_counter() - started)
+
+    verdicts = {}
+    for ip in workload[:200_000]:
+        verdict = check(ip, now)
+        verdicts[verdict] = verdicts.get(verdict, 0) + 1
+    print(f"  verdict mix (200k checks): {verdicts}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark: keyset pagination of threat history
+
+Loads N history rows and measures page latency at the head, deep in the
+history (via cursors) and with filters, to show that page cost does not grow
+with history size. The mongo backend uses a scratch database on
+config.MONGO_URI with the same indexes as database.init_db and also times
+skip()-based offsets for contrast.
+
+Usage:
+    python benchmarks/bench_history_pagination.py --backend mongo --rows 10000000
+    python benchmarks/bench_history_pagination.py --backend memory --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pagination import keyset_page
+import config
+
+BENCH_DATABASE = 'cyber_defense_bench'
+PAGE_SIZE = 50
+SAMPLES = 200
+
+
+def generate_rows(count):
+    """History rows in ascending time order, one per second"""
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        yield {
+            'threatId': f"THR-{i:010d}",
+            'type': random.choice(config.THREAT_TYPES),
+            'severity': random.choice(config.THREAT_SEVERITIES),
+            'ip': f"10.{random.randint(0, 3)}.{random.randint(0, 255)}.{random.randint(1, 255)}",
+            'nodeId': random.choice(config.NODES)['nodeId'],
+            'status': random.choice(config.THREAT_STATUSES),
+            'timestamp': (start + timedelta(seconds=i)).isoformat()
+        }
+
+
+def report(label, timings):
+    timings.sort()
+    print(f"  {label:<28} p50={timings[len(timings) // 2] * 1000:8.3f}ms "
+          f"p99={timings[int(len(timings) * 0.99)] * 1000:8.3f}ms")
+
+
+def timed(fn, samples=SAMPLES):
+    timings = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def bench_memory(rows):
+    history = list(generate_rows(rows))
+    base = {'limit': PAGE_SIZE, 'cursor': None, 'filters': {}, 'since': None, 'until': None}
+
+    def deep_cursor():
+        row = history[random.randrange(PAGE_SIZE, len(history))]
+        return [row['timestamp'], row['threatId']]
+
+    report('first page', timed(lambda: keyset_page(history, base, 'threatId')))
+    report('random deep cursor', timed(
+        lambda: keyset_page(history, dict(base, cursor=deep_cursor()), 'threatId')))
+    report('severity filter, deep', timed(lambda: keyset_page(
+        history, dict(base, cursor=deep_cursor(), filters={'severity': 'Critical'}), 'threatId')))
+
+
+def bench_mongo(rows):
+    from pymongo import MongoClient
+    from database import THREAT_HISTORY_INDEXES
+
+    client = MongoClient(config.MONGO_URI)
+    collection = client[BENCH_DATABASE]['threat_history']
+    collection.drop()
+
+    try:
+        t0 = time.perf_counter()
+        batch = []
+        for row in generate_rows(rows):
+            batch.append(row)
+            if len(batch) == 10000:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+        for keys in THREAT_HISTORY_INDEXES:
+            collection.create_index(keys)
+        print(f"  loaded in {time.perf_counter() - t0:.1f}s")
+
+        sort = [('timestamp', -1), ('_id', -1)]
+
+        def page(query, skip=0):
+            return list(collection.find(query).sort(sort).skip(skip).limit(PAGE_SIZE + 1))
+
+        def deep_query(extra=None):
+            # Cursor taken from a random position, like a client deep in the history
+            row = collection.find_one({'threatId': f"THR-{random.randrange(PAGE_SIZE, rows):010d}"})
+            cursor = {'$or': [
+                {'timestamp': {'$lt': row['timestamp']}},
+                {'timestamp': row['timestamp'], '_id': {'$lt': row['_id']}}
+            ]}
+            return {'$and': [extra or {}, cursor]}
+
+        collection.create_index('threatId')
+        report('first page', timed(lambda: page({})))
+        queries = [deep_query() for _ in range(SAMPLES)]
+        report('random deep cursor', timed(lambda: page(queries.pop())))
+        queries = [deep_query({'severity': 'Critical'}) for _ in range(SAMPLES)]
+        report('severity filter, deep', timed(lambda: page(queries.pop())))
+        queries = [deep_query({'nodeId': 'Node-A'}) for _ in range(SAMPLES)]
+        report('nodeId filter, deep', timed(lambda: page(queries.pop())))
+        report('skip() at 50% depth', timed(lambda: page({}, skip=rows // 2), samples=10))
+    finally:
+        client.drop_database(BENCH_DATABASE)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=['memory', 'mongo'], default='memory')
+    parser.add_argument('--rows', type=int, default=10000000, help='history rows to load')
+    args = parser.parse_args()
+
+    print(f"{args.backend}: {args.rows:,} rows, page size {PAGE_SIZE}")
+    if args.backend == 'mongo':
+        bench_mongo(args.rows)
+    else:
+        bench_memory(args.rows)
+
+
+if __name__ == '__main__':
+    main()
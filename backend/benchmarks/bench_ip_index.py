@@ -0,0 +1,106 @@
+"""
+Benchmark: IP reputation index at millions of distinct addresses
+
+Indexes one threat per distinct random IPv4 address (plus responses for a
+share of them), then times exact-address lookups and CIDR queries at several
+prefix lengths. A linear scan over the same addresses, standing in for the
+history scan the index replaces, is timed for comparison.
+
+--dense-networks packs the addresses into that many /16 networks instead of
+spreading them over the whole address space: the worst case for prefixes
+longer than /16, which fall inside a single crowded /16.
+
+Usage:
+    python benchmarks/bench_ip_index.py --ips 10000000
+    python benchmarks/bench_ip_index.py --ips 1000000 --dense-networks 16
+"""
+import argparse
+import os
+import random
+import resource
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from ip_index import IpIndex
+
+PREFIX_LENGTHS = (8, 12, 16, 20, 24, 28, 32)
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def dotted(value):
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+
+def timed(function, arguments):
+    started = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - started) / len(arguments) * 1e6  # us per call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ips', type=int, default=10_000_000, help='distinct addresses to index')
+    parser.add_argument('--queries', type=int, default=2000, help='queries per measurement')
+    parser.add_argument('--response-share', type=float, default=0.5, help='share of addresses with a response')
+    parser.add_argument('--dense-networks', type=int, help='pack the addresses into this many /16 networks')
+    parser.add_argument('--scan-sample', type=int, default=20, help='CIDR queries timed with the linear scan')
+    args = parser.parse_args()
+
+    random.seed(42)
+    if args.dense_networks:
+        networks = random.sample(range(1 << 16), args.dense_networks)
+        addresses = [networks[value >> 16] << 16 | value & 0xFFFF
+                     for value in random.sample(range(args.dense_networks << 16), args.ips)]
+    else:
+        addresses = random.sample(range(1 << 32), args.ips)
+    actions = [action for group in config.RESPONSE_ACTIONS.values() for action in group]
+    timestamp = '2024-06-01T12:00:00'
+    threat = {'ip': None, 'severity': None, 'timestamp': timestamp}
+    response_log = {'targetIp': None, 'action': None, 'timestamp': timestamp}
+
+    index = IpIndex()
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    for value in addresses:
+        threat['ip'] = ip = dotted(value)
+        threat['severity'] = random.choice(config.THREAT_SEVERITIES)
+        index.record_threat(threat)
+        if random.random() < args.response_share:
+            response_log['targetIp'] = ip
+            response_log['action'] = random.choice(actions)
+            index.record_response(response_log)
+    build_seconds = time.perf_counter() - started
+
+    print(f"{len(index):,} addresses indexed in {build_seconds:.1f}s "
+          f"({len(index) / build_seconds:,.0f}/s), ~{rss_mb() - rss_before:,.0f} MB")
+
+    samples = [dotted(value) for value in random.sample(addresses, min(args.queries, len(addresses)))]
+    print(f"  lookup(ip)         {timed(index.lookup, samples):8.2f} us")
+    misses = [dotted(random.getrandbits(32)) for _ in range(args.queries)]
+    print(f"  lookup(unseen ip)  {timed(index.lookup, misses):8.2f} us")
+
+    for length in PREFIX_LENGTHS:
+        mask = ((1 << length) - 1) << (32 - length)
+        prefixes = [f"{dotted(value & mask)}/{length}" for value in random.sample(addresses, args.queries)]
+        print(f"  network(/{length:<2})       {timed(index.network, prefixes):8.2f} us")
+
+    # What each CIDR query cost before the index: a pass over every address
+    scan_prefixes = [(value & 0xFFFFFF00, 24) for value in random.sample(addresses, args.scan_sample)]
+    started = time.perf_counter()
+    for start, length in scan_prefixes:
+        end = start + (1 << (32 - length))
+        sum(1 for value in addresses if start <= value < end)
+    scan_us = (time.perf_counter() - started) / len(scan_prefixes) * 1e6
+    print(f"  linear scan (/24)  {scan_us:8.0f} us")
+
+
+if __name__ == '__main__':
+    main()
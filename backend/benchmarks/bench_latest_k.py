@@ -0,0 +1,89 @@
+"""
+Benchmark: "latest K" reads against history size
+
+Times the old per-request approach (sort the whole store, slice 50) against
+serving the newest 50 from the pre-sorted store, and the full
+/api/response-logs request on the in-memory server, at growing store sizes.
+Store-backed reads should stay flat as the history grows; the load time
+includes the 1% of logs that arrive out of order.
+
+Usage:
+    python benchmarks/bench_latest_k.py --sizes 1000,10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stores import SegmentedStore
+from records import ResponseRecord
+import app_enhanced
+
+LATEST = 50
+SAMPLES = 200
+
+
+def generate_logs(count):
+    """Response logs a second apart, with 1% arriving late"""
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        offset = i - random.randint(1, 600) if random.random() < 0.01 else i
+        yield {
+            'logId': f"LOG-{i:010d}",
+            'action': 'IP Blocked',
+            'targetIp': f"10.0.{random.randint(0, 255)}.{random.randint(1, 254)}",
+            'status': 'Success',
+            'timestamp': (start + timedelta(seconds=max(offset, 0))).isoformat()
+        }
+
+
+def percentiles(fn, samples=SAMPLES):
+    timings = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+
+def report(label, result):
+    print(f"  {label:<30} p50={result[0]:9.3f}ms p99={result[1]:9.3f}ms")
+
+
+def bench_size(size, client):
+    store = SegmentedStore(key=app_enhanced.by_time('logId'))
+    t0 = time.perf_counter()
+    for log in generate_logs(size):
+        store.append(ResponseRecord.from_dict(log))
+    print(f"{size:,} logs (loaded in {time.perf_counter() - t0:.2f}s)")
+
+    snapshot = store.snapshot()
+    plain = list(snapshot)
+    sort_samples = max(5, min(SAMPLES, 2000000 // size))
+    report('sorted()[:50] per request', percentiles(
+        lambda: sorted(plain, key=lambda x: x['timestamp'], reverse=True)[:LATEST], sort_samples))
+    report('snapshot().newest(50)', percentiles(lambda: store.snapshot().newest(LATEST)))
+
+    # Full requests against the server, with its stores swapped for the loaded one
+    app_enhanced.response_logs = store
+    report('GET /api/response-logs', percentiles(lambda: client.get('/api/response-logs')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                        help='comma-separated store sizes')
+    args = parser.parse_args()
+
+    client = app_enhanced.app.test_client()
+    for size in (int(value) for value in args.sizes.split(',')):
+        bench_size(size, client)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: ledger verification throughput
+
+Builds an in-memory hash chain, verifies it once from genesis, then appends a
+small batch and verifies again from the checkpoint to show that incremental
+verification only pays for the new blocks.
+
+Usage:
+    python benchmarks/bench_ledger_verify.py --blocks 1000000 --new 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blockchain import GENESIS_HASH, LedgerVerifier, compute_threat_hash, seal_block
+import config
+
+
+def build_chain(ledger, count):
+    """Append count blocks to ledger, each linked to the previous one"""
+    previous_hash = ledger[-1]['currentHash'] if ledger else GENESIS_HASH
+    start = datetime(2026, 1, 1)
+
+    for _ in range(count):
+        number = len(ledger) + 1
+        threat = {
+            'threatId': f"THR-{number}",
+            'type': random.choice(config.THREAT_TYPES),
+            'severity': random.choice(config.THREAT_SEVERITIES),
+            'timestamp': (start + timedelta(seconds=number)).isoformat(),
+            'nodeId': random.choice(config.NODES)['nodeId']
+        }
+        block = seal_block({
+            'blockNumber': number,
+            'threatHash': compute_threat_hash(threat),
+            'previousHash': previous_hash,
+            'threatType': threat['type'],
+            'threatId': threat['threatId'],
+            'timestamp': threat['timestamp'],
+            'nodeId': threat['nodeId'],
+            'severity': threat['severity']
+        })
+        ledger.append(block)
+        previous_hash = block['currentHash']
+
+
+def timed_verify(verifier, ledger):
+    start = verifier.checkpoint['blockNumber']
+    t0 = time.perf_counter()
+    result = verifier.verify(ledger[i] for i in range(start, len(ledger)))
+    elapsed = time.perf_counter() - t0
+    assert result['valid'], result
+    return result['blocksChecked'], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--blocks', type=int, default=1000000, help='initial ledger size')
+    parser.add_argument('--new', type=int, default=1000, help='blocks appended before re-verifying')
+    args = parser.parse_args()
+
+    ledger = []
+    t0 = time.perf_counter()
+    build_chain(ledger, args.blocks)
+    print(f"built {args.blocks:,} blocks in {time.perf_counter() - t0:.2f}s")
+
+    verifier = LedgerVerifier()
+    checked, elapsed = timed_verify(verifier, ledger)
+    print(f"full verify:        {checked:>10,} blocks in {elapsed * 1000:10.2f}ms "
+          f"({checked / elapsed:,.0f} blocks/s)")
+
+    build_chain(ledger, args.new)
+    checked, elapsed = timed_verify(verifier, ledger)
+    print(f"incremental verify: {checked:>10,} blocks in {elapsed * 1000:10.2f}ms "
+          f"({checked / elapsed:,.0f} blocks/s)")
+
+    checked, elapsed = timed_verify(verifier, ledger)
+    print(f"no-op verify:       {checked:>10,} blocks in {elapsed * 1000:10.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: live_threats write path
+
+Compares the old count-then-delete trimming against the capped collection ring
+under a sustained threat rate, reporting MongoDB round trips and latency per
+threat. Runs against a scratch database on config.MONGO_URI.
+
+Usage:
+    python benchmarks/bench_live_threats.py --rate 1000 --seconds 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient, DESCENDING, monitoring
+import config
+
+BENCH_DATABASE = 'cyber_defense_bench'
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts every command sent to the server (one command = one round trip)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def make_threat():
+    return {
+        'threatId': f"THR-{random.randint(1000, 9999)}",
+        'type': random.choice(config.THREAT_TYPES),
+        'severity': random.choice(config.THREAT_SEVERITIES),
+        'ip': f"10.0.{random.randint(0, 255)}.{random.randint(1, 255)}",
+        'timestamp': datetime.now().isoformat(),
+        'status': random.choice(config.THREAT_STATUSES),
+    }
+
+
+def write_trimmed(collection, threat):
+    """Old path: insert, count, sorted find, one delete per stale document"""
+    collection.insert_one(threat)
+    count = collection.count_documents({})
+    if count > config.LIVE_THREATS_LIMIT:
+        oldest = collection.find().sort('timestamp', 1).limit(count - config.LIVE_THREATS_LIMIT)
+        for old in oldest:
+            collection.delete_one({'_id': old['_id']})
+
+
+def write_capped(collection, threat):
+    """New path: a single insert, the capped collection evicts the oldest"""
+    collection.insert_one(threat)
+
+
+def run(name, db, counter, writer, rate, seconds):
+    collection = db['live_threats_' + name]
+    collection.drop()
+    if name == 'capped':
+        db.create_collection(
+            collection.name,
+            capped=True,
+            size=config.LIVE_THREATS_CAPPED_SIZE,
+            max=config.LIVE_THREATS_LIMIT
+        )
+    else:
+        collection.create_index([('timestamp', DESCENDING)])
+
+    total = rate * seconds
+    interval = 1.0 / rate
+    latencies = []
+    counter.count = 0
+    start = time.perf_counter()
+
+    for i in range(total):
+        # Fixed-rate pacing: wait for this threat's slot, never for the previous write
+        slot = start + i * interval
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        t0 = time.perf_counter()
+        writer(collection, make_threat())
+        latencies.append(time.perf_counter() - t0)
+
+    elapsed = time.perf_counter() - start
+    round_trips = counter.count
+    latencies.sort()
+    collection.drop()
+
+    print(f"{name:>8}: {total} threats in {elapsed:.2f}s ({total / elapsed:,.0f}/s achieved)")
+    print(f"          round trips/threat: {round_trips / total:.2f}")
+    print(f"          latency p50={latencies[len(latencies) // 2] * 1000:.3f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms "
+          f"max={latencies[-1] * 1000:.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=int, default=1000, help='threats per second')
+    parser.add_argument('--seconds', type=int, default=10, help='duration of each run')
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    client = MongoClient(config.MONGO_URI, event_listeners=[counter])
+    db = client[BENCH_DATABASE]
+
+    try:
+        run('trimmed', db, counter, write_trimmed, args.rate, args.seconds)
+        run('capped', db, counter, write_capped, args.rate, args.seconds)
+    finally:
+        client.drop_database(BENCH_DATABASE)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
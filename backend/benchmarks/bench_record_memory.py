@@ -0,0 +1,81 @@
+"""
+Benchmark: memory per million retained events, dicts vs compact records
+
+Builds N threats and N response logs the way app_enhanced.py does and measures
+the memory they retain (tracemalloc) as plain dicts and as ThreatRecord /
+ResponseRecord. "decoded" rows go through a JSON round trip first, like
+submitted or exported payloads, so their categorical strings are fresh
+objects rather than shared references to the config enums.
+
+Usage:
+    python benchmarks/bench_record_memory.py --events 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import ThreatRecord, ResponseRecord
+import app_enhanced
+
+
+def response_for(threat):
+    return {
+        'logId': f"LOG-{random.randint(1000, 9999)}",
+        'action': random.choice(app_enhanced.config.RESPONSE_ACTIONS[threat['severity']]),
+        'targetIp': threat['ip'],
+        'threatType': threat['type'],
+        'threatId': threat['threatId'],
+        'timestamp': datetime.now().isoformat(),
+        'status': 'Success' if random.random() > 0.1 else 'Pending',
+        'nodeId': threat['nodeId'],
+        'severity': threat['severity'],
+        'responseTime': f"{random.randint(10, 500)}ms",
+        'automated': True
+    }
+
+
+def retained(build, count):
+    """Bytes still allocated after building count rows with build()"""
+    gc.collect()
+    tracemalloc.start()
+    rows = [build() for _ in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    gc.collect()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=1000000, help='rows per measurement')
+    args = parser.parse_args()
+
+    def decoded(row):
+        return json.loads(json.dumps(row))
+
+    cases = [
+        ('threat dict', lambda: app_enhanced.generate_realistic_threat()),
+        ('ThreatRecord', lambda: ThreatRecord.from_dict(app_enhanced.generate_realistic_threat())),
+        ('threat dict (decoded)', lambda: decoded(app_enhanced.generate_realistic_threat())),
+        ('ThreatRecord (decoded)', lambda: ThreatRecord.from_dict(decoded(app_enhanced.generate_realistic_threat()))),
+        ('response dict', lambda: response_for(app_enhanced.generate_realistic_threat())),
+        ('ResponseRecord', lambda: ResponseRecord.from_dict(response_for(app_enhanced.generate_realistic_threat()))),
+    ]
+
+    print(f"{args.events:,} events per case")
+    scale = 1000000 / args.events
+    for label, build in cases:
+        size = retained(build, args.events)
+        print(f"  {label:<24} {size * scale / 1e6:8.1f}MB per million  ({size / args.events:6.0f} bytes/event)")
+
+
+if __name__ == '__main__':
+    main()
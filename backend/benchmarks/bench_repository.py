@@ -0,0 +1,186 @@
+"""
+Benchmark: storage backends under the same workload
+
+Generates one workload up front, then runs it against each repository
+backend: batched ingest of threats, response logs and Merkle blocks, followed
+by the reads the API serves. The reads are lookups by ID, history pages
+(head, deep cursor, filtered), latest responses and blocks, node counter
+updates, and a full ordered scan. The sqlite backend writes to a temporary
+file. The mongo backend uses a scratch database on config.MONGO_URI with the
+indexes from database.init_db.
+
+Usage:
+    python benchmarks/bench_repository.py --threats 200000
+    python benchmarks/bench_repository.py --backends sqlite,mongo --threats 1000000 --batch 1000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blockchain import GENESIS_HASH, build_batch_block
+from pagination import decode_cursor
+from repository import BACKENDS, MemoryRepository, default_nodes, default_ai_status
+from simulation import generate_threat, generate_response
+import config
+
+BENCH_DATABASE = 'cyber_defense_bench'
+PAGE_SIZE = 50
+SAMPLES = 500
+
+
+def generate_workload(count, batch_size):
+    """Batches of (threats, response logs, sealed blocks), in ascending time order"""
+    start = datetime(2026, 1, 1)
+    batches = []
+    threats = []
+    block_number = 1
+    previous_hash = GENESIS_HASH
+    pending = []
+    for i in range(count):
+        threat = generate_threat()
+        threat['timestamp'] = (start + timedelta(milliseconds=10 * i)).isoformat()
+        threats.append(threat)
+        pending.append(threat)
+        if len(threats) == batch_size or i == count - 1:
+            responses = [log for log in map(generate_response, threats) if log]
+            blocks = []
+            for offset in range(0, len(pending) - len(pending) % config.BLOCK_MAX_TRANSACTIONS,
+                                config.BLOCK_MAX_TRANSACTIONS):
+                block = build_batch_block(block_number, previous_hash,
+                                          pending[offset:offset + config.BLOCK_MAX_TRANSACTIONS], 'Node-A')
+                blocks.append(block)
+                block_number += 1
+                previous_hash = block['currentHash']
+            pending = pending[len(pending) - len(pending) % config.BLOCK_MAX_TRANSACTIONS:]
+            batches.append((threats, responses, blocks))
+            threats = []
+    return batches
+
+
+def report(label, timings):
+    timings.sort()
+    print(f"  {label:<30} p50={timings[len(timings) // 2] * 1000:8.3f}ms "
+          f"p99={timings[int(len(timings) * 0.99)] * 1000:8.3f}ms")
+
+
+def timed(function, arguments):
+    timings = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def open_mongo():
+    """MongoRepository on a fresh scratch database with the production indexes"""
+    from pymongo import MongoClient, DESCENDING
+    from database import THREAT_HISTORY_INDEXES
+    from mongo_repository import MongoRepository
+
+    client = MongoClient(config.MONGO_URI)
+    client.drop_database(BENCH_DATABASE)
+    db = client[BENCH_DATABASE]
+    for keys in THREAT_HISTORY_INDEXES:
+        db[config.COLLECTIONS['THREAT_HISTORY']].create_index(keys)
+    db[config.COLLECTIONS['THREAT_HISTORY']].create_index('threatId', unique=True)
+    db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].create_index([('blockNumber', DESCENDING)], unique=True)
+    db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].create_index('threatIds')
+    db[config.COLLECTIONS['RESPONSE_LOGS']].create_index([('timestamp', DESCENDING)])
+    db[config.COLLECTIONS['RESPONSE_LOGS']].create_index('logId', unique=True)
+    db[config.COLLECTIONS['NODES_STATUS']].insert_many(default_nodes())
+    db[config.COLLECTIONS['AI_STATUS']].insert_one(default_ai_status())
+
+    def cleanup():
+        client.drop_database(BENCH_DATABASE)
+        client.close()
+    return MongoRepository(db), cleanup
+
+
+def open_backend(name):
+    """(repository, cleanup) for a backend name"""
+    if name == 'memory':
+        return MemoryRepository(), lambda: None
+    if name == 'sqlite':
+        from sqlite_repository import SqliteRepository
+        directory = tempfile.mkdtemp(prefix='bench_repository_')
+        repository = SqliteRepository(os.path.join(directory, 'bench.db'))
+
+        def cleanup():
+            repository.close()
+            shutil.rmtree(directory)
+        return repository, cleanup
+    return open_mongo()
+
+
+def bench(repository, workload):
+    threat_count = sum(len(threats) for threats, _, _ in workload)
+    started = time.perf_counter()
+    for threats, responses, blocks in workload:
+        repository.add_threats(threats)
+        repository.add_responses(responses)
+        for block in blocks:
+            repository.append_block(block)
+        repository.update_ai_status(increments={'threatsAnalyzed': len(threats)})
+    seconds = time.perf_counter() - started
+    print(f"  ingest                         {threat_count / seconds:>10,.0f} threats/s "
+          f"({repository.count_blocks():,} blocks, {repository.count_responses():,} responses)")
+
+    all_threats = [threat for threats, _, _ in workload for threat in threats]
+    sample = random.sample(all_threats, min(SAMPLES, len(all_threats)))
+    base = {'limit': PAGE_SIZE, 'cursor': None, 'filters': {}, 'since': None, 'until': None}
+
+    report('get_threat', timed(repository.get_threat, [threat['threatId'] for threat in sample]))
+    report('block_number_of', timed(repository.block_number_of, [threat['threatId'] for threat in sample]))
+    report('history first page', timed(repository.threat_page, [base] * SAMPLES))
+
+    # A cursor a quarter of the way back, from a page that long (cursor formats differ per backend)
+    _, cursor = repository.threat_page(dict(base, limit=max(len(all_threats) // 4, 1)))
+    if cursor:
+        deep = dict(base, cursor=decode_cursor(cursor))
+        report('history page at 25% depth', timed(repository.threat_page, [deep] * SAMPLES))
+    report('severity filter page', timed(
+        repository.threat_page, [dict(base, filters={'severity': 'Critical'})] * SAMPLES))
+    # Rare values: the memory backend has no secondary index and walks the whole history
+    report('ip filter page', timed(
+        repository.threat_page, [dict(base, filters={'ip': threat['ip']}) for threat in sample[:50]]))
+    report('latest 50 responses', timed(lambda _: repository.latest_responses(50), range(SAMPLES)))
+    report('latest 50 blocks', timed(lambda _: repository.latest_blocks(50), range(SAMPLES)))
+    report('node counter update', timed(
+        lambda node_id: repository.update_node(node_id, increments={'threatsDetected': 1}),
+        [random.choice(config.NODES)['nodeId'] for _ in range(SAMPLES)]))
+
+    started = time.perf_counter()
+    scanned = sum(1 for _ in repository.iter_threats())
+    print(f"  full scan (iter_threats)       {scanned / (time.perf_counter() - started):>10,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backends', default='memory,sqlite', help=f"comma-separated: {', '.join(BACKENDS)}")
+    parser.add_argument('--threats', type=int, default=200_000, help='threats to ingest')
+    parser.add_argument('--batch', type=int, default=500, help='threats per add_threats call')
+    args = parser.parse_args()
+
+    random.seed(3)
+    workload = generate_workload(args.threats, args.batch)
+    for name in args.backends.split(','):
+        if name not in BACKENDS:
+            parser.error(f"unknown backend {name}")
+        print(f"{name}: {args.threats:,} threats in batches of {args.batch}")
+        repository, cleanup = open_backend(name)
+        try:
+            bench(repository, workload)
+        finally:
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: segment log backend against the MongoDB path
+
+Appends one generated workload (threats, response logs, Merkle blocks)
+through LogRepository and through MongoRepository on a scratch database with
+the database.init_db indexes, then times the tail reads the dashboard polls:
+the newest history page, latest responses and blocks, and lookups by ID. For
+the segment log it also times raw appends under each fsync policy and the
+recovery pass that reopening a log directory runs.
+
+MongoDB acknowledges writes once they reach its journal, which is committed
+every 100ms by default; the log's group commit (config.LOG_FSYNC_INTERVAL)
+is the comparable setting.
+
+Usage:
+    python benchmarks/bench_segment_log.py --threats 200000
+    python benchmarks/bench_segment_log.py --targets log,mongo --batch 100
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_repository import generate_workload, open_mongo, report, timed, PAGE_SIZE, SAMPLES
+from log_repository import LogRepository, time_key
+from segment_log import SegmentLog
+import config
+
+TARGETS = ('log', 'mongo')
+
+
+def bench_raw_append(workload):
+    """SegmentLog.append alone, with no fsync, a group fsync, and an fsync per batch"""
+    batches = [
+        [(time_key(threat['timestamp'], threat['threatId']), json.dumps(threat).encode()) for threat in threats]
+        for threats, _, _ in workload
+    ]
+    count = sum(len(batch) for batch in batches)
+    size = sum(len(key) + len(payload) for batch in batches for key, payload in batch)
+
+    for policy in ('none', 'group', 'every batch'):
+        directory = tempfile.mkdtemp(prefix='bench_segment_log_')
+        log = SegmentLog(directory)
+        started = last_sync = time.perf_counter()
+        for batch in batches:
+            log.append(batch)
+            now = time.perf_counter()
+            if policy == 'every batch' or policy == 'group' and now - last_sync >= config.LOG_FSYNC_INTERVAL:
+                log.sync()
+                last_sync = now
+        log.sync()
+        seconds = time.perf_counter() - started
+        print(f"  raw append, fsync {policy:<12} {count / seconds:>10,.0f} records/s "
+              f"{size / seconds / 1e6:8.1f} MB/s")
+        log.close()
+        shutil.rmtree(directory)
+
+
+def bench_target(repository, workload):
+    threat_count = sum(len(threats) for threats, _, _ in workload)
+    started = time.perf_counter()
+    for threats, responses, blocks in workload:
+        repository.add_threats(threats)
+        repository.add_responses(responses)
+        for block in blocks:
+            repository.append_block(block)
+    seconds = time.perf_counter() - started
+    print(f"  append                         {threat_count / seconds:>10,.0f} threats/s "
+          f"({repository.count_blocks():,} blocks, {repository.count_responses():,} responses)")
+
+    all_threats = [threat for threats, _, _ in workload for threat in threats]
+    sample = random.sample(all_threats, min(SAMPLES, len(all_threats)))
+    head = {'limit': PAGE_SIZE, 'cursor': None, 'filters': {}, 'since': None, 'until': None}
+
+    report('tail: history first page', timed(repository.threat_page, [head] * SAMPLES))
+    report('tail: latest 50 responses', timed(lambda _: repository.latest_responses(50), range(SAMPLES)))
+    report('tail: latest 50 blocks', timed(lambda _: repository.latest_blocks(50), range(SAMPLES)))
+    report('tail: last block', timed(lambda _: repository.last_block(), range(SAMPLES)))
+    report('get_threat', timed(repository.get_threat, [threat['threatId'] for threat in sample]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', default='log', help=f"comma-separated: {', '.join(TARGETS)}")
+    parser.add_argument('--threats', type=int, default=200_000, help='threats to append')
+    parser.add_argument('--batch', type=int, default=500, help='threats per append')
+    args = parser.parse_args()
+
+    random.seed(5)
+    workload = generate_workload(args.threats, args.batch)
+    for name in args.targets.split(','):
+        if name not in TARGETS:
+            parser.error(f"unknown target {name}")
+        print(f"{name}: {args.threats:,} threats in batches of {args.batch}")
+        if name == 'mongo':
+            repository, cleanup = open_mongo()
+            try:
+                bench_target(repository, workload)
+            finally:
+                cleanup()
+            continue
+
+        bench_raw_append(workload)
+        directory = tempfile.mkdtemp(prefix='bench_segment_log_')
+        try:
+            repository = LogRepository(directory)
+            bench_target(repository, workload)
+            repository.close()
+
+            started = time.perf_counter()
+            repository = LogRepository(directory)
+            print(f"  reopen (recovery + index rebuild) {(time.perf_counter() - started) * 1000:8.1f}ms "
+                  f"for {repository.count_threats():,} threats")
+            repository.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: app_enhanced boot from a snapshot
+
+Builds a memory-backend snapshot holding N threats (with their response logs,
+blocks and enforcement rules) in a scratch directory, then boots app_enhanced
+from it in fresh processes. It reports the time from interpreter start to the
+first served history page, and the time until the cold history is loaded in
+the background. The target is a first page in well under a second.
+
+The threats are spread evenly over the history retention period, ending now,
+as a retained history would be. A shorter --span-hours packs them closer:
+every response inside the last hour leaves an enforcement rule in force, so
+that also measures restoring a large blocklist.
+
+Usage:
+    python benchmarks/bench_startup.py --threats 1000000
+    python benchmarks/bench_startup.py --threats 200000 --boots 5 --keep
+    python benchmarks/bench_startup.py --threats 1000000 --span-hours 3
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET_SECONDS = 1.0
+
+
+def configure(directory):
+    """Point app_enhanced's files at the scratch directory (before it is imported)"""
+    sys.path.insert(0, BACKEND)
+    import config
+    config.STORAGE_BACKEND = 'memory'
+    config.SNAPSHOT_DIR = os.path.join(directory, 'data')
+    config.ARCHIVE_DIR = os.path.join(directory, 'archive')
+    return config
+
+
+def build(directory, count, batch, span_hours):
+    """Child process: ingest count back-dated threats, then write the snapshot"""
+    from datetime import datetime, timedelta
+    config = configure(directory)
+    import app_enhanced
+    from simulation import generate_threat
+
+    started = time.perf_counter()
+    # Newest last, evenly spaced, ending now; a minute inside retention so none expires meanwhile
+    span = timedelta(hours=span_hours) if span_hours else timedelta(days=config.HISTORY_RETENTION_DAYS, minutes=-1)
+    step = span / count
+    first = datetime.now() - span
+    for offset in range(0, count, batch):
+        threats = []
+        for i in range(offset, min(offset + batch, count)):
+            threat = generate_threat()
+            threat['timestamp'] = (first + step * i).isoformat()
+            threats.append(threat)
+        app_enhanced.ingest_threats(threats, live=False)
+    ingested = time.perf_counter() - started
+
+    app_enhanced.save_snapshot()
+    print(json.dumps({
+        'ingestSeconds': ingested,
+        'rules': app_enhanced.enforcement.get_metrics()['rules'],
+        'snapshotBytes': os.path.getsize(app_enhanced.snapshot_path)
+    }))
+
+
+def boot(directory, started):
+    """Child process: import app_enhanced and serve one history page; started is the interpreter start"""
+    configure(directory)
+    import app_enhanced
+
+    client = app_enhanced.app.test_client()
+    response = client.get('/api/threat-history?limit=50')
+    first_page = time.time() - started
+    assert response.status_code == 200, response.status_code
+
+    app_enhanced.wait_for_history()
+    print(json.dumps({
+        'firstPage': first_page,
+        'coldLoaded': time.time() - started,
+        'threats': app_enhanced.repository.count_threats()
+    }), flush=True)
+    # Skip the exit snapshot the first request registered: the next boot must read the same file
+    os._exit(0)
+
+
+def run(args):
+    process = subprocess.run(args, capture_output=True, text=True, check=True)
+    # The app prints its own progress; the result is the last JSON line
+    return json.loads([line for line in process.stdout.splitlines() if line.startswith('{')][-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threats', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=5000, help='threats per ingest batch while building')
+    parser.add_argument('--span-hours', type=float, help='time the threats are spread over (default: the retention period)')
+    parser.add_argument('--boots', type=int, default=3)
+    parser.add_argument('--keep', action='store_true', help='leave the scratch directory in place')
+    parser.add_argument('--phase', choices=('build', 'boot'), help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    parser.add_argument('--started', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase == 'build':
+        return build(args.dir, args.threats, args.batch, args.span_hours)
+    if args.phase == 'boot':
+        return boot(args.dir, args.started)
+
+    directory = tempfile.mkdtemp(prefix='cdm-startup-')
+    script = os.path.abspath(__file__)
+    try:
+        print(f"Building a snapshot of {args.threats:,} threats in {directory} ...")
+        build_args = ['--threats', str(args.threats), '--batch', str(args.batch)]
+        if args.span_hours:
+            build_args += ['--span-hours', str(args.span_hours)]
+        built = run([sys.executable, script, '--phase', 'build', '--dir', directory] + build_args)
+        print(f"  ingested in {built['ingestSeconds']:.1f}s, {built['rules']:,} enforcement rules, "
+              f"snapshot {built['snapshotBytes'] / 1e6:.1f} MB")
+
+        print(f"Booting {args.boots} times:")
+        first_pages = []
+        for _ in range(args.boots):
+            # Measured from just before the interpreter starts, so imports count too
+            result = run([sys.executable, script, '--phase', 'boot', '--dir', directory,
+                          '--started', repr(time.time())])
+            first_pages.append(result['firstPage'])
+            print(f"  first page {result['firstPage'] * 1000:7.0f} ms | "
+                  f"cold history loaded {result['coldLoaded']:6.2f} s | {result['threats']:,} threats")
+
+        best = min(first_pages)
+        verdict = 'meets' if best < TARGET_SECONDS else 'misses'
+        print(f"Best first page {best * 1000:.0f} ms: {verdict} the {TARGET_SECONDS * 1000:.0f} ms target")
+    finally:
+        if args.keep:
+            print(f"Kept {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
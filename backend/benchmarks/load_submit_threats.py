@@ -0,0 +1,134 @@
+"""
+Load test: sustained batch submissions to POST /api/submit-threats
+
+Client threads send batches for a fixed duration, either in-process through
+Flask's test client (the default) or to a running server with --url. Reports
+accepted threats/sec at the API, 503 refusals and, in-process, how long the
+ingest workers take to drain what was accepted.
+
+Usage:
+    python benchmarks/load_submit_threats.py --clients 8 --batch 500 --seconds 10
+    python benchmarks/load_submit_threats.py --url http://localhost:5001 --ndjson
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+
+def make_body(batch, ndjson):
+    threats = [{
+        'threatType': random.choice(config.THREAT_TYPES),
+        'severity': random.choice(config.THREAT_SEVERITIES),
+        'ip': f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}",
+        'protocol': random.choice(config.THREAT_PROTOCOLS),
+        'port': random.choice(config.THREAT_PORTS)
+    } for _ in range(batch)]
+    if ndjson:
+        return '\n'.join(json.dumps(threat) for threat in threats).encode(), 'application/x-ndjson'
+    return json.dumps(threats).encode(), 'application/json'
+
+
+def post_in_process(client):
+    def post(body, content_type):
+        response = client.post('/api/submit-threats', data=body, content_type=content_type)
+        return response.status_code, response.get_json()
+    return post
+
+
+def post_http(url):
+    def post(body, content_type):
+        request = urllib.request.Request(
+            f"{url.rstrip('/')}/api/submit-threats",
+            data=body,
+            headers={'Content-Type': content_type},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b'{}')
+    return post
+
+
+def client_loop(post, args, deadline, totals, lock):
+    # Bodies are prebuilt so the clients measure the server, not JSON encoding
+    bodies = [make_body(args.batch, args.ndjson) for _ in range(8)]
+    accepted = refused = requests = 0
+    while time.perf_counter() < deadline:
+        status, payload = post(*bodies[requests % len(bodies)])
+        requests += 1
+        if status == 202:
+            accepted += payload['accepted']
+        elif status == 503:
+            refused += args.batch
+            time.sleep(0.01)
+        else:
+            raise RuntimeError(f"submit-threats returned {status}: {payload}")
+    with lock:
+        totals['accepted'] += accepted
+        totals['refused'] += refused
+        totals['requests'] += requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--batch', type=int, default=500, help='threats per request')
+    parser.add_argument('--seconds', type=float, default=10, help='test duration')
+    parser.add_argument('--ndjson', action='store_true', help='send NDJSON instead of a JSON array')
+    parser.add_argument('--url', help='base URL of a running server (default: in-process)')
+    args = parser.parse_args()
+
+    if args.url:
+        make_post = lambda: post_http(args.url)
+        app_enhanced = None
+    else:
+        import app_enhanced
+        app_enhanced.submission_queue.start()
+        make_post = lambda: post_in_process(app_enhanced.app.test_client())
+
+    totals = {'accepted': 0, 'refused': 0, 'requests': 0}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    threads = [
+        threading.Thread(target=client_loop, args=(make_post(), args, deadline, totals, lock))
+        for _ in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"clients={args.clients} batch={args.batch} body={'ndjson' if args.ndjson else 'json'} "
+          f"duration={elapsed:.1f}s")
+    print(f"  requests      {totals['requests']:>10,}  ({totals['requests'] / elapsed:,.0f}/s)")
+    print(f"  accepted      {totals['accepted']:>10,}  ({totals['accepted'] / elapsed:,.0f} threats/s)")
+    print(f"  refused (503) {totals['refused']:>10,}")
+
+    if app_enhanced is not None:
+        drain_started = time.perf_counter()
+        app_enhanced.submission_queue.join()
+        drained = time.perf_counter() - started
+        metrics = app_enhanced.submission_queue.get_metrics()
+        print(f"  drained in    {time.perf_counter() - drain_started:>9.2f}s after the last request")
+        print(f"  ingested      {metrics['processed']:>10,}  ({metrics['processed'] / drained:,.0f} threats/s "
+              f"end to end, {metrics['batches']:,} worker batches, max {metrics['maxBatchMs']}ms)")
+        if metrics['failed']:
+            print(f"  FAILED        {metrics['failed']:>10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Stress test: concurrent threat submissions against the in-memory server
+
+Many threads POST /api/submit-threat at once through Flask's test client
+while others read the history, ledger and proofs. Afterwards the ledger must
+verify end to end with contiguous block numbers and no forks, the history must
+still be in (timestamp, threatId) order and every submission must be accounted for.
+
+Usage:
+    python benchmarks/stress_chain_integrity.py --threads 64 --per-thread 50
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import app_enhanced
+
+
+def submit(client, count, submitted, errors):
+    for _ in range(count):
+        response = client.post('/api/submit-threat', json={
+            'threatType': random.choice(config.THREAT_TYPES),
+            'severity': random.choice(config.THREAT_SEVERITIES),
+            'ip': f"10.0.{random.randint(0, 255)}.{random.randint(1, 254)}",
+            'description': 'stress test'
+        })
+        if response.status_code != 201:
+            errors.append(f"submit returned {response.status_code}")
+            continue
+        submitted.append(response.get_json()['threat']['threatId'])
+
+
+def read(client, stop, errors):
+    while not stop.is_set():
+        for url in ('/api/threat-history?limit=50', '/api/blockchain-ledger', '/api/live-threats'):
+            response = client.get(url)
+            if response.status_code != 200:
+                errors.append(f"{url} returned {response.status_code}")
+
+
+def check(submitted, errors):
+    with app_enhanced.write_lock:
+        app_enhanced.block_builder.flush()
+    ledger = list(app_enhanced.blockchain_ledger.snapshot())
+    history = list(app_enhanced.threat_history.snapshot())
+
+    numbers = [block['blockNumber'] for block in ledger]
+    if numbers != list(range(1, len(ledger) + 1)):
+        errors.append('block numbers are not contiguous')
+
+    app_enhanced.ledger_verifier.reset()
+    result = app_enhanced.verify_ledger()
+    if not result['valid']:
+        errors.append(f"ledger verification failed at block #{result['brokenAt']}: {result['reason']}")
+
+    keys = [(threat['timestamp'], threat['threatId']) for threat in history]
+    if keys != sorted(keys):
+        errors.append('history is out of (timestamp, threatId) order')
+
+    sealed = {threat_id for block in ledger for threat_id in block['threatIds']}
+    missing = [threat_id for threat_id in submitted if threat_id not in sealed]
+    if missing:
+        errors.append(f"{len(missing)} submitted threats missing from the ledger")
+    if sum(block['transactionCount'] for block in ledger) != len(history):
+        errors.append('ledger transaction count does not match the history')
+
+    return ledger, history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=64, help='concurrent writers')
+    parser.add_argument('--per-thread', type=int, default=50, help='submissions per writer')
+    parser.add_argument('--readers', type=int, default=4, help='concurrent readers')
+    parser.add_argument('--block-size', type=int, default=5, help='transactions per block')
+    args = parser.parse_args()
+
+    # Small blocks so sealing races with ingestion as often as possible
+    app_enhanced.block_builder.max_transactions = args.block_size
+    client = app_enhanced.app.test_client()
+    submitted, errors = [], []
+    stop = threading.Event()
+
+    writers = [
+        threading.Thread(target=submit, args=(client, args.per_thread, submitted, errors))
+        for _ in range(args.threads)
+    ]
+    readers = [threading.Thread(target=read, args=(client, stop, errors)) for _ in range(args.readers)]
+
+    t0 = time.perf_counter()
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    ledger, history = check(submitted, errors)
+    print(f"{len(submitted):,} submissions from {args.threads} threads in {elapsed:.2f}s "
+          f"({len(submitted) / elapsed:,.0f}/s)")
+    print(f"  history={len(history):,} blocks={len(ledger):,}")
+
+    if errors:
+        for error in sorted(set(errors)):
+            print(f"  FAIL: {error}")
+        sys.exit(1)
+    print("  OK: ledger verified, block numbers contiguous, history ordered")
+
+
+if __name__ == '__main__':
+    main()
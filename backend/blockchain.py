@@ -0,0 +1,372 @@
+"""
+Deterministic hash chain for the threat ledger: content hashes for threats and
+blocks, Merkle-batched blocks with inclusion proofs, and an incremental
+verifier that resumes from a stored checkpoint
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+import config
+
+GENESIS_HASH = '0' * 64
+
+# Blocks written before the hash chain (user-004) carry a random 16-character
+# currentHash that no content hash can reproduce, chained from '0' * 16
+LEGACY_GENESIS_HASH = '0' * 16
+
+# Fields that are not part of the block header hash: derived values, plus the
+# transaction lists which the header commits to through merkleRoot
+NON_CONTENT_FIELDS = ('_id', 'currentHash', 'verificationStatus', 'transactions', 'threatIds')
+
+SEVERITY_RANK = {severity: rank for rank, severity in enumerate(config.THREAT_SEVERITIES)}
+
+VERIFIED = '✅ Verified'
+PENDING = '⏳ Pending'
+TAMPERED = '❌ Tampered'
+LEGACY = '⚠️ Legacy (unverifiable)'
+
+
+def _digest(document, skip):
+    """SHA-256 over a canonical JSON encoding of the document's content fields"""
+    content = {key: value for key, value in document.items() if key not in skip}
+    encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def compute_threat_hash(threat):
+    """Hash of a threat's contents"""
+    return _digest(threat, ('_id',))
+
+
+def compute_block_hash(block):
+    """Hash of a block's contents, including its previousHash link"""
+    return _digest(block, NON_CONTENT_FIELDS)
+
+
+def seal_block(block):
+    """Set currentHash on a block built without one and return it"""
+    block['currentHash'] = compute_block_hash(block)
+    return block
+
+
+# ==================== MERKLE TREE ====================
+
+def _hash_leaf(leaf):
+    # Leaf and node hashes use different prefixes so an inner node can never
+    # be passed off as a leaf (second-preimage protection)
+    return hashlib.sha256(b'\x00' + leaf.encode()).hexdigest()
+
+
+def _hash_node(left, right):
+    return hashlib.sha256(b'\x01' + left.encode() + right.encode()).hexdigest()
+
+
+# Blocks sealed before MERKLE_VERSION was recorded duplicate the last node of
+# an odd level, which lets [a, b, c] and [a, b, c, c] share a root
+# (CVE-2012-2459). Current blocks promote it unchanged instead; either way the
+# verifier also checks transactionCount, which the header hash covers.
+LEGACY_MERKLE_VERSION = 1
+MERKLE_VERSION = 2
+
+
+def _next_level(level, version=MERKLE_VERSION):
+    promoted = []
+    if len(level) % 2:
+        if version == LEGACY_MERKLE_VERSION:
+            level = level + [level[-1]]
+        else:
+            level, promoted = level[:-1], level[-1:]
+    return [_hash_node(level[i], level[i + 1]) for i in range(0, len(level), 2)] + promoted
+
+
+def merkle_root(leaves, version=MERKLE_VERSION):
+    """Root of the Merkle tree over leaves (odd levels promote their last node)"""
+    if not leaves:
+        return GENESIS_HASH
+    level = [_hash_leaf(leaf) for leaf in leaves]
+    while len(level) > 1:
+        level = _next_level(level, version)
+    return level[0]
+
+
+def merkle_proof(leaves, index, version=MERKLE_VERSION):
+    """Sibling path proving leaves[index] is under merkle_root(leaves, version)"""
+    proof = []
+    level = [_hash_leaf(leaf) for leaf in leaves]
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({
+                'position': 'left' if sibling < index else 'right',
+                'hash': level[sibling]
+            })
+        elif version == LEGACY_MERKLE_VERSION:
+            proof.append({'position': 'right', 'hash': level[index]})
+        # else: the last node of an odd level is promoted, so this level adds no step
+        level = _next_level(level, version)
+        index //= 2
+    return proof
+
+
+def block_merkle_version(block):
+    return block.get('merkleVersion', LEGACY_MERKLE_VERSION)
+
+
+def verify_merkle_proof(leaf, proof, root):
+    """Recompute the root from a leaf and its sibling path"""
+    current = _hash_leaf(leaf)
+    for step in proof:
+        if step['position'] == 'left':
+            current = _hash_node(step['hash'], current)
+        else:
+            current = _hash_node(current, step['hash'])
+    return current == root
+
+
+def build_batch_block(block_number, previous_hash, threats, miner):
+    """Sealed block committing to a batch of threats through their Merkle root"""
+    transactions = [compute_threat_hash(threat) for threat in threats]
+    types = Counter(threat['type'] for threat in threats)
+    threat_type, count = types.most_common(1)[0]
+
+    return seal_block({
+        'blockNumber': block_number,
+        'previousHash': previous_hash,
+        'merkleRoot': merkle_root(transactions),
+        'merkleVersion': MERKLE_VERSION,
+        'transactionCount': len(transactions),
+        'transactions': transactions,
+        'threatIds': [threat['threatId'] for threat in threats],
+        'threatType': threat_type if count == len(threats) else f"Mixed ({len(types)} types)",
+        'severity': min((threat['severity'] for threat in threats),
+                        key=lambda severity: SEVERITY_RANK.get(severity, len(SEVERITY_RANK))),
+        'timestamp': datetime.now().isoformat(),
+        'firstTimestamp': min(threat['timestamp'] for threat in threats),
+        'lastTimestamp': max(threat['timestamp'] for threat in threats),
+        'nodeId': miner,
+        'minedBy': miner
+    })
+
+
+def is_legacy_block(block):
+    """Whether a block predates content hashing (its currentHash is not a SHA-256)"""
+    return len(block['currentHash']) != len(GENESIS_HASH)
+
+
+def block_event(block):
+    """Header-only view of a block for listings and push events"""
+    return {key: value for key, value in block.items() if key not in ('_id', 'transactions', 'threatIds')}
+
+
+def inclusion_proof(block, threat_id):
+    """Inclusion proof for one threat in a sealed batch block, or None"""
+    try:
+        index = block['threatIds'].index(threat_id)
+    except ValueError:
+        return None
+
+    leaf = block['transactions'][index]
+    proof = merkle_proof(block['transactions'], index, block_merkle_version(block))
+    return {
+        'threatId': threat_id,
+        'blockNumber': block['blockNumber'],
+        'blockHash': block['currentHash'],
+        'merkleRoot': block['merkleRoot'],
+        'leaf': leaf,
+        'leafIndex': index,
+        'proof': proof,
+        'verified': verify_merkle_proof(leaf, proof, block['merkleRoot'])
+    }
+
+
+class BlockBuilder:
+    """
+    Collects threats and seals them into one block when BLOCK_MAX_TRANSACTIONS
+    is reached or BLOCK_INTERVAL seconds have passed since the first one.
+    append_block(build_block) must assign the number and previousHash, store
+    the block and return it. While ready() is false nothing is sealed except
+    by flush(); threats keep queueing and are sealed (at most
+    BLOCK_MAX_TRANSACTIONS per block) once it is true again.
+    """
+
+    def __init__(self, append_block, max_transactions=None, interval=None, ready=None):
+        self.append_block = append_block
+        self.ready = ready or (lambda: True)
+        self.max_transactions = max_transactions or config.BLOCK_MAX_TRANSACTIONS
+        self.interval = interval or config.BLOCK_INTERVAL
+        self.lock = threading.Lock()
+        self.pending = []
+        self.opened_at = None
+        self.miner = None
+
+    def add(self, threat, miner):
+        """Queue a threat; returns the block sealed by this call, if any"""
+        with self.lock:
+            if not self.pending:
+                self.opened_at = time.monotonic()
+            self.pending.append(threat)
+            self.miner = miner
+            if len(self.pending) >= self.max_transactions and self.ready():
+                return self._seal()
+        return None
+
+    def tick(self):
+        """Seal the pending batch if its interval has elapsed"""
+        with self.lock:
+            if self.pending and time.monotonic() - self.opened_at >= self.interval and self.ready():
+                return self._seal()
+        return None
+
+    def flush(self):
+        """Seal whatever is pending regardless of size or age"""
+        with self.lock:
+            if self.pending:
+                return self._seal()
+        return None
+
+    def discard(self):
+        """Drop the pending batch without sealing it; returns the dropped threats"""
+        with self.lock:
+            threats, self.pending = self.pending, []
+        return threats
+
+    def pending_ids(self):
+        with self.lock:
+            return [threat['threatId'] for threat in self.pending]
+
+    def pending_threats(self):
+        with self.lock:
+            return list(self.pending)
+
+    def _seal(self):
+        threats, self.pending = self.pending[:self.max_transactions], self.pending[self.max_transactions:]
+        if self.pending:
+            self.opened_at = time.monotonic()
+        miner = self.miner
+        return self.append_block(
+            lambda block_number, previous_hash: build_batch_block(block_number, previous_hash, threats, miner)
+        )
+
+
+def new_checkpoint():
+    return {
+        'blockNumber': 0,
+        'currentHash': GENESIS_HASH,
+        'legacyThrough': 0,
+        'valid': True,
+        'brokenAt': None,
+        'reason': None,
+        'verifiedAt': None
+    }
+
+
+def _batch_mismatch(block):
+    """Why a batch block's transaction lists disagree with its header, or None"""
+    transactions = block.get('transactions') or []
+    if not len(transactions) == len(block.get('threatIds') or []) == block['transactionCount']:
+        return 'transactionCount does not match block transactions'
+    if merkle_root(transactions, block_merkle_version(block)) != block['merkleRoot']:
+        return 'merkleRoot does not match block transactions'
+    return None
+
+
+class LedgerVerifier:
+    """
+    Verifies the chain incrementally: each call only checks blocks after the
+    checkpoint left by the previous call, so cost is O(new blocks).
+
+    A database that already held blocks when content hashing was introduced
+    starts with a run of legacy blocks. Their hashes cannot be recomputed, so
+    the verifier only checks their numbering and links, records the last one
+    as legacyThrough, and anchors the chain at it: the first hashed block must
+    link to it and everything from there on is fully verified.
+    """
+
+    def __init__(self, checkpoint=None):
+        self.lock = threading.Lock()
+        self.checkpoint = dict(checkpoint) if checkpoint else new_checkpoint()
+        # Checkpoints stored before legacy anchoring
+        self.checkpoint.setdefault('legacyThrough', 0)
+
+    def reset(self):
+        """Forget the checkpoint so the next verify rescans from genesis"""
+        with self.lock:
+            self.checkpoint = new_checkpoint()
+
+    def verify(self, blocks):
+        """
+        Check blocks in ascending blockNumber order, starting right after the
+        checkpoint. Besides the header hash, each batch block's Merkle root and
+        transaction count are recomputed from its stored transactions, since the
+        header only commits to those through merkleRoot. Returns a summary; the
+        checkpoint advances to the last good block.
+        """
+        with self.lock:
+            checkpoint = self.checkpoint
+            started = time.perf_counter()
+            checked = 0
+
+            if checkpoint['valid']:
+                for block in blocks:
+                    reason = None
+                    # Legacy blocks only count as such in an unbroken run from genesis
+                    legacy = checkpoint['legacyThrough'] == checkpoint['blockNumber'] and is_legacy_block(block)
+                    previous_hash = checkpoint['currentHash']
+                    if legacy and checkpoint['blockNumber'] == 0:
+                        previous_hash = LEGACY_GENESIS_HASH
+                    if block['blockNumber'] != checkpoint['blockNumber'] + 1:
+                        reason = f"expected block #{checkpoint['blockNumber'] + 1}, found #{block['blockNumber']}"
+                    elif block['previousHash'] != previous_hash:
+                        reason = 'previousHash does not match the preceding block'
+                    elif legacy:
+                        checkpoint['legacyThrough'] = block['blockNumber']
+                    elif compute_block_hash(block) != block['currentHash']:
+                        reason = 'currentHash does not match block contents'
+                    elif 'merkleRoot' in block:
+                        reason = _batch_mismatch(block)
+
+                    checked += 1
+                    if reason:
+                        checkpoint['valid'] = False
+                        checkpoint['brokenAt'] = block['blockNumber']
+                        checkpoint['reason'] = reason
+                        break
+
+                    checkpoint['blockNumber'] = block['blockNumber']
+                    checkpoint['currentHash'] = block['currentHash']
+
+            checkpoint['verifiedAt'] = datetime.now().isoformat()
+            elapsed = time.perf_counter() - started
+
+            return {
+                'valid': checkpoint['valid'],
+                'verifiedThrough': checkpoint['blockNumber'],
+                'legacyThrough': checkpoint['legacyThrough'],
+                'brokenAt': checkpoint['brokenAt'],
+                'reason': checkpoint['reason'],
+                'blocksChecked': checked,
+                'elapsedMs': round(elapsed * 1000, 3),
+                'verifiedAt': checkpoint['verifiedAt']
+            }
+
+    def status_for(self, block):
+        """verificationStatus to display for a block given the current checkpoint"""
+        checkpoint = self.checkpoint
+        if block['blockNumber'] <= checkpoint['legacyThrough']:
+            return LEGACY
+        if block['blockNumber'] <= checkpoint['blockNumber']:
+            return VERIFIED
+        if not checkpoint['valid'] and block['blockNumber'] >= checkpoint['brokenAt']:
+            return TAMPERED
+        return PENDING
+
+    def integrity(self, total_blocks):
+        """Share of the hashed ledger proven intact, as shown on the analytics overview"""
+        legacy = min(self.checkpoint['legacyThrough'], total_blocks)
+        if total_blocks == legacy:
+            return '100%'
+        verified = min(self.checkpoint['blockNumber'], total_blocks) - legacy
+        return f"{round(verified / (total_blocks - legacy) * 100, 2):g}%"
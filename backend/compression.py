@@ -0,0 +1,93 @@
+"""
+Negotiated response compression: brotli when the client accepts it and the
+brotli package is installed, otherwise gzip. Whole bodies are compressed in an
+after_request hook; streamed exports compress chunk by chunk as they go.
+"""
+import zlib
+from flask import request
+import config
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/csv')
+
+
+def negotiate():
+    """Best Content-Encoding the requesting client accepts, or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """Compress a complete body"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=config.BROTLI_QUALITY)
+    return zlib.compress(body, config.GZIP_LEVEL, wbits=31)  # wbits=31: gzip container
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed bodies"""
+
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=config.BROTLI_QUALITY)
+            self.compress = self.compressor.process
+            self.flush = self.compressor.finish
+        else:
+            self.compressor = zlib.compressobj(config.GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self.compressor.compress
+            self.flush = self.compressor.flush
+
+
+def compressed_stream(chunks, encoding):
+    """Compress an iterable of byte chunks on the fly (pass-through without an encoding)"""
+    if encoding is None:
+        yield from chunks
+        return
+
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def mark_encoded(response, encoding):
+    """Headers for a body compressed with encoding"""
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The same entity in another encoding is byte-different, so its ETag is weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_compression(app):
+    """Compress eligible JSON responses of the app after each request"""
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = negotiate()
+        if encoding is None or len(body) < config.COMPRESSION_MIN_SIZE:
+            return response
+
+        response.set_data(compress(body, encoding))
+        mark_encoded(response, encoding)
+        return response
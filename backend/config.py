@@ -1,10 +1,13 @@
 """
 Configuration file for MongoDB connection and app settings
 """
+import os
 
 # MongoDB Configuration
 MONGO_URI = "mongodb://localhost:27017/"
 DATABASE_NAME = "cyber_defense_db"
+MONGO_DEFER_INDEXES = True  # build indexes in a background thread so init_db returns without waiting for them
+MONGO_INDEX_RETRY = 30  # seconds between attempts when deferred index creation fails
 
 # Collections
 COLLECTIONS = {
@@ -13,13 +16,116 @@ COLLECTIONS = {
     'BLOCKCHAIN_LEDGER': 'blockchain_ledger',
     'RESPONSE_LOGS': 'response_logs',
     'NODES_STATUS': 'nodes_status',
-    'AI_STATUS': 'ai_status'
+    'AI_STATUS': 'ai_status',
+    'LEDGER_CHECKPOINT': 'ledger_checkpoint',
+    'THREAT_ROLLUPS': 'threat_rollups',
+    'LEASES': 'leases'
 }
 
 # Background Service Settings
 THREAT_GENERATION_INTERVAL = 10  # seconds
 NODE_SYNC_INTERVAL = 5  # seconds
+SCHEDULER_WORKERS = 3  # threads running periodic jobs (scheduler.py); spare ones keep the lease renewal from waiting behind the archiver
+SCHEDULER_JITTER = 0.1  # fraction of its interval a job polled by every process may start late, so processes spread out
 LIVE_THREATS_LIMIT = 10  # Keep only last 10 in live_threats
+LIVE_THREATS_CAPPED_SIZE = 1024 * 1024  # bytes reserved for the live_threats capped collection
+
+# Multi-Process Settings (app.py: one leader process runs the background loops, see leader.py)
+LEADER_LEASE_TTL = 15  # seconds; a leader that stops renewing is replaced after this
+LEADER_RENEW_INTERVAL = 5  # seconds between lease renewals / takeover attempts
+FOLLOWER_REFRESH_INTERVAL = 2  # seconds between a follower's reads of what the leader wrote
+FOLLOWER_TAIL_OVERLAP = 30  # seconds of insertion history each read re-checks, for late flushes and clock skew
+LEADER_RECOVERY_WINDOW = 86400  # seconds of history a new leader searches for threats no block holds
+LEDGER_SWEEP_INTERVAL = 60  # seconds between the leader's searches for threats no block holds
+LEDGER_SWEEP_SETTLE = 120  # seconds a stored threat is given to reach a block before it is queued again
+
+# Ingest Pipeline Settings (batched writes to MongoDB)
+INGEST_BATCH_SIZE = 500  # flush when this many queued writes are waiting
+INGEST_FLUSH_INTERVAL = 0.5  # seconds, flush at least this often
+INGEST_QUEUE_MAX = 10000  # bounded queue; producers block when full
+INGEST_ENQUEUE_TIMEOUT = 5  # seconds a producer may block before giving up
+INGEST_RETRY_LIMIT = 5  # attempts at a failed write before its records are dropped (and logged)
+INGEST_RETRY_BACKOFF = 0.5  # seconds before the first retry of a failed write, doubled per attempt
+INGEST_RETRY_BACKOFF_MAX = 30  # longest wait between retries, in seconds
+
+# Batch Submission Settings (POST /api/submit-threats on app_enhanced.py)
+SUBMIT_BATCH_MAX = 10000  # threats per request; larger bodies are refused with 413
+SUBMIT_QUEUE_MAX = 100000  # queued threats; a request that does not fit gets 503
+SUBMIT_WORKERS = 2  # background ingest workers
+SUBMIT_WORKER_BATCH = 500  # threats ingested per write_lock acquisition
+
+# In-Memory Store Settings (app_enhanced.py)
+STORE_SEGMENT_SIZE = 4096  # items per append-only segment
+CATEGORY_TABLE_LIMIT = 1024  # distinct client-supplied values encoded per categorical field; later ones are stored as-is
+
+# Storage Backend Settings (app_enhanced.py, see repository.py)
+STORAGE_BACKEND = 'memory'  # memory, sqlite, log, or mongo (the MONGO_URI database app.py serves)
+SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'defense_mesh.db')
+SQLITE_SYNCHRONOUS = 'NORMAL'  # WAL fsync policy: NORMAL syncs at checkpoints, FULL on every commit
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'log')  # segment log backend
+LOG_SEGMENT_BYTES = 64 * 1024 * 1024  # preallocated size of each segment file
+LOG_INDEX_INTERVAL = 64  # records per sparse index entry; a seek scans at most this many
+LOG_FSYNC_INTERVAL = 0.05  # seconds between group fsyncs (a crash loses at most this); 0 = fsync every write
+
+# Snapshot Settings (app_enhanced.py boots from a snapshot of its in-process state, see snapshot.py)
+SNAPSHOT_ENABLED = True  # False: rebuild from the repository or sample data on every boot
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')  # snapshot-<backend>.bin
+SNAPSHOT_INTERVAL = 300  # seconds between snapshots; one is also taken after archiving and at shutdown
+SNAPSHOT_HOT_ROWS = 20000  # memory backend: newest rows per store restored before serving, the rest in the background
+SNAPSHOT_COLD_CHUNK_ROWS = 65536  # memory backend: older rows per snapshot section; the background restore decodes one section at a time
+SNAPSHOT_REPLAY_OVERLAP = 120  # persistent backends: seconds before the snapshot's newest row a restore re-reads for rows stored out of order
+
+# Push Stream Settings (Server-Sent Events at /api/stream)
+EVENT_HISTORY_SIZE = 1000  # recent events kept for Last-Event-ID resume
+EVENT_CLIENT_BUFFER = 256  # per-client frames; overflow makes the client resync
+EVENT_HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments
+EVENT_RETRY_MS = 3000  # reconnect delay suggested to EventSource
+NODE_EVENT_FIELDS = ('status',)  # node fields whose change is pushed; sync time and latency stay on /api/nodes-status
+
+# Response Cache Settings (read endpoints, ETag / 304)
+RESPONSE_CACHE_TTL = 5  # seconds; bounds staleness from writes made by other worker processes
+RESPONSE_CACHE_MAX_ENTRIES = 512  # distinct endpoint + query string responses kept (LRU)
+RESPONSE_CACHE_USE_ORJSON = True  # encode JSON with orjson when it is installed (pip install orjson)
+
+# Compression and Export Settings
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller JSON bodies are sent uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # used when the brotli package is installed
+EXPORT_BATCH_ROWS = 1000  # rows per streamed chunk (and per columnar / Arrow batch)
+
+# Blockchain Settings (threats are batched into Merkle blocks)
+BLOCK_MAX_TRANSACTIONS = 100  # seal a block once it holds this many threats
+BLOCK_INTERVAL = 30  # seconds, seal a non-empty block at least this often
+
+# Enforcement Settings (blocklist and rate limits from automated responses)
+ENFORCED_ACTIONS = {  # response action -> (rule, seconds it stays in force)
+    'IP Blocked': ('block', 3600),
+    'Rate Limit Applied': ('throttle', 900),
+    'Traffic Throttled': ('throttle', 900)
+}
+RATE_LIMIT_RATE = 10  # requests per second a throttled address may make
+RATE_LIMIT_BURST = 20  # token bucket size
+ENFORCEMENT_COMPILE_INTERVAL = 1.0  # seconds; new rules are enforced within this delay
+ENFORCEMENT_CACHE_SIZE = 100000  # memoized verdicts per compiled matcher
+ENFORCE_API_REQUESTS = False  # also refuse API requests from blocked / throttled clients
+ENFORCEMENT_MAX_RULE_SECONDS = 30 * 86400  # longest a manual rule may last; longer durations are refused
+ENFORCEMENT_MIN_PREFIX = {4: 16, 6: 48}  # broadest CIDR a rule may cover, per IP version
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # bearer token for admin endpoints (see auth.py); unset = they are refused
+
+# Retention Settings (rows past retention move to the on-disk archive)
+HISTORY_RETENTION_DAYS = 90  # threat_history kept hot; keep >= TREND_RETENTION_DAYS for full trends
+RESPONSE_RETENTION_DAYS = 90  # response_logs
+LEDGER_RETENTION_DAYS = 180  # blocks; only blocks the verifier has already checked are archived
+ARCHIVE_ENABLED = True
+ARCHIVE_INTERVAL = 3600  # seconds between archiver runs
+ARCHIVE_BATCH_ROWS = 5000  # MongoDB: documents archived and deleted per round trip
+ARCHIVE_GRACE_DAYS = 7  # MongoDB TTL indexes expire rows this long after retention (archiver backstop)
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+
+# Analytics Settings
+TREND_RETENTION_DAYS = 90  # days of per-day trend buckets kept in memory
+ANALYTICS_USE_ROLLUPS = True  # MongoDB (5.0+ for $dateTrunc): serve distributions/trends from threat_rollups
+ANALYTICS_ROLLUP_INTERVAL = 60  # seconds between $merge refreshes of threat_rollups
 
 # Threat Configuration
 THREAT_TYPES = [
@@ -38,6 +144,9 @@ THREAT_TYPES = [
 THREAT_SEVERITIES = ['Critical', 'High', 'Medium', 'Low']
 THREAT_SOURCES = ['External', 'Internal', 'Unknown']
 THREAT_STATUSES = ['Blocked', 'Isolated', 'Monitoring', 'Mitigated']
+THREAT_PROTOCOLS = ['TCP', 'UDP', 'HTTP', 'HTTPS']
+THREAT_PORTS = [80, 443, 22, 3389, 8080, 3306]
+ATTACK_VECTORS = ['Network', 'Application', 'System', 'Database']
 
 # Node Configuration
 NODES = [
@@ -63,3 +172,4 @@ RESPONSE_ACTIONS = {
     'Medium': ['Traffic Throttled', 'Rate Limit Applied', 'Alert Sent'],
     'Low': ['Alert Sent', 'Monitoring Enabled']
 }
+RESPONSE_STATUSES = ['Success', 'Pending']
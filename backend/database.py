@@ -1,16 +1,33 @@
 """
 Database connection and initialization
 """
-from pymongo import MongoClient, DESCENDING
-from datetime import datetime, timedelta
+import threading
+import time
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+from repository import default_nodes, default_ai_status
 import config
 
 # MongoDB Client
 client = None
 db = None
+indexes_ready = threading.Event()  # Set once ensure_indexes() has succeeded
 
-def init_db():
-    """Initialize MongoDB connection"""
+# threat_history indexes: newest-first keyset pagination, alone or with one
+# equality filter (equality fields first, then the sort keys)
+THREAT_HISTORY_INDEXES = [
+    [('timestamp', DESCENDING), ('_id', DESCENDING)],
+    [('severity', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+    [('type', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+    [('nodeId', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+    [('ip', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)]
+]
+
+def init_db(static_data=True):
+    """
+    Initialize MongoDB connection. Processes started side by side (app.py
+    workers) pass static_data=False and leave seeding to the elected leader.
+    """
     global client, db
     
     print("🔌 Connecting to MongoDB...")
@@ -29,57 +46,152 @@ def init_db():
     existing_collections = db.list_collection_names()
     
     for collection_name in config.COLLECTIONS.values():
+        if collection_name == config.COLLECTIONS['LIVE_THREATS']:
+            continue
         if collection_name not in existing_collections:
-            db.create_collection(collection_name)
-            print(f"📦 Created collection: {collection_name}")
+            try:
+                db.create_collection(collection_name)
+                print(f"📦 Created collection: {collection_name}")
+            except CollectionInvalid:
+                pass  # Another process created it first
     
-    # Create indexes for better performance
-    db[config.COLLECTIONS['LIVE_THREATS']].create_index([('timestamp', DESCENDING)])
-    db[config.COLLECTIONS['THREAT_HISTORY']].create_index([('timestamp', DESCENDING)])
-    db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].create_index([('blockNumber', DESCENDING)])
-    db[config.COLLECTIONS['RESPONSE_LOGS']].create_index([('timestamp', DESCENDING)])
+    # live_threats is a fixed-size ring: MongoDB evicts the oldest document on insert
+    init_live_threats_collection(existing_collections)
     
     # Initialize AI Status and Nodes if they don't exist
-    initialize_static_data()
+    if static_data:
+        initialize_static_data()
+    
+    # Building an index on a large collection can take minutes; queries are
+    # served (by collection scans) in the meantime
+    if config.MONGO_DEFER_INDEXES:
+        threading.Thread(target=ensure_indexes_until_ready, daemon=True).start()
+    else:
+        ensure_indexes()
     
     print("✅ Database initialized successfully\n")
     return db
 
+def ensure_indexes_until_ready():
+    """Deferred ensure_indexes(), retried until it succeeds"""
+    while True:
+        try:
+            ensure_indexes()
+            return
+        except Exception:
+            # Jobs gated on indexes_ready (the rollup $merge) stay off until then
+            time.sleep(config.MONGO_INDEX_RETRY)
+
+def ensure_indexes():
+    """Create every index (no-ops for the ones that exist) and set indexes_ready"""
+    started = time.perf_counter()
+    try:
+        for keys in THREAT_HISTORY_INDEXES:
+            db[config.COLLECTIONS['THREAT_HISTORY']].create_index(keys)
+        init_ledger_indexes()
+        init_id_indexes()
+        # Only user submissions carry the flag, so this partial index stays small
+        db[config.COLLECTIONS['THREAT_HISTORY']].create_index(
+            'userSubmitted', partialFilterExpression={'userSubmitted': True}
+        )
+        db[config.COLLECTIONS['RESPONSE_LOGS']].create_index([('timestamp', DESCENDING)])
+        db[config.COLLECTIONS['RESPONSE_LOGS']].create_index('status')
+        init_ttl_index(config.COLLECTIONS['THREAT_HISTORY'], config.HISTORY_RETENTION_DAYS)
+        init_ttl_index(config.COLLECTIONS['RESPONSE_LOGS'], config.RESPONSE_RETENTION_DAYS)
+        
+        # $merge into the rollups matches on these fields, which requires a unique index
+        db[config.COLLECTIONS['THREAT_ROLLUPS']].create_index(
+            [('day', ASCENDING), ('severity', ASCENDING), ('type', ASCENDING), ('status', ASCENDING)],
+            unique=True
+        )
+    except Exception as e:
+        print(f"❌ Index creation failed: {e}")
+        raise
+    indexes_ready.set()
+    print(f"📇 Indexes ready in {time.perf_counter() - started:.1f}s")
+
+def init_live_threats_collection(existing_collections):
+    """Create live_threats as a capped collection holding the last LIVE_THREATS_LIMIT threats"""
+    name = config.COLLECTIONS['LIVE_THREATS']
+    
+    if name in existing_collections:
+        options = db[name].options()
+        if options.get('capped') and options.get('max') == config.LIVE_THREATS_LIMIT:
+            return
+        # The live window is derived data (threat_history keeps everything), so an
+        # uncapped or differently sized collection is simply rebuilt.
+        db.drop_collection(name)
+        print(f"♻️  Dropped uncapped collection: {name}")
+    
+    try:
+        db.create_collection(
+            name,
+            capped=True,
+            size=config.LIVE_THREATS_CAPPED_SIZE,
+            max=config.LIVE_THREATS_LIMIT
+        )
+        print(f"📦 Created capped collection: {name} (max {config.LIVE_THREATS_LIMIT})")
+    except CollectionInvalid:
+        pass  # Another process created it first
+
+def init_ledger_indexes():
+    """Block numbers must be unique so concurrent writers cannot silently fork the chain"""
+    ledger = db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']]
+    try:
+        ledger.create_index([('blockNumber', DESCENDING)], unique=True)
+    except OperationFailure as e:
+        # Ledgers written before the chain head survived restarts contain
+        # duplicate block numbers; keep serving them with a plain index.
+        print(f"⚠️  Could not create unique blockNumber index: {e}")
+        ledger.create_index([('blockNumber', DESCENDING)], name='blockNumber_-1_nonunique')
+    
+    # Multikey index: which batch block holds a given threat (inclusion proofs)
+    ledger.create_index('threatIds')
+
+def init_id_indexes():
+    """threatId / logId are unique, so a lookup by ID names exactly one document"""
+    for collection_name, field in (
+        (config.COLLECTIONS['THREAT_HISTORY'], 'threatId'),
+        (config.COLLECTIONS['RESPONSE_LOGS'], 'logId')
+    ):
+        try:
+            db[collection_name].create_index(field, unique=True)
+        except OperationFailure as e:
+            # Data written with the old 4-digit random IDs has duplicates;
+            # keep serving it with a plain index.
+            print(f"⚠️  Could not create unique {field} index: {e}")
+            db[collection_name].create_index(field, name=f'{field}_1_nonunique')
+
+def init_ttl_index(collection_name, retention_days):
+    """
+    TTL index on createdAt, the archiver's backstop: documents it has not moved
+    still expire ARCHIVE_GRACE_DAYS after their retention window. Ledger blocks
+    get none, deleting them outside the archiver would break the hash chain.
+    """
+    grace = config.ARCHIVE_GRACE_DAYS if config.ARCHIVE_ENABLED else 0
+    seconds = (retention_days + grace) * 86400
+    try:
+        db[collection_name].create_index('createdAt', expireAfterSeconds=seconds)
+    except OperationFailure:
+        # The retention changed since the index was built: update it in place
+        db.command('collMod', collection_name, index={
+            'keyPattern': {'createdAt': 1},
+            'expireAfterSeconds': seconds
+        })
+
 def initialize_static_data():
     """Initialize AI status and node status with default data"""
     
     # Initialize AI Status (single document)
     ai_collection = db[config.COLLECTIONS['AI_STATUS']]
     if ai_collection.count_documents({}) == 0:
-        ai_status = {
-            'modelType': config.AI_MODEL['modelType'],
-            'accuracy': config.AI_MODEL['accuracy'],
-            'trainingStatus': config.AI_MODEL['trainingStatus'],
-            'lastRetrainTime': (datetime.now() - timedelta(days=config.AI_MODEL['lastRetrainDaysAgo'])).isoformat(),
-            'modelVersion': config.AI_MODEL['modelVersion'],
-            'activeModels': config.AI_MODEL['activeModels'],
-            'threatsAnalyzed': 0,
-            'falsePositiveRate': 1.5,
-            'nextRetrainScheduled': (datetime.now() + timedelta(hours=12)).isoformat(),
-            'updatedAt': datetime.now().isoformat()
-        }
-        ai_collection.insert_one(ai_status)
+        ai_collection.insert_one(default_ai_status())
         print("🤖 Initialized AI Status")
     
     # Initialize Nodes Status
     nodes_collection = db[config.COLLECTIONS['NODES_STATUS']]
     if nodes_collection.count_documents({}) == 0:
-        for node in config.NODES:
-            node_status = {
-                'nodeId': node['nodeId'],
-                'location': node['location'],
-                'status': node['status'],
-                'lastSyncTime': datetime.now().isoformat(),
-                'threatsDetected': 0,
-                'uptime': '99.9%',
-                'latency': '25ms'
-            }
-            nodes_collection.insert_one(node_status)
+        nodes_collection.insert_many(default_nodes())
         print("🌐 Initialized Nodes Status")
 
 def get_db():
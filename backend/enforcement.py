@@ -0,0 +1,385 @@
+"""
+Enforcement of automated responses. A successful 'IP Blocked' response puts
+its target on the blocklist, and a successful 'Rate Limit Applied' or
+'Traffic Throttled' response puts it behind a token bucket. Each rule lasts
+for the duration configured for its action. check(ip) answers allow, block or
+throttle for a request, taking a token if the address is rate limited;
+verdict(ip) gives the same answer for a lookup without taking one or
+counting it.
+
+Rules are compiled into an immutable matcher:
+- a set of exactly blocked addresses
+- sorted start/end lists of blocked ranges, searched with bisect
+- the set of rate-limited addresses
+
+check() takes no lock on its hot path. It reads the current matcher and
+memoizes verdicts per address string inside it. A new matcher is compiled
+lazily: when a rule expires, or at most every ENFORCEMENT_COMPILE_INTERVAL
+seconds after rules changed. A new rule can therefore take up to that long to
+be enforced.
+
+IPv4 and IPv6 share one integer key space: IPv6 keys are offset past 2**32.
+Rules are identified by their (kind, first key, last key) and snapshots keep
+them column-wise, so a restore rebuilds every rule and the matcher without
+parsing an address.
+"""
+import ipaddress
+import socket
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from itertools import compress
+from flask import jsonify, request
+import config
+
+ALLOW = 'allow'
+BLOCK = 'block'
+THROTTLE = 'throttle'
+LIMITED = 'limited'  # Matcher verdict: the answer depends on the address's token bucket
+
+IPV6_OFFSET = 1 << 32
+
+
+def ip_key(ip):
+    """Integer key of an address, or None if it is not one"""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except (OSError, TypeError):
+        pass
+    try:
+        return IPV6_OFFSET + int(ipaddress.IPv6Address(ip))
+    except ValueError:
+        return None
+
+
+def network_keys(network):
+    """[first, last] keys covered by an ipaddress network"""
+    offset = IPV6_OFFSET if network.version == 6 else 0
+    return offset + int(network.network_address), offset + int(network.broadcast_address)
+
+
+def key_target(first, last):
+    """The address or network network_keys gave first..last for: a bare address for a single host"""
+    if first >= IPV6_OFFSET:
+        address, bits = ipaddress.IPv6Address(first - IPV6_OFFSET), 128
+    else:
+        address, bits = ipaddress.IPv4Address(first), 32
+    if first == last:
+        return str(address)
+    return f"{address}/{bits - (last - first).bit_length()}"
+
+
+class Rule:
+    """One block or rate limit on the keys first..last (an address or network), until expires (epoch seconds)"""
+
+    __slots__ = ('kind', 'first', 'last', 'expires', 'reason')
+
+    def __init__(self, kind, first, last, expires, reason):
+        self.kind = kind
+        self.first = first
+        self.last = last
+        self.expires = expires
+        self.reason = reason
+
+    def to_dict(self):
+        try:
+            expires_at = datetime.fromtimestamp(self.expires).isoformat()
+        except (OverflowError, OSError, ValueError):
+            expires_at = datetime.max.isoformat()  # add_rule caps expiries; never fail a listing over one
+        return {
+            'action': self.kind,
+            'target': key_target(self.first, self.last),
+            'expiresAt': expires_at,
+            'reason': self.reason
+        }
+
+
+def parse_duration(value):
+    """Seconds a manual rule lasts, from request input; raises ValueError unless 1..ENFORCEMENT_MAX_RULE_SECONDS"""
+    if isinstance(value, bool):
+        raise ValueError('Invalid duration: expected an integer')
+    try:
+        duration = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('Invalid duration: expected an integer')
+    if not 0 < duration <= config.ENFORCEMENT_MAX_RULE_SECONDS:
+        raise ValueError(f"Invalid duration: must be between 1 and {config.ENFORCEMENT_MAX_RULE_SECONDS} seconds")
+    return duration
+
+
+class Matcher:
+    """Rules compiled for lookups; only its expiry and verdict memo change after construction"""
+
+    __slots__ = ('exact', 'starts', 'ends', 'limited', 'valid_until', 'verdicts')
+
+    def __init__(self, keys, valid_until):
+        """keys: the (kind, first, last) of every rule in force"""
+        keys = list(keys)
+        # Single addresses, nearly every rule, go straight into the sets
+        exact = {first for kind, first, last in keys if first == last and kind == BLOCK}
+        limited = {first for kind, first, last in keys if first == last and kind == THROTTLE}
+        ranges = []
+        for kind, first, last in keys:
+            if first == last:
+                continue
+            if kind == THROTTLE:
+                limited.update(range(first, last + 1))  # At most 256 addresses (add_rule)
+            else:
+                ranges.append((first, last + 1))
+
+        # Merge overlapping block ranges so one bisect decides
+        starts, ends = [], []
+        for start, end in sorted(ranges):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+
+        self.exact = frozenset(exact)
+        self.starts = starts
+        self.ends = ends
+        self.limited = frozenset(limited)
+        self.valid_until = valid_until
+        self.verdicts = {}
+
+    def evaluate(self, key):
+        if key in self.exact:
+            return BLOCK
+        position = bisect_right(self.starts, key) - 1
+        if position >= 0 and key < self.ends[position]:
+            return BLOCK
+        if key in self.limited:
+            return LIMITED
+        return ALLOW
+
+
+class EnforcementEngine:
+    """Active blocklist and rate limits with a lock-free check(ip)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rules = {}  # (kind, first, last) -> Rule; read through _rules()
+        self.restored = None  # Rule columns from restore() not yet in self.rules
+        self.dirty = False
+        self.next_expiry = float('inf')
+        self.matcher = Matcher((), float('inf'))
+        self.buckets = {}  # ip -> [tokens, last refill epoch]
+        self.bucket_lock = threading.Lock()
+        self.metrics = {'blocked': 0, 'throttled': 0, 'compiles': 0, 'rulesAdded': 0, 'rulesExpired': 0}
+
+    # ==================== RULES ====================
+
+    def add_rule(self, kind, target, expires, reason):
+        """Block or throttle an address or CIDR network until expires; raises ValueError for a bad target"""
+        if kind not in (BLOCK, THROTTLE):
+            raise ValueError(f"Invalid action: expected {BLOCK} or {THROTTLE}")
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            raise ValueError(f"Invalid target: {target}")
+        if network.prefixlen < config.ENFORCEMENT_MIN_PREFIX[network.version]:
+            raise ValueError(f"Invalid target: networks broader than /{config.ENFORCEMENT_MIN_PREFIX[network.version]} "
+                             f"are refused for IPv{network.version}")
+        if kind == THROTTLE and network.num_addresses > 256:
+            raise ValueError('Invalid target: rate limits apply to networks of at most 256 addresses')
+        # Whatever the caller computed, no rule outlives the longest manual one
+        expires = min(expires, time.time() + config.ENFORCEMENT_MAX_RULE_SECONDS)
+
+        first, last = network_keys(network)
+        key = (kind, first, last)
+        with self.lock:
+            rules = self._rules()
+            existing = rules.get(key)
+            if existing is None or existing.expires < expires:
+                rules[key] = Rule(kind, first, last, expires, reason)
+                self.next_expiry = min(self.next_expiry, expires)
+                self._invalidate()
+                self.metrics['rulesAdded'] += 1
+            return rules[key]
+
+    def remove_rule(self, kind, target):
+        """Lift a rule; returns False if there was none"""
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            raise ValueError(f"Invalid target: {target}")
+        with self.lock:
+            if self._rules().pop((kind, *network_keys(network)), None) is None:
+                return False
+            self._invalidate()
+        return True
+
+    def apply_response(self, response_log):
+        """Turn a successful automated response into a rule, if its action is enforced"""
+        enforced = config.ENFORCED_ACTIONS.get(response_log['action'])
+        if enforced is None or response_log.get('status') != 'Success':
+            return None
+        kind, duration = enforced
+        expires = datetime.fromisoformat(response_log['timestamp']).timestamp() + duration
+        if expires <= time.time():
+            return None
+        try:
+            return self.add_rule(kind, response_log['targetIp'], expires,
+                                 f"{response_log['action']} ({response_log['logId']})")
+        except ValueError:
+            return None  # Responses to unparseable addresses cannot be enforced
+
+    def _rules(self):
+        """The rules dict (caller holds the lock), first filling in what restore() left as columns"""
+        if self.restored is not None:
+            kinds, firsts, lasts, _, _ = columns = self.restored
+            self.rules.update(zip(zip(kinds, firsts, lasts), map(Rule, *columns)))
+            self.restored = None
+        return self.rules
+
+    def _invalidate(self):
+        """Rules changed (caller holds the lock): the next check compiles within the interval"""
+        if not self.dirty:
+            self.dirty = True
+            self.matcher.valid_until = min(self.matcher.valid_until, time.time() + config.ENFORCEMENT_COMPILE_INTERVAL)
+
+    def _compile(self, now):
+        with self.lock:
+            if now < self.matcher.valid_until:
+                return self.matcher  # Another thread compiled meanwhile
+            rules = self._rules()
+            if self.next_expiry <= now:
+                expired = [key for key, rule in rules.items() if rule.expires <= now]
+                for key in expired:
+                    del rules[key]
+                self.metrics['rulesExpired'] += len(expired)
+                self.next_expiry = min((rule.expires for rule in rules.values()), default=float('inf'))
+            self.matcher = Matcher(rules, self.next_expiry)
+            self.dirty = False
+            self.metrics['compiles'] += 1
+            matcher = self.matcher
+
+        with self.bucket_lock:
+            for ip in [ip for ip in self.buckets if matcher.evaluate(ip_key(ip)) != LIMITED]:
+                del self.buckets[ip]
+        return matcher
+
+    # ==================== HOT PATH ====================
+
+    def check(self, ip, now=None):
+        """allow, block or throttle for a request from ip"""
+        now = time.time() if now is None else now
+        matcher = self.matcher
+        if now >= matcher.valid_until:
+            matcher = self._compile(now)
+
+        verdict = matcher.verdicts.get(ip)
+        if verdict is None:
+            key = ip_key(ip)
+            verdict = ALLOW if key is None else matcher.evaluate(key)
+            if len(matcher.verdicts) >= config.ENFORCEMENT_CACHE_SIZE:
+                matcher.verdicts.clear()
+            matcher.verdicts[ip] = verdict
+
+        if verdict is ALLOW:
+            return ALLOW
+        if verdict is LIMITED:
+            verdict = self._take_token(ip, now)
+            if verdict is ALLOW:
+                return ALLOW
+        # Counters are approximate under concurrent checks (no lock on this path)
+        if verdict == BLOCK:
+            self.metrics['blocked'] += 1
+        else:
+            self.metrics['throttled'] += 1
+        return verdict
+
+    def verdict(self, ip, now=None):
+        """What check(ip) would answer, without taking a token or counting the verdict"""
+        now = time.time() if now is None else now
+        matcher = self.matcher
+        if now >= matcher.valid_until:
+            matcher = self._compile(now)
+        key = ip_key(ip)
+        verdict = ALLOW if key is None else matcher.evaluate(key)
+        if verdict is LIMITED:
+            with self.bucket_lock:
+                bucket = self.buckets.get(ip)
+                tokens = config.RATE_LIMIT_BURST if bucket is None else min(
+                    config.RATE_LIMIT_BURST, bucket[0] + (now - bucket[1]) * config.RATE_LIMIT_RATE)
+            verdict = ALLOW if tokens >= 1 else THROTTLE
+        return verdict
+
+    def _take_token(self, ip, now):
+        """Token bucket: RATE_LIMIT_RATE per second, bursts up to RATE_LIMIT_BURST"""
+        with self.bucket_lock:
+            bucket = self.buckets.get(ip)
+            if bucket is None:
+                bucket = self.buckets[ip] = [float(config.RATE_LIMIT_BURST), now]
+            bucket[0] = min(config.RATE_LIMIT_BURST, bucket[0] + (now - bucket[1]) * config.RATE_LIMIT_RATE)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return ALLOW
+        return THROTTLE
+
+    # ==================== REPORTING ====================
+
+    def state(self):
+        """Unexpired rules column-wise: one list per Rule field (snapshots)"""
+        now = time.time()
+        with self.lock:
+            rules = [rule for rule in self._rules().values() if rule.expires > now]
+        return {field: [getattr(rule, field) for rule in rules] for field in Rule.__slots__}
+
+    def restore(self, state):
+        """
+        Replace the rules with those from state() still in force. They are
+        compiled into the matcher straight from their keys, which were validated
+        when the rules were added; the Rule objects themselves are only built
+        once something changes, expires or lists rules (_rules).
+        """
+        now = time.time()
+        live = [expires > now for expires in state['expires']]
+        columns = [list(compress(state[field], live)) for field in Rule.__slots__]
+        kinds, firsts, lasts, expiries, _ = columns
+        with self.lock:
+            self.rules = {}
+            self.restored = columns
+            self.next_expiry = min(expiries, default=float('inf'))
+            self.matcher = Matcher(zip(kinds, firsts, lasts), self.next_expiry)
+            self.dirty = False
+            self.metrics['compiles'] += 1
+
+    def active_rules(self, limit=None):
+        """Unexpired rules, latest expiry first"""
+        now = time.time()
+        with self.lock:
+            rules = [rule for rule in self._rules().values() if rule.expires > now]
+        rules.sort(key=lambda rule: rule.expires, reverse=True)
+        return [rule.to_dict() for rule in rules[:limit]]
+
+    def get_metrics(self):
+        """Rule counts and verdict counters"""
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['rules'] = len(self._rules())
+        matcher = self.matcher
+        metrics['blockedAddresses'] = len(matcher.exact)
+        metrics['blockedRanges'] = len(matcher.starts)
+        metrics['rateLimitedAddresses'] = len(matcher.limited)
+        metrics['memoizedVerdicts'] = len(matcher.verdicts)
+        return metrics
+
+
+def init_enforcement(app, engine):
+    """Refuse API requests from blocked (403) or throttled (429) clients, if enabled in config"""
+    if not config.ENFORCE_API_REQUESTS:
+        return
+
+    @app.before_request
+    def enforce_request():
+        verdict = engine.check(request.remote_addr)
+        if verdict == BLOCK:
+            return jsonify({'success': False, 'error': 'Address is blocked'}), 403
+        if verdict == THROTTLE:
+            response = jsonify({'success': False, 'error': 'Rate limit exceeded'})
+            response.headers['Retry-After'] = '1'
+            return response, 429
@@ -0,0 +1,161 @@
+"""
+Server-Sent Events push stream: producers publish deltas (new threats, blocks,
+response logs, node updates) once, and every connected dashboard receives
+them from its own bounded buffer instead of polling the REST endpoints.
+
+Event ids start from the current time in microseconds rather than 1, so ids
+keep increasing across restarts: a client resuming with an id from before a
+restart is told to resync instead of being matched against unrelated events.
+"""
+import json
+import threading
+import time
+from collections import deque
+from flask import Response, stream_with_context
+import config
+
+
+class Subscription:
+    """One connected client: a bounded buffer of pre-encoded frames"""
+
+    def __init__(self, buffer_size):
+        self.frames = deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.dropped = False
+
+    def push(self, frame):
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                # Slow client: the oldest frame is evicted, so it must resync
+                self.dropped = True
+            self.frames.append(frame)
+            self.condition.notify()
+
+    def wait(self, timeout):
+        """Frames available now, or an empty list after timeout (heartbeat time)"""
+        with self.condition:
+            if not self.frames:
+                self.condition.wait(timeout)
+            frames = list(self.frames)
+            self.frames.clear()
+            dropped, self.dropped = self.dropped, False
+        if dropped:
+            frames.insert(0, encode_frame(None, 'resync', {'reason': 'client buffer overflow'}))
+        return frames
+
+
+class ChangeTracker:
+    """
+    Last seen values of some fields per key, so a periodic refresh publishes
+    an event only when one of them changed
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.lock = threading.Lock()
+        self.seen = {}
+
+    def changed(self, key, document):
+        """True if a tracked field of document differs from the last one seen for key (False the first time)"""
+        current = {field: document[field] for field in self.fields if field in document}
+        with self.lock:
+            previous = self.seen.get(key)
+            self.seen[key] = dict(previous or {}, **current)
+        return previous is not None and any(previous.get(field) != value for field, value in current.items())
+
+
+def encode_frame(event_id, event_type, data):
+    """SSE wire format for one event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventBroker:
+    """Fans each published event out to all subscribers and keeps a replay window"""
+
+    def __init__(self, history_size=None, client_buffer=None):
+        self.lock = threading.Lock()
+        self.next_id = time.time_ns() // 1000
+        self.history = deque(maxlen=history_size or config.EVENT_HISTORY_SIZE)  # (id, frame)
+        self.client_buffer = client_buffer or config.EVENT_CLIENT_BUFFER
+        self.subscribers = set()
+
+    def publish(self, event_type, data):
+        """Encode the event once and hand the same frame to every subscriber"""
+        with self.lock:
+            event_id = self.next_id
+            self.next_id += 1
+            frame = encode_frame(event_id, event_type, data)
+            self.history.append((event_id, frame))
+            subscribers = list(self.subscribers)
+
+        for subscription in subscribers:
+            subscription.push(frame)
+        return event_id
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a client. With last_event_id, events it missed are replayed
+        from the window; if they already fell out of it, the client is told to resync.
+        """
+        subscription = Subscription(self.client_buffer)
+        with self.lock:
+            if last_event_id is not None:
+                oldest = self.history[0][0] if self.history else self.next_id
+                if last_event_id + 1 < oldest:
+                    subscription.push(encode_frame(None, 'resync', {'reason': 'events expired'}))
+                elif last_event_id >= self.next_id:
+                    # Not an id this broker issued (clock set back, or another server)
+                    subscription.push(encode_frame(None, 'resync', {'reason': 'unknown event id'}))
+                for event_id, frame in self.history:
+                    if event_id > last_event_id:
+                        subscription.push(frame)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def stream(self, last_event_id=None):
+        """Generator of SSE text for one client, with keep-alive comments"""
+        subscription = self.subscribe(last_event_id)
+        try:
+            yield f"retry: {config.EVENT_RETRY_MS}\n\n"
+            while True:
+                frames = subscription.wait(config.EVENT_HEARTBEAT_INTERVAL)
+                if frames:
+                    yield ''.join(frames)
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+
+def parse_last_event_id(request):
+    """Last-Event-ID header (sent by EventSource on reconnect) or ?lastEventId="""
+    value = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def sse_response(broker, request):
+    """Streaming text/event-stream response for the requesting client"""
+    return Response(
+        stream_with_context(broker.stream(parse_last_event_id(request))),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # don't let a reverse proxy buffer the stream
+        }
+    )
+
+
+# Global instance
+event_broker = EventBroker()
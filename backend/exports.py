@@ -0,0 +1,118 @@
+"""
+Streamed bulk exports of history, ledger and response logs. Rows are pulled
+from the store (or a MongoDB cursor) in batches, encoded and compressed chunk
+by chunk inside the response generator, so a million-row export never holds
+the whole payload in memory.
+
+Formats:
+    ndjson    one JSON object per line
+    columnar  one JSON line per batch of rows: {"count": n, "columns": {field: [values]}}
+    arrow     Arrow IPC stream, one record batch per row batch (needs pyarrow)
+"""
+import io
+import json
+from flask import Response
+from compression import compressed_stream, negotiate
+import config
+
+try:
+    import orjson
+except ImportError:  # Optional: standard library encoder
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Optional: the arrow format is unavailable without it
+    pyarrow = None
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'columnar': ('application/x-ndjson', 'columns.ndjson'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows')
+}
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, separators=(',', ':'), default=str).encode()
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _fields(batch):
+    """Union of the batch's keys in first-seen order"""
+    fields = {}
+    for row in batch:
+        for field in row:
+            fields.setdefault(field, None)
+    return list(fields)
+
+
+def ndjson_chunks(rows, batch_size):
+    for batch in _batches(rows, batch_size):
+        yield b''.join(_dumps(row) + b'\n' for row in batch)
+
+
+def columnar_chunks(rows, batch_size):
+    # Field names are written once per batch instead of once per row
+    for batch in _batches(rows, batch_size):
+        columns = {field: [row.get(field) for row in batch] for field in _fields(batch)}
+        yield _dumps({'count': len(batch), 'columns': columns}) + b'\n'
+
+
+def arrow_chunks(rows, batch_size):
+    # The schema is inferred from the first batch; later fields outside it are dropped
+    sink = io.BytesIO()
+    writer = None
+    for batch in _batches(rows, batch_size):
+        if writer is None:
+            schema = pyarrow.RecordBatch.from_pylist(batch).schema
+            writer = pyarrow.ipc.new_stream(sink, schema)
+        writer.write_batch(pyarrow.RecordBatch.from_pylist(batch, schema=schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
+
+
+CHUNK_ENCODERS = {
+    'ndjson': ndjson_chunks,
+    'columnar': columnar_chunks,
+    'arrow': arrow_chunks
+}
+
+
+def export_response(rows, export_format, name):
+    """
+    Streaming download of rows (any iterable of dicts) in export_format,
+    compressed with the encoding the client accepts. Raises ValueError for an
+    unknown or unavailable format.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format: expected one of {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'arrow' and pyarrow is None:
+        raise ValueError('Invalid format: arrow export needs the pyarrow package')
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    encoding = negotiate()
+    chunks = CHUNK_ENCODERS[export_format](rows, config.EXPORT_BATCH_ROWS)
+
+    response = Response(compressed_stream(chunks, encoding), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,22 @@
+"""
+gunicorn settings for app.py, one worker per core:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Every worker serves the API. Each one connects to MongoDB and starts its
+background services right after it boots; the leader lease (leader.py) lets
+only one of them run the threat generator and the other writer loops.
+"""
+import multiprocessing
+
+bind = '0.0.0.0:5001'
+workers = multiprocessing.cpu_count()
+# /api/stream holds its connection open: threaded workers keep one SSE client from taking a whole worker
+worker_class = 'gthread'
+threads = 8
+
+
+def post_worker_init(worker):
+    """Start the services in the worker (after the fork) instead of on its first request"""
+    import app
+    app.start_services()
@@ -0,0 +1,71 @@
+"""
+Time-ordered unique IDs for threats and response logs (Snowflake layout):
+
+    41 bits  milliseconds since ID_EPOCH
+    10 bits  node index (position of the detecting node in config.NODES)
+    12 bits  rolling sequence
+
+rendered as a prefix plus 13 Crockford base32 characters, so IDs sort as
+strings in creation order (to the millisecond). Generating takes no lock: the
+sequence is an itertools.count, whose next() is atomic under the GIL, and IDs
+can only collide if a node issues more than 4096 of them in one millisecond.
+The unique indexes on threatId / logId (database.py) catch anything else.
+"""
+import itertools
+import random
+import time
+import config
+
+ID_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+ENCODED_LENGTH = 13  # base32 characters for 64 bits
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford: no I, L, O, U
+
+# Wall clock read once; a monotonic offset keeps IDs ordered if the clock steps back
+_WALL_START_MS = time.time_ns() // 1_000_000
+_MONOTONIC_START_NS = time.monotonic_ns()
+
+
+def _now_ms():
+    return _WALL_START_MS + (time.monotonic_ns() - _MONOTONIC_START_NS) // 1_000_000
+
+
+def encode(value):
+    """Fixed-width base32 of a 64-bit integer (lexicographic order = numeric order)"""
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class IdGenerator:
+    """IDs for one node"""
+
+    def __init__(self, node_index):
+        if not 0 <= node_index < 1 << NODE_BITS:
+            raise ValueError(f"Invalid node index: must be below {1 << NODE_BITS}")
+        self.node_bits = node_index << SEQUENCE_BITS
+        # A random start makes two processes sharing a node index unlikely to collide
+        self.sequence = itertools.count(random.randrange(1 << SEQUENCE_BITS))
+
+    def next_value(self):
+        sequence = next(self.sequence) & SEQUENCE_MASK
+        return ((_now_ms() - ID_EPOCH_MS) << (NODE_BITS + SEQUENCE_BITS)) | self.node_bits | sequence
+
+    def new_id(self, prefix):
+        return f"{prefix}-{encode(self.next_value())}"
+
+
+NODE_INDEX = {node['nodeId']: index for index, node in enumerate(config.NODES)}
+_generators = {node_id: IdGenerator(index) for node_id, index in NODE_INDEX.items()}
+# IDs not tied to a configured node (unknown nodeId) use the last index
+_fallback = IdGenerator((1 << NODE_BITS) - 1)
+
+
+def new_id(prefix, node_id=None):
+    """Next ID for the given node, e.g. new_id('THR', 'Node-A') -> 'THR-0B4T3Y2M5K1ZQ'"""
+    return _generators.get(node_id, _fallback).new_id(prefix)
+
@@ -0,0 +1,304 @@
+"""
+Batched ingestion pipeline: queues documents and counter updates in memory and
+flushes them on a size-or-time trigger, with one write per collection and one
+coalesced update per counter document. The writes go to the functions each
+collection is routed to (route(), route_counter()), normally repository
+methods, so the pipeline itself knows no storage backend.
+
+A write that fails is queued for another attempt after an exponential
+backoff (INGEST_RETRY_BACKOFF, doubling up to INGEST_RETRY_BACKOFF_MAX) and
+merged into a later flush. Writers must therefore tolerate documents that an
+earlier, partly failed attempt already stored. What happens after that is the
+collection's retry policy (route()):
+
+    RETRY_LIMITED        dropped after INGEST_RETRY_LIMIT attempts
+    RETRY_UNTIL_WRITTEN  retried until it lands; later writes to the collection
+                         wait behind it, so they are stored in order
+    RETRY_NEVER          dropped at once (best-effort mirrors)
+
+A writer raises RejectedWrite for documents that can never be stored; they
+are dropped under any policy. Dropped records have their ids logged; retries
+and drops are counted in the metrics.
+"""
+import threading
+import queue
+import time
+from datetime import datetime
+import config
+
+# Fields that identify a queued document in the drop log, first one present wins
+RECORD_ID_FIELDS = ('threatId', 'logId', 'blockNumber', 'nodeId')
+
+
+RETRY_LIMITED = 'limited'
+RETRY_UNTIL_WRITTEN = 'until-written'
+RETRY_NEVER = 'never'
+
+
+class RejectedWrite(Exception):
+    """Raised by a writer for documents that no retry could store"""
+
+
+def _record_id(document):
+    return next((document[field] for field in RECORD_ID_FIELDS if field in document), '?')
+
+
+class IngestPipeline:
+    """Bounded in-memory queue with a single background flusher"""
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue=None):
+        self.batch_size = batch_size or config.INGEST_BATCH_SIZE
+        self.flush_interval = flush_interval or config.INGEST_FLUSH_INTERVAL
+        self.queue = queue.Queue(maxsize=max_queue or config.INGEST_QUEUE_MAX)
+        self.running = False
+        self.thread = None
+        self.writers = {}  # collection -> writer(documents)
+        self.counter_writers = {}  # collection -> writer(query, increments, fields)
+        self.retry_policies = {}  # collection -> RETRY_*, RETRY_LIMITED if not routed otherwise
+        self.error_handlers = {}
+        self.written_handlers = {}
+        self.retries = []  # (due, attempts, item) for writes whose flush failed; flusher thread only
+        self.metrics_lock = threading.Lock()
+        self.metrics = {
+            'enqueued': 0,
+            'backpressureWaits': 0,
+            'flushes': 0,
+            'failedFlushes': 0,
+            'retriedWrites': 0,
+            'droppedWrites': 0,
+            'lastError': None,
+            'documentsWritten': 0,
+            'counterUpdates': 0,
+            'counterUpdatesCoalesced': 0,
+            'lastFlushMs': 0.0,
+            'maxFlushMs': 0.0,
+            'totalFlushMs': 0.0,
+            'lastFlushAt': None
+        }
+
+    def start(self):
+        """Start the background flusher"""
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+        print(f"🔄 Started: Ingest Pipeline (batch {self.batch_size} / {self.flush_interval}s)")
+
+    def stop(self):
+        """Stop the flusher and write out everything still queued"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.flush_interval + 5)
+        batch = self._drain(0)
+        while batch:
+            self._flush(self._with_retries(batch))
+            batch = self._drain(0)
+        # One last attempt for the writes still waiting out a backoff
+        if self.retries:
+            self._flush(self._with_retries([], due_only=False), final=True)
+
+    # ==================== ROUTING ====================
+
+    def route(self, collection, writer, retry=RETRY_LIMITED):
+        """Write each flush's documents for collection with writer(documents), retrying failures per retry"""
+        self.writers[collection] = writer
+        self.retry_policies[collection] = retry
+
+    def route_counter(self, collection, writer):
+        """Apply each flush's coalesced counter updates for collection with writer(query, increments, fields)"""
+        self.counter_writers[collection] = writer
+
+    # ==================== PRODUCER API ====================
+
+    def insert(self, collection, document):
+        """Queue a document for insertion into the given collection"""
+        self._put(('insert', collection, document))
+
+    def increment(self, collection, query, inc, set_fields=None):
+        """Queue a counter update; updates to the same document are merged per flush"""
+        self._put(('increment', collection, query, inc, set_fields or {}))
+
+    def on_error(self, collection, handler):
+        """Register handler(exception, documents) called when inserts into collection fail"""
+        self.error_handlers[collection] = handler
+
+    def on_written(self, collection, handler):
+        """Register handler() called after a flush wrote to collection"""
+        self.written_handlers[collection] = handler
+
+    def _put(self, item):
+        """Enqueue, blocking the producer when the queue is full (backpressure)"""
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self.metrics_lock:
+                self.metrics['backpressureWaits'] += 1
+            # Raises queue.Full if the flusher cannot catch up within the timeout
+            self.queue.put(item, timeout=config.INGEST_ENQUEUE_TIMEOUT)
+        with self.metrics_lock:
+            self.metrics['enqueued'] += 1
+
+    # ==================== FLUSHER ====================
+
+    def _flush_loop(self):
+        """Collect up to batch_size items or flush_interval seconds, then flush"""
+        while self.running:
+            try:
+                batch = self._with_retries(self._drain(self.flush_interval))
+                if batch:
+                    self._flush(batch)
+            except Exception as e:
+                print(f"❌ Error in ingest pipeline: {e}")
+
+    def backlog(self, collection):
+        """Failed writes to collection waiting for another attempt"""
+        return sum(1 for _, _, item in self.retries if item[1] == collection)
+
+    def _with_retries(self, items, due_only=True):
+        """(attempts, item) pairs: the retries that are due, then the new items"""
+        now = time.monotonic()
+        due = [(attempts, item) for when, attempts, item in self.retries if not due_only or when <= now]
+        self.retries = [entry for entry in self.retries if due_only and entry[0] > now]
+
+        # New writes to an in-order collection queue up behind its retries that are not due yet
+        held = {}
+        for when, _, item in self.retries:
+            if self.retry_policies.get(item[1]) == RETRY_UNTIL_WRITTEN:
+                held[item[1]] = max(when, held.get(item[1], when))
+        new = []
+        for item in items:
+            if item[1] in held:
+                self.retries.append((held[item[1]], 0, item))
+            else:
+                new.append((0, item))
+        return due + new
+
+    def _failed(self, entries, collection, error, final=False):
+        """Queue the (attempts, item) entries of a failed write for a retry, or drop them"""
+        with self.metrics_lock:
+            self.metrics['lastError'] = {
+                'collection': collection,
+                'error': str(error),
+                'at': datetime.now().isoformat()
+            }
+        policy = self.retry_policies.get(collection, RETRY_LIMITED)
+        if final or policy == RETRY_NEVER or isinstance(error, RejectedWrite):
+            retry, dropped = [], [item for _, item in entries]
+        elif policy == RETRY_UNTIL_WRITTEN:
+            retry, dropped = [(attempts + 1, item) for attempts, item in entries], []
+        else:
+            retry = [(attempts + 1, item) for attempts, item in entries
+                     if attempts + 1 < config.INGEST_RETRY_LIMIT]
+            dropped = [item for attempts, item in entries if attempts + 1 >= config.INGEST_RETRY_LIMIT]
+
+        if retry:
+            # One due time for the whole write keeps its documents in order
+            exponent = min(max(attempts for attempts, _ in retry) - 1, 16)
+            due = time.monotonic() + min(config.INGEST_RETRY_BACKOFF * 2 ** exponent, config.INGEST_RETRY_BACKOFF_MAX)
+            self.retries.extend((due, attempts, item) for attempts, item in retry)
+        if dropped:
+            # item[2] is the document of an insert, the query of a counter update
+            ids = [_record_id(item[2]) for item in dropped]
+            print(f"🗑️  Dropped {len(dropped)} writes to {collection} after their last attempt: {ids}")
+        with self.metrics_lock:
+            self.metrics['retriedWrites'] += len(retry)
+            self.metrics['droppedWrites'] += len(dropped)
+
+    def _drain(self, max_wait):
+        """Take items off the queue until the batch is full or max_wait elapses"""
+        batch = []
+        deadline = time.monotonic() + max_wait
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or not self.running:
+                    batch.append(self.queue.get_nowait())
+                else:
+                    batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _flush(self, batch, final=False):
+        """
+        Write one batch of (attempts, item) pairs: the documents per collection,
+        then the coalesced counters. Failed writes are retried later (final: dropped).
+        """
+        if not batch:
+            return
+
+        started = time.perf_counter()
+
+        inserts = {}
+        counters = {}
+        for attempts, item in batch:
+            if item[0] == 'insert':
+                _, collection, document = item
+                inserts.setdefault(collection, []).append((attempts, item))
+            else:
+                _, collection, query, inc, set_fields = item
+                key = (collection, tuple(sorted(query.items())))
+                increments, fields, entries = counters.setdefault(key, ({}, {}, []))
+                for field, amount in inc.items():
+                    increments[field] = increments.get(field, 0) + amount
+                fields.update(set_fields)
+                entries.append((attempts, item))
+
+        written = 0
+        failed = False
+        touched = set()
+        for collection, entries in inserts.items():
+            documents = [item[2] for _, item in entries]
+            try:
+                self.writers[collection](documents)
+                written += len(documents)
+                touched.add(collection)
+            except Exception as e:
+                failed = True
+                print(f"❌ Ingest insert into {collection} failed ({len(documents)} docs): {e}")
+                self._failed(entries, collection, e, final)
+                handler = self.error_handlers.get(collection)
+                if handler:
+                    handler(e, documents)
+
+        for (collection, query), (increments, fields, entries) in counters.items():
+            try:
+                self.counter_writers[collection](dict(query), increments, fields)
+                touched.add(collection)
+            except Exception as e:
+                failed = True
+                print(f"❌ Ingest counter update on {collection} failed: {e}")
+                self._failed(entries, collection, e, final)
+
+        for collection in touched:
+            handler = self.written_handlers.get(collection)
+            if handler:
+                handler()
+
+        if failed:
+            with self.metrics_lock:
+                self.metrics['failedFlushes'] += 1
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        counter_items = len(batch) - sum(len(d) for d in inserts.values())
+        with self.metrics_lock:
+            self.metrics['flushes'] += 1
+            self.metrics['documentsWritten'] += written
+            self.metrics['counterUpdates'] += len(counters)
+            self.metrics['counterUpdatesCoalesced'] += counter_items - len(counters)
+            self.metrics['lastFlushMs'] = round(elapsed_ms, 3)
+            self.metrics['maxFlushMs'] = round(max(self.metrics['maxFlushMs'], elapsed_ms), 3)
+            self.metrics['totalFlushMs'] += elapsed_ms
+            self.metrics['lastFlushAt'] = datetime.now().isoformat()
+
+    def get_metrics(self):
+        """Snapshot of pipeline counters and flush latency"""
+        with self.metrics_lock:
+            metrics = dict(self.metrics)
+        total_ms = metrics.pop('totalFlushMs')
+        metrics['avgFlushMs'] = round(total_ms / metrics['flushes'], 3) if metrics['flushes'] else 0.0
+        metrics['queueDepth'] = self.queue.qsize()
+        metrics['retryDepth'] = len(self.retries)
+        metrics['queueCapacity'] = self.queue.maxsize
+        return metrics
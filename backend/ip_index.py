@@ -0,0 +1,355 @@
+"""
+IP reputation index: what is known about an address or a network, answered
+without scanning the history.
+
+Per-address stats live column-wise in arrays, one slot per address, so ten
+million addresses cost tens of bytes each instead of a dict apiece:
+- threat and response counts
+- first and last seen
+- per-severity counts
+- a bitmask of the response actions taken
+
+IPv4 addresses are filed into a stride-8 prefix tree:
+- running totals for every /8 network
+- running totals for every /16 network
+- under each /16, a sorted array of its member addresses and a parallel
+  array of their slots
+- under a dense /16 (more than DENSE_MEMBERS members), running totals for
+  each of its 256 /24 networks
+
+An IPv4 address's slot is found by bisecting its /16's members, so the tree
+is the only map from address to slot. A snapshot keeps every /16's members
+back to back in one pair of arrays, restored as raw bytes without hashing
+millions of addresses again; a /16 gets arrays of its own on its first new
+address after that. IPv6 addresses, which are not in the tree, find their
+slot through a hash map.
+
+A CIDR query sums at most 256 network totals for prefixes up to /16. For
+longer prefixes it sums the /24 totals of a dense /16, or bisects a single
+/16's members, so it never sums more than DENSE_MEMBERS slots. Only dense
+/16s pay for /24 totals: keeping them for every /24 would cost as much
+memory as the addresses themselves.
+
+Counts cover everything ingested since start; archiving rows does not reduce
+them. The caller serializes writers (write_lock in app_enhanced). Readers take
+no lock: a member array is replaced, never edited in place, so a reader sees
+either the old or the new arrays. A reader may also see a count that is one
+update ahead of its neighbours.
+"""
+import ipaddress
+import socket
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from records import ResponseRecord
+import config
+
+SEVERITIES = tuple(config.THREAT_SEVERITIES)
+SEVERITY_INDEX = {severity: index for index, severity in enumerate(SEVERITIES)}
+ACTIONS = ResponseRecord.CATEGORIES['action']  # action -> bit number in the actions mask
+MAX_ACTION_BITS = 64
+DENSE_MEMBERS = 256  # members beyond which a /16 keeps /24 totals
+
+
+def parse_ip(ip):
+    """Index key for an address: an int for IPv4, the canonical string for IPv6, None if invalid"""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except (OSError, TypeError):
+        pass
+    try:
+        return str(ipaddress.IPv6Address(ip))
+    except ValueError:
+        return None
+
+
+def _epoch(timestamp):
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch).isoformat() if epoch else None
+
+
+class StatsTable:
+    """Column-wise threat/response stats for a set of slots"""
+
+    def __init__(self, size=0):
+        self.threats = array('I', bytes(4 * size))
+        self.responses = array('I', bytes(4 * size))
+        self.addresses = array('I', bytes(4 * size))
+        self.first_seen = array('d', bytes(8 * size))  # 0.0 = never
+        self.last_seen = array('d', bytes(8 * size))
+        self.severities = [array('I', bytes(4 * size)) for _ in SEVERITIES]
+        self.actions = array('Q', bytes(8 * size))
+
+    def new_slot(self):
+        for column in (self.threats, self.responses, self.addresses, self.first_seen,
+                       self.last_seen, self.actions, *self.severities):
+            column.append(0)
+        return len(self.threats) - 1
+
+    def _seen(self, slot, seen):
+        if not self.first_seen[slot] or seen < self.first_seen[slot]:
+            self.first_seen[slot] = seen
+        if seen > self.last_seen[slot]:
+            self.last_seen[slot] = seen
+
+    def add_threat(self, slot, severity_index, seen):
+        self.threats[slot] += 1
+        if severity_index is not None:
+            self.severities[severity_index][slot] += 1
+        self._seen(slot, seen)
+
+    def add_slot(self, slot, other, other_slot):
+        """Fold another table's slot into one of ours"""
+        self.threats[slot] += other.threats[other_slot]
+        self.responses[slot] += other.responses[other_slot]
+        self.addresses[slot] += other.addresses[other_slot]
+        self.actions[slot] |= other.actions[other_slot]
+        for column, other_column in zip(self.severities, other.severities):
+            column[slot] += other_column[other_slot]
+        if other.first_seen[other_slot]:
+            self._seen(slot, other.first_seen[other_slot])
+            self._seen(slot, other.last_seen[other_slot])
+
+    def add_response(self, slot, action_bit, seen):
+        self.responses[slot] += 1
+        if action_bit is not None:
+            self.actions[slot] |= action_bit
+        self._seen(slot, seen)
+
+    COLUMNS = ('threats', 'responses', 'addresses', 'first_seen', 'last_seen', 'actions')
+
+    def state(self):
+        """Columns as raw bytes (snapshots)"""
+        state = {name: getattr(self, name).tobytes() for name in self.COLUMNS}
+        state['severities'] = [column.tobytes() for column in self.severities]
+        return state
+
+    def restore(self, state):
+        for name in self.COLUMNS:
+            column = array(getattr(self, name).typecode)
+            column.frombytes(state[name])
+            setattr(self, name, column)
+        self.severities = []
+        for data in state['severities']:
+            column = array('I')
+            column.frombytes(data)
+            self.severities.append(column)
+
+    def summary(self, slots):
+        """Totals over the given slots, in API shape"""
+        threats = responses = addresses = actions = 0
+        first = last = 0.0
+        severities = [0] * len(SEVERITIES)
+        for slot in slots:
+            threats += self.threats[slot]
+            responses += self.responses[slot]
+            addresses += self.addresses[slot]
+            actions |= self.actions[slot]
+            for index, column in enumerate(self.severities):
+                severities[index] += column[slot]
+            if self.first_seen[slot] and (not first or self.first_seen[slot] < first):
+                first = self.first_seen[slot]
+            last = max(last, self.last_seen[slot])
+        return {
+            'threats': threats,
+            'responses': responses,
+            'addresses': addresses,
+            'firstSeen': _iso(first),
+            'lastSeen': _iso(last),
+            'severities': dict(zip(SEVERITIES, severities)),
+            'actions': [ACTIONS.decode(bit) for bit in range(min(len(ACTIONS), MAX_ACTION_BITS))
+                        if actions >> bit & 1]
+        }
+
+
+class IpIndex:
+    """Stride-8 (/8, /16, dense /24, members) IPv4 prefix tree of per-address slots, plus an IPv6 hash map"""
+
+    def __init__(self):
+        self.ipv6_slots = {}  # parse_ip key of an IPv6 address -> slot in self.hosts
+        self.hosts = StatsTable()
+        self.net8 = StatsTable(1 << 8)  # slot = first octet
+        self.net16 = StatsTable(1 << 16)  # slot = first two octets
+        self.net24 = StatsTable()  # slot = net24_base of the /16 + third octet
+        self.net24_base = array('i', [-1] * (1 << 16))  # /16 -> first of its 256 net24 slots, -1 unless dense
+        # Restored members: (IPv4 ints, their slots, offsets) where /16 p holds the
+        # run offsets[p]..offsets[p + 1] of the first two arrays. Never modified.
+        self.restored = (array('I'), array('I'), array('I', bytes(4 * ((1 << 16) + 1))))
+        # /16 -> (sorted array of member IPv4 ints, array of their slots in self.hosts),
+        # None while its members are those restored
+        self.members = [None] * (1 << 16)
+
+    def _members(self, prefix):
+        """(sorted member IPv4 ints, their slots) of a /16, empty arrays if none"""
+        entry = self.members[prefix]
+        if entry is not None:
+            return entry
+        addresses, slots, offsets = self.restored
+        start, end = offsets[prefix], offsets[prefix + 1]
+        return addresses[start:end], slots[start:end]
+
+    def _slot(self, key):
+        """Slot of a parse_ip key, or None if the address was never seen"""
+        if not isinstance(key, int):
+            return self.ipv6_slots.get(key)
+        addresses, slots = self._members(key >> 16)
+        index = bisect_left(addresses, key)
+        if index < len(addresses) and addresses[index] == key:
+            return slots[index]
+        return None
+
+    # ==================== WRITES (caller holds the write lock) ====================
+
+    def _targets(self, ip):
+        """(table, slot) pairs an event on ip is counted in, creating the address if new"""
+        key = parse_ip(ip)
+        if key is None:
+            return ()
+        slot = self._slot(key)
+        if slot is None:
+            slot = self.hosts.new_slot()
+            self.hosts.addresses[slot] = 1
+            if isinstance(key, int):
+                addresses, slots = self._members(key >> 16)
+                index = bisect_left(addresses, key)
+                addresses, slots = array('I', addresses), array('I', slots)
+                addresses.insert(index, key)
+                slots.insert(index, slot)
+                self.members[key >> 16] = (addresses, slots)  # Swapped whole for lock-free readers
+                self.net16.addresses[key >> 16] += 1
+                self.net8.addresses[key >> 24] += 1
+                base = self.net24_base[key >> 16]
+                if base >= 0:
+                    self.net24.addresses[base + (key >> 8 & 0xFF)] += 1
+                elif len(addresses) > DENSE_MEMBERS:
+                    self._add_net24(key >> 16)
+            else:
+                self.ipv6_slots[key] = slot
+        if isinstance(key, int):
+            targets = ((self.hosts, slot), (self.net16, key >> 16), (self.net8, key >> 24))
+            base = self.net24_base[key >> 16]
+            if base >= 0:
+                targets += ((self.net24, base + (key >> 8 & 0xFF)),)
+            return targets
+        return ((self.hosts, slot),)
+
+    def _add_net24(self, prefix):
+        """Give a /16 that just became dense /24 totals, summed from its members"""
+        base = len(self.net24.threats)
+        for _ in range(256):
+            self.net24.new_slot()
+        addresses, slots = self._members(prefix)
+        for address, slot in zip(addresses, slots):
+            self.net24.add_slot(base + (address >> 8 & 0xFF), self.hosts, slot)
+        # Published last, so a reader never sums half-built totals
+        self.net24_base[prefix] = base
+
+    def record_threat(self, threat):
+        """Count a threat against its source ip"""
+        severity_index = SEVERITY_INDEX.get(threat['severity'])
+        seen = _epoch(threat['timestamp'])
+        for table, slot in self._targets(threat['ip']):
+            table.add_threat(slot, severity_index, seen)
+
+    def record_response(self, response_log):
+        """Count an automated response against its targetIp"""
+        code = ACTIONS.encode(response_log['action'])
+        action_bit = 1 << code if code < MAX_ACTION_BITS else None
+        seen = _epoch(response_log['timestamp'])
+        for table, slot in self._targets(response_log['targetIp']):
+            table.add_response(slot, action_bit, seen)
+
+    # ==================== SNAPSHOTS (caller holds the write lock) ====================
+
+    def state(self):
+        """Marshal-able copy of the whole index"""
+        return {
+            'ipv6': dict(self.ipv6_slots),
+            'hosts': self.hosts.state(),
+            'net8': self.net8.state(),
+            'net16': self.net16.state(),
+            'net24': self.net24.state(),
+            'net24Base': self.net24_base.tobytes(),
+            'members': [column.tobytes() for column in self._joined_members()]
+        }
+
+    def _joined_members(self):
+        """Every /16's members back to back, as restore() takes them"""
+        addresses, slots, offsets = array('I'), array('I'), array('I', [0])
+        for prefix in range(1 << 16):
+            members, member_slots = self._members(prefix)
+            addresses.extend(members)
+            slots.extend(member_slots)
+            offsets.append(len(addresses))
+        return addresses, slots, offsets
+
+    def restore(self, state):
+        """Replace the index with a state() copy"""
+        self.hosts.restore(state['hosts'])
+        self.net8.restore(state['net8'])
+        self.net16.restore(state['net16'])
+        restored = (array('I'), array('I'), array('I'))
+        for column, data in zip(restored, state['members']):
+            column.frombytes(data)
+        self.restored = restored
+        self.members = [None] * (1 << 16)
+        self.ipv6_slots = state['ipv6']
+        self.net24 = StatsTable()
+        self.net24_base = array('i', [-1] * (1 << 16))
+        if 'net24' in state:
+            self.net24.restore(state['net24'])
+            self.net24_base = array('i')
+            self.net24_base.frombytes(state['net24Base'])
+        else:
+            # Snapshot from before /24 totals: sum them once for the dense /16s
+            offsets = self.restored[2]
+            for prefix in range(1 << 16):
+                if offsets[prefix + 1] - offsets[prefix] > DENSE_MEMBERS:
+                    self._add_net24(prefix)
+
+    # ==================== QUERIES ====================
+
+    def lookup(self, ip):
+        """Stats for one address (None if never seen); raises ValueError for an invalid address"""
+        key = parse_ip(ip)
+        if key is None:
+            raise ValueError(f"Invalid IP address: {ip}")
+        slot = self._slot(key)
+        if slot is None:
+            return None
+        summary = self.hosts.summary((slot,))
+        del summary['addresses']
+        return summary
+
+    def network(self, prefix):
+        """Totals for an IPv4 CIDR prefix; raises ValueError for an invalid or IPv6 prefix"""
+        try:
+            network = ipaddress.ip_network(prefix, strict=False)
+        except ValueError:
+            raise ValueError(f"Invalid CIDR prefix: {prefix}")
+        if network.version != 4:
+            raise ValueError('Invalid CIDR prefix: only IPv4 networks are indexed')
+
+        start, length = int(network.network_address), network.prefixlen
+        if length <= 8:
+            first = start >> 24
+            return self.net8.summary(range(first, first + (1 << (8 - length))))
+        if length <= 16:
+            first = start >> 16
+            return self.net16.summary(range(first, first + (1 << (16 - length))))
+
+        base = self.net24_base[start >> 16]
+        if length <= 24 and base >= 0:
+            first = base + (start >> 8 & 0xFF)
+            return self.net24.summary(range(first, first + (1 << (24 - length))))
+
+        addresses, slots = self._members(start >> 16)
+        low = bisect_left(addresses, start)
+        high = bisect_left(addresses, start + (1 << (32 - length)), low)
+        return self.hosts.summary(slots[low:high])
+
+    def __len__(self):
+        return len(self.hosts.threats)
@@ -0,0 +1,69 @@
+"""
+Leader election for app.py's background services: one MongoDB lease document
+names the process that runs the threat generator, node updater, rollup and
+archiver loops. Every other process (gunicorn workers, the other half of the
+debug reloader, a second host) serves reads and follows what the leader writes.
+
+The lease is taken with one conditional upsert that matches only when the
+document is ours or has expired; the unique _id turns a lost race for a
+missing or live lease into a DuplicateKeyError. The holder renews it every
+LEADER_RENEW_INTERVAL seconds and considers itself leader only until the
+expiry it last wrote, so a leader cut off from MongoDB stops before anyone
+else can take over. A crashed leader is replaced LEADER_LEASE_TTL seconds
+after its last renewal. Expiry is judged by each process's clock, so clocks
+must agree to well within the TTL.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from database import get_db
+import config
+
+LEASE_ID = 'background-services'
+
+
+class LeaderLease:
+    """This process's claim on one named lease"""
+
+    def __init__(self, name=LEASE_ID):
+        self.name = name
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.expires = None  # Expiry of the lease we hold, None when we do not hold it
+
+    def try_acquire(self):
+        """Take the lease if it is free or expired, renew it if it is ours; returns whether we hold it"""
+        now = datetime.now(timezone.utc)
+        expires = now + timedelta(seconds=config.LEADER_LEASE_TTL)
+        leases = get_db()[config.COLLECTIONS['LEASES']]
+        try:
+            leases.update_one(
+                {'_id': self.name, '$or': [{'owner': self.owner}, {'expiresAt': {'$lt': now}}]},
+                {'$set': {'owner': self.owner, 'expiresAt': expires, 'renewedAt': now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The filter missed an existing document: someone else holds a live lease
+            self.expires = None
+            return False
+        except PyMongoError as e:
+            # Could not renew: the lease we hold (if any) still runs until its expiry
+            print(f"⚠️  Leader lease renewal failed: {e}")
+            return self.valid()
+        self.expires = expires
+        return True
+
+    def valid(self):
+        """Whether we hold the lease right now, by our own clock"""
+        return self.expires is not None and datetime.now(timezone.utc) < self.expires
+
+    def release(self):
+        """Give the lease up (clean shutdown) so a successor need not wait for it to expire"""
+        if self.expires is None:
+            return
+        self.expires = None
+        try:
+            get_db()[config.COLLECTIONS['LEASES']].delete_one({'_id': self.name, 'owner': self.owner})
+        except PyMongoError as e:
+            print(f"⚠️  Could not release the leader lease: {e}")
@@ -0,0 +1,166 @@
+"""
+MongoDB side of the blockchain ledger: in-memory chain head so appending a
+block never has to read the previous block back, and checkpointed verification
+"""
+import threading
+from itertools import chain
+from pymongo import ASCENDING, DESCENDING
+from database import get_db
+from blockchain import GENESIS_HASH, LedgerVerifier, inclusion_proof
+from response_cache import response_cache
+from archive import archive
+import config
+
+CHECKPOINT_ID = 'ledger'
+
+
+class ChainHead:
+    """Last block number and hash of the ledger, loaded once and updated on append"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.block_number = 0
+        self.current_hash = GENESIS_HASH
+        self.loaded = False
+
+    def load(self):
+        """Read the tip of the ledger (once at startup, or after a conflict)"""
+        db = get_db()
+        last_block = db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].find_one(
+            {},
+            {'_id': 0, 'blockNumber': 1, 'currentHash': 1},
+            sort=[('blockNumber', DESCENDING)]
+        )
+
+        with self.lock:
+            if last_block:
+                # Never move backwards: blocks queued by this process may not be flushed yet
+                if last_block['blockNumber'] >= self.block_number:
+                    self.block_number = last_block['blockNumber']
+                    self.current_hash = last_block['currentHash']
+            self.loaded = True
+
+        print(f"⛓️  Chain head: block #{self.block_number} | Hash: {self.current_hash}")
+
+    def append(self, build_block):
+        """
+        Atomically reserve the next block number and link it to the current head.
+        build_block(block_number, previous_hash) must return the new block.
+        """
+        if not self.loaded:
+            self.load()
+
+        with self.lock:
+            block = build_block(self.block_number + 1, self.current_hash)
+            self.block_number = block['blockNumber']
+            self.current_hash = block['currentHash']
+        return block
+
+    def advance(self, block):
+        """Move to a block another process appended (followers tailing the ledger)"""
+        with self.lock:
+            if block['blockNumber'] > self.block_number:
+                self.block_number = block['blockNumber']
+                self.current_hash = block['currentHash']
+            self.loaded = True
+
+    def rewind(self):
+        """
+        Move back to the tip actually stored, after queued blocks were rejected
+        (another writer holds their number, or they extend a rejected block)
+        """
+        db = get_db()
+        last_block = db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].find_one(
+            {},
+            {'_id': 0, 'blockNumber': 1, 'currentHash': 1},
+            sort=[('blockNumber', DESCENDING)]
+        )
+        with self.lock:
+            self.block_number = last_block['blockNumber'] if last_block else 0
+            self.current_hash = last_block['currentHash'] if last_block else GENESIS_HASH
+            self.loaded = True
+        print(f"⛓️  Chain head rewound to the stored tip: block #{self.block_number}")
+
+
+def unsealed_threats(threats, chunk=1000):
+    """The given stored threats that no ledger block holds, in their original order"""
+    ledger = get_db()[config.COLLECTIONS['BLOCKCHAIN_LEDGER']]
+    sealed = set()
+    for start in range(0, len(threats), chunk):
+        ids = [threat['threatId'] for threat in threats[start:start + chunk]]
+        # Served by the multikey threatIds index
+        for block in ledger.find({'threatIds': {'$in': ids}}, {'_id': 0, 'threatIds': 1}):
+            sealed.update(block['threatIds'])
+    return [threat for threat in threats if threat['threatId'] not in sealed]
+
+
+# ==================== VERIFICATION ====================
+
+def load_verifier():
+    """LedgerVerifier resumed from the checkpoint stored in MongoDB"""
+    db = get_db()
+    checkpoint = db[config.COLLECTIONS['LEDGER_CHECKPOINT']].find_one(
+        {'_id': CHECKPOINT_ID},
+        {'_id': 0}
+    )
+    if checkpoint and 'legacyThrough' not in checkpoint and not checkpoint['valid']:
+        # Stored before legacy blocks were anchored: it may have failed on the
+        # first legacy block, so rescan once from genesis
+        checkpoint = None
+    return LedgerVerifier(checkpoint)
+
+
+def verify_ledger(full=False):
+    """Verify blocks appended since the stored checkpoint and persist the new one"""
+    db = get_db()
+    verifier = load_verifier()
+    if full:
+        verifier.reset()
+
+    # Transaction lists are needed to re-derive each block's Merkle root
+    projection = {'_id': 0}
+    ledger = db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']]
+    start = verifier.checkpoint['blockNumber']
+    cursor = ledger.find({'blockNumber': {'$gt': start}}, projection).sort('blockNumber', ASCENDING)
+
+    blocks = cursor
+    first = ledger.find_one({}, {'_id': 0, 'blockNumber': 1}, sort=[('blockNumber', ASCENDING)])
+    if first and start + 1 < first['blockNumber']:
+        # A rescan from before the oldest hot block replays the archived blocks first
+        archived = (
+            block for block in archive.read('blockchain-ledger')
+            if start < block['blockNumber'] < first['blockNumber']
+        )
+        blocks = chain(archived, cursor)
+
+    result = verifier.verify(blocks)
+    cursor.close()
+
+    db[config.COLLECTIONS['LEDGER_CHECKPOINT']].replace_one(
+        {'_id': CHECKPOINT_ID},
+        verifier.checkpoint,
+        upsert=True
+    )
+    if result['blocksChecked']:
+        response_cache.bump(config.COLLECTIONS['LEDGER_CHECKPOINT'])
+    return result, verifier
+
+
+def find_inclusion_proof(threat_id):
+    """
+    Merkle inclusion proof for a threat and whether its block is archived, or
+    (None, False) if no sealed block holds it
+    """
+    db = get_db()
+    block = db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].find_one(
+        {'threatIds': threat_id},
+        {'_id': 0}
+    )
+    if block:
+        return inclusion_proof(block, threat_id), False
+
+    # Blocks past retention are only on disk
+    block = archive.find_block(threat_id)
+    if block:
+        return inclusion_proof(block, threat_id), True
+    return None, False
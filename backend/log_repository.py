@@ -0,0 +1,317 @@
+"""
+Segment log repository: threats, ledger and response logs in append-only
+segment logs (segment_log.py) under config.LOG_DIR. A single node can then
+keep its history across restarts without running MongoDB.
+
+Threats and response logs are keyed by timestamp + NUL + id, which sorts
+like (timestamp, id), and blocks by their zero-padded number. The logs only
+take keys in order, but record timestamps are local wall-clock times that can
+step back (DST, NTP) or arrive late, so a row that would sort before the
+newest key is re-sequenced: it is keyed one microsecond after it, and the
+stored row keeps its own timestamp. It then counts as written at that time
+for history ranges and retention, rather than being skipped. History pages
+and tails are reverse scans from the sparse index. Lookups by ID go through
+in-memory maps of record positions, which opening rebuilds in one key-only
+pass. Nodes and the AI status are small mutable documents, so they live in
+memory and are saved to status.json with each group commit.
+
+Writes are durable after the next group commit: every config.LOG_FSYNC_INTERVAL
+seconds, or on each write when it is 0 (once per batch() then). Only one process may open a directory
+(the segment logs lock it).
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from pagination import encode_cursor
+from repository import Repository, default_nodes, default_ai_status, apply_update
+from segment_log import SegmentLog
+import config
+
+STATUS_FILE = 'status.json'
+
+
+def time_key(timestamp, record_id):
+    """Log key ordered like (timestamp, record_id); NUL sorts below every ISO timestamp character"""
+    return f"{timestamp}\x00{record_id}"
+
+
+def sequenced_keys(log, rows, id_field):
+    """time_key of each row, re-sequenced where it would not sort after the key before it"""
+    keys = []
+    previous = log.tail_key
+    for row in rows:
+        key = time_key(row['timestamp'], row[id_field])
+        if previous is not None and key <= previous:
+            after = datetime.fromisoformat(previous.partition('\x00')[0]) + timedelta(microseconds=1)
+            key = time_key(after.isoformat(timespec='microseconds'), row[id_field])
+        keys.append(key)
+        previous = key
+    return keys
+
+
+def block_key(block_number):
+    return f"{block_number:012d}"
+
+
+def _encode(document):
+    return json.dumps(document, separators=(',', ':')).encode()
+
+
+class LogRepository(Repository):
+    """Embedded append-only backend with memory-mapped reads"""
+
+    name = 'log'
+    persistent = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.threats = SegmentLog(os.path.join(directory, 'threats'))
+        self.blocks = SegmentLog(os.path.join(directory, 'blocks'))
+        self.responses = SegmentLog(os.path.join(directory, 'responses'))
+        for log in (self.threats, self.blocks, self.responses):
+            for path, offset in log.repairs:
+                print(f"🔧 Segment log recovery: {path} is valid up to byte {offset}")
+
+        # Rebuilt from the logs: only keys and the ledger's threat lists are read
+        self.threat_positions = {}  # threatId -> log position
+        for position, key in self.threats.keys():
+            self.threat_positions[key.partition('\x00')[2]] = position
+        self.block_positions = {}  # blockNumber -> log position
+        self.threat_blocks = {}  # threatId -> number of the block holding it
+        self.tip = None  # Number of the last appended block
+        for position, key in self.blocks.keys():
+            self._index_block(json.loads(self.blocks.read(position)), position)
+
+        self.status_lock = threading.Lock()
+        self.status_dirty = False
+        status_path = os.path.join(directory, STATUS_FILE)
+        if os.path.exists(status_path):
+            with open(status_path) as f:
+                status = json.load(f)
+            self.nodes = {node['nodeId']: node for node in status['nodes']}
+            self.ai_status = status['aiStatus']
+        else:
+            self.nodes = {node['nodeId']: node for node in default_nodes()}
+            self.ai_status = default_ai_status()
+            self.status_dirty = True
+
+        self.batch_thread = None  # Thread inside batch(): its writes wait for the batch's group commit
+        self.stopped = threading.Event()
+        self.sync_thread = None
+        if config.LOG_FSYNC_INTERVAL > 0:
+            self.sync_thread = threading.Thread(target=self._sync_loop, daemon=True)
+            self.sync_thread.start()
+
+    def _index_block(self, block, position):
+        self.block_positions[block['blockNumber']] = position
+        self.tip = block['blockNumber']
+        for threat_id in block['threatIds']:
+            self.threat_blocks[threat_id] = block['blockNumber']
+
+    def _sync_loop(self):
+        while not self.stopped.wait(config.LOG_FSYNC_INTERVAL):
+            self.sync()
+
+    def sync(self):
+        """Group commit: fsync what was appended since the last one and save the status documents"""
+        for log in (self.threats, self.blocks, self.responses):
+            log.sync()
+        with self.status_lock:
+            if not self.status_dirty:
+                return
+            status = {'nodes': list(self.nodes.values()), 'aiStatus': self.ai_status}
+            self.status_dirty = False
+            path = os.path.join(self.directory, STATUS_FILE)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(status, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+
+    def _written(self):
+        if not config.LOG_FSYNC_INTERVAL and self.batch_thread != threading.get_ident():
+            self.sync()
+
+    @contextmanager
+    def batch(self):
+        if self.batch_thread == threading.get_ident():
+            yield
+            return
+        self.batch_thread = threading.get_ident()
+        try:
+            yield
+        finally:
+            self.batch_thread = None
+            self._written()
+
+    @staticmethod
+    def _iter(log, after):
+        # key + NUL is the smallest key above key
+        since = time_key(*after) + '\x00' if after is not None else ''
+        return (json.loads(payload) for _, payload in log.scan(since=since))
+
+    def _expire(self, log, cutoff, archive_rows):
+        rows = [json.loads(payload) for _, payload in log.scan(until=cutoff)]
+        if rows:
+            archive_rows(rows)
+        # A key below cutoff is exactly a timestamp below it (NUL sorts first)
+        log.truncate_before(cutoff)
+        return rows
+
+    # ==================== THREATS ====================
+
+    def add_threats(self, threats):
+        threats = sorted(threats, key=lambda threat: (threat['timestamp'], threat['threatId']))
+        keys = sequenced_keys(self.threats, threats, 'threatId')
+        positions = self.threats.append([(key, _encode(threat)) for key, threat in zip(keys, threats)])
+        for threat, position in zip(threats, positions):
+            self.threat_positions[threat['threatId']] = position
+        self._written()
+
+    def get_threat(self, threat_id):
+        position = self.threat_positions.get(threat_id)
+        payload = self.threats.read(position) if position is not None else None
+        return json.loads(payload) if payload is not None else None
+
+    def threat_page(self, query):
+        before = time_key(*query['cursor']) if query['cursor'] else None
+        if query['until'] and (before is None or query['until'] < before):
+            before = query['until']
+        filters = query['filters']
+        limit = query['limit']
+
+        threats = []
+        last_key = None
+        for key, payload in self.threats.scan_reverse(before):
+            if query['since'] and key < query['since']:
+                break
+            threat = json.loads(payload)
+            if all(threat.get(field) == value for field, value in filters.items()):
+                threats.append(threat)
+                # One extra row tells us whether another page exists
+                if len(threats) > limit:
+                    break
+                last_key = key
+
+        next_cursor = None
+        if len(threats) > limit:
+            threats = threats[:limit]
+            # From the key: a re-sequenced row's own timestamp sorts lower than its position
+            timestamp, _, threat_id = last_key.partition('\x00')
+            next_cursor = encode_cursor(timestamp, threat_id)
+        return threats, next_cursor
+
+    def iter_threats(self, after=None):
+        return self._iter(self.threats, after)
+
+    def count_threats(self):
+        return len(self.threats)
+
+    def expire_threats(self, cutoff, archive_rows):
+        rows = self._expire(self.threats, cutoff, archive_rows)
+        for row in rows:
+            self.threat_positions.pop(row['threatId'], None)
+        return rows
+
+    # ==================== LEDGER ====================
+
+    def append_block(self, block):
+        (position,) = self.blocks.append([(block_key(block['blockNumber']), _encode(block))])
+        self._index_block(block, position)
+        self._written()
+
+    def get_block(self, block_number):
+        position = self.block_positions.get(block_number)
+        payload = self.blocks.read(position) if position is not None else None
+        return json.loads(payload) if payload is not None else None
+
+    def last_block(self):
+        # None once expire_blocks has removed the tip too
+        return self.get_block(self.tip) if self.tip is not None else None
+
+    def first_block_number(self):
+        key = self.blocks.first_key()
+        return int(key) if key is not None else None
+
+    def count_blocks(self):
+        return len(self.blocks)
+
+    def latest_blocks(self, count):
+        return [json.loads(payload) for _, payload in islice(self.blocks.scan_reverse(), count)]
+
+    def iter_blocks(self, after=0):
+        return (json.loads(payload) for _, payload in self.blocks.scan(since=block_key(after + 1)))
+
+    def block_number_of(self, threat_id):
+        return self.threat_blocks.get(threat_id)
+
+    def expire_blocks(self, through, cutoff, archive_rows):
+        blocks = []
+        for _, payload in self.blocks.scan():
+            block = json.loads(payload)
+            if block['blockNumber'] > through or block['timestamp'] >= cutoff:
+                break
+            blocks.append(block)
+        if blocks:
+            archive_rows(blocks)
+            self.blocks.truncate_before(block_key(blocks[-1]['blockNumber'] + 1))
+        for block in blocks:
+            self.block_positions.pop(block['blockNumber'], None)
+            for threat_id in block['threatIds']:
+                self.threat_blocks.pop(threat_id, None)
+        return blocks
+
+    # ==================== RESPONSE LOGS ====================
+
+    def add_responses(self, response_logs):
+        response_logs = sorted(response_logs, key=lambda log: (log['timestamp'], log['logId']))
+        keys = sequenced_keys(self.responses, response_logs, 'logId')
+        self.responses.append([(key, _encode(log)) for key, log in zip(keys, response_logs)])
+        self._written()
+
+    def latest_responses(self, count):
+        return [json.loads(payload) for _, payload in islice(self.responses.scan_reverse(), count)]
+
+    def iter_responses(self, after=None):
+        return self._iter(self.responses, after)
+
+    def count_responses(self):
+        return len(self.responses)
+
+    def expire_responses(self, cutoff, archive_rows):
+        return self._expire(self.responses, cutoff, archive_rows)
+
+    # ==================== NODES & AI STATUS ====================
+
+    def list_nodes(self):
+        with self.status_lock:
+            return [dict(node) for node in self.nodes.values()]
+
+    def update_node(self, node_id, fields=None, increments=None):
+        with self.status_lock:
+            node = self.nodes.get(node_id)
+            if node is not None:
+                apply_update(node, fields, increments)
+                self.status_dirty = True
+        self._written()
+
+    def get_ai_status(self):
+        with self.status_lock:
+            return dict(self.ai_status)
+
+    def update_ai_status(self, fields=None, increments=None):
+        with self.status_lock:
+            apply_update(self.ai_status, fields, increments)
+            self.status_dirty = True
+        self._written()
+
+    def close(self):
+        self.stopped.set()
+        if self.sync_thread is not None:
+            self.sync_thread.join()
+        self.sync()
+        for log in (self.threats, self.blocks, self.responses):
+            log.close()
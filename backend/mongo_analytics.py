@@ -0,0 +1,189 @@
+"""
+Analytics for the MongoDB deployment, computed server-side with aggregation
+pipelines so raw threat documents are never pulled into Flask to be counted.
+
+Per-day x severity x type x status counts can be materialized into the
+threat_rollups collection with $merge; when ANALYTICS_USE_ROLLUPS is on,
+distributions and trends are summed from those rollups instead of the history.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from pymongo import DESCENDING
+from database import get_db
+from analytics import HOURS_TRACKED
+import config
+
+ROLLUP_KEY = ('day', 'severity', 'type', 'status')
+
+
+def _parsed_timestamp():
+    return {'$dateFromString': {'dateString': '$timestamp'}}
+
+
+def _truncated(unit):
+    return {'$dateTrunc': {'date': _parsed_timestamp(), 'unit': unit}}
+
+
+def _threat_source(since=None):
+    """
+    Collection, leading $match and count expression for threat counts, read
+    from the rollups or straight from threat_history
+    """
+    db = get_db()
+    if config.ANALYTICS_USE_ROLLUPS:
+        match = {'day': {'$gte': since}} if since else {}
+        return db[config.COLLECTIONS['THREAT_ROLLUPS']], match, '$count', '$day'
+
+    match = {'timestamp': {'$gte': since.isoformat()}} if since else {}
+    return db[config.COLLECTIONS['THREAT_HISTORY']], match, 1, _truncated('day')
+
+
+def _as_dict(groups):
+    return {group['_id']: group['count'] for group in groups if group['_id'] is not None}
+
+
+# ==================== ROLLUPS ====================
+
+def refresh_rollups():
+    """
+    Recompute rollups from the start of the newest rolled-up day onwards and
+    $merge them into threat_rollups; earlier days are final and left untouched
+    """
+    db = get_db()
+    rollups = db[config.COLLECTIONS['THREAT_ROLLUPS']]
+    latest = rollups.find_one({}, {'day': 1}, sort=[('day', DESCENDING)])
+
+    pipeline = []
+    if latest:
+        # The timestamp index keeps this an index range scan
+        pipeline.append({'$match': {'timestamp': {'$gte': latest['day'].isoformat()}}})
+    pipeline += [
+        {'$group': {
+            '_id': {
+                'day': _truncated('day'),
+                'severity': '$severity',
+                'type': '$type',
+                'status': '$status'
+            },
+            'count': {'$sum': 1}
+        }},
+        {'$project': {
+            '_id': 0,
+            'day': '$_id.day',
+            'severity': '$_id.severity',
+            'type': '$_id.type',
+            'status': '$_id.status',
+            'count': 1
+        }},
+        {'$merge': {
+            'into': config.COLLECTIONS['THREAT_ROLLUPS'],
+            'on': list(ROLLUP_KEY),
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+    db[config.COLLECTIONS['THREAT_HISTORY']].aggregate(pipeline)
+
+
+# ==================== OVERVIEW ====================
+
+def overview(now=None):
+    """Same fields as the in-memory server's /api/analytics/overview aggregates"""
+    db = get_db()
+    now = now or datetime.now()
+
+    collection, match, count, _ = _threat_source()
+    stages = [{'$match': match}] if match else []
+    facets = list(collection.aggregate(stages + [{'$facet': {
+        'severity': [{'$group': {'_id': '$severity', 'count': {'$sum': count}}}],
+        'type': [{'$group': {'_id': '$type', 'count': {'$sum': count}}}],
+        'status': [{'$group': {'_id': '$status', 'count': {'$sum': count}}}]
+    }}]))[0]
+
+    severity_counts = _as_dict(facets['severity'])
+    status_counts = _as_dict(facets['status'])
+
+    # Hourly buckets always come from the raw history: it is a bounded index range
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    oldest_hour = current_hour - timedelta(hours=HOURS_TRACKED - 1)
+    hourly = _as_dict(db[config.COLLECTIONS['THREAT_HISTORY']].aggregate([
+        {'$match': {'timestamp': {'$gte': oldest_hour.isoformat()}}},
+        {'$group': {'_id': _truncated('hour'), 'count': {'$sum': 1}}}
+    ]))
+    hourly_trends = {}
+    for offset in range(HOURS_TRACKED - 1, -1, -1):
+        hour = current_hour - timedelta(hours=offset)
+        hourly_trends[hour.strftime('%H:00')] = hourly.get(hour, 0)
+
+    # Submissions are flagged on the threat, like the in-memory aggregator counts them;
+    # served by the partial userSubmitted index
+    user_submitted = db[config.COLLECTIONS['THREAT_HISTORY']].count_documents({'userSubmitted': True})
+
+    # Counts on the indexed status field, no documents leave the server
+    responses = db[config.COLLECTIONS['RESPONSE_LOGS']]
+    total_responses = responses.estimated_document_count()
+    successful_responses = responses.count_documents({'status': 'Success'})
+    response_rate = round(
+        (successful_responses / total_responses * 100) if total_responses > 0 else 0, 2
+    )
+
+    return {
+        'totalThreats': sum(severity_counts.values()),
+        'userSubmittedThreats': user_submitted,
+        'blockedThreats': status_counts.get('Blocked', 0),
+        'activeMonitoring': status_counts.get('Monitoring', 0),
+        'severityDistribution': severity_counts,
+        'threatTypeDistribution': _as_dict(facets['type']),
+        'hourlyTrends': hourly_trends,
+        'responseEffectiveness': response_rate
+    }
+
+
+# ==================== TRENDS ====================
+
+def trend(days, bucket_days, today=None):
+    """Oldest-first buckets of bucket_days days covering the last `days` days"""
+    today = today or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    first = today - timedelta(days=days - 1)
+
+    collection, match, count, day = _threat_source(since=first)
+    groups = collection.aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': {'day': day, 'severity': '$severity', 'type': '$type'},
+            'count': {'$sum': count}
+        }}
+    ])
+
+    # At most days x severities x types small groups; fold them into buckets here
+    buckets = {}
+    for group in groups:
+        offset = (group['_id']['day'] - first).days // bucket_days
+        entry = buckets.setdefault(offset, {'count': 0, 'severity': Counter(), 'types': Counter()})
+        entry['count'] += group['count']
+        entry['severity'][group['_id']['severity']] += group['count']
+        entry['types'][group['_id']['type']] += group['count']
+
+    trends = []
+    offset = 0
+    start = first
+    while start <= today:
+        end = min(start + timedelta(days=bucket_days - 1), today)
+        entry = buckets.get(offset, {'count': 0, 'severity': Counter(), 'types': Counter()})
+        severity = Counter({name: 0 for name in config.THREAT_SEVERITIES})
+        severity.update(entry['severity'])
+
+        item = {
+            'date': start.date().isoformat(),
+            'count': entry['count'],
+            'severity': dict(severity),
+            'types': dict(entry['types'])
+        }
+        if bucket_days > 1:
+            item['endDate'] = end.date().isoformat()
+        trends.append(item)
+
+        start = end + timedelta(days=1)
+        offset += 1
+
+    return trends
@@ -0,0 +1,85 @@
+"""
+Retention for the MongoDB deployment: threats, response logs and ledger blocks
+past their retention window are written to the on-disk archive (archive.py)
+and then deleted from their collection, a batch at a time. The TTL indexes on
+createdAt (database.py) are only a backstop that keeps the collections bounded
+if the archiver stops running; they fire ARCHIVE_GRACE_DAYS later than it.
+
+A crash between writing a batch and deleting it hands that batch to the
+archive again on the next run, which skips the rows it already holds; rows are
+never deleted before they are on disk.
+"""
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from database import get_db
+from ledger import load_verifier
+from archive import archive, RETENTION_DAYS, retention_cutoff
+from response_cache import response_cache
+import config
+
+# archive dataset -> collection it is moved out of
+ARCHIVE_COLLECTIONS = {
+    'threat-history': config.COLLECTIONS['THREAT_HISTORY'],
+    'response-logs': config.COLLECTIONS['RESPONSE_LOGS'],
+    'blockchain-ledger': config.COLLECTIONS['BLOCKCHAIN_LEDGER']
+}
+
+def _move(dataset, collection, query, sort):
+    """Archive the matching documents in sort order, deleting each batch once it is written"""
+    moved = 0
+    batch = []
+    cursor = collection.find(query, {'createdAt': 0}).sort(sort).batch_size(config.ARCHIVE_BATCH_ROWS)
+    for document in cursor:
+        batch.append(document)
+        if len(batch) == config.ARCHIVE_BATCH_ROWS:
+            moved += _flush(dataset, collection, batch)
+            batch = []
+    if batch:
+        moved += _flush(dataset, collection, batch)
+    return moved
+
+
+def _flush(dataset, collection, batch):
+    ids = [document.pop('_id') for document in batch]
+    archive.write(dataset, batch)
+    collection.delete_many({'_id': {'$in': ids}})
+    return len(ids)
+
+
+def archive_expired(now=None):
+    """Move every dataset's expired rows to the archive; returns the counts moved"""
+    db = get_db()
+    now = now or datetime.now()
+    archived = {}
+
+    for dataset in ('threat-history', 'response-logs'):
+        archived[dataset] = _move(
+            dataset,
+            db[ARCHIVE_COLLECTIONS[dataset]],
+            {'timestamp': {'$lt': retention_cutoff(dataset, now)}},
+            [('timestamp', ASCENDING), ('_id', ASCENDING)]
+        )
+
+    # Ledger: only verified blocks, and never the tip (the chain head is loaded from it)
+    ledger = db[ARCHIVE_COLLECTIONS['blockchain-ledger']]
+    tip = ledger.find_one({}, {'_id': 0, 'blockNumber': 1}, sort=[('blockNumber', DESCENDING)])
+    archived['blockchain-ledger'] = 0
+    if tip:
+        last_archivable = min(load_verifier().checkpoint['blockNumber'], tip['blockNumber'] - 1)
+        archived['blockchain-ledger'] = _move(
+            'blockchain-ledger',
+            ledger,
+            {
+                'blockNumber': {'$lte': last_archivable},
+                'timestamp': {'$lt': retention_cutoff('blockchain-ledger', now)}
+            },
+            [('blockNumber', ASCENDING)]
+        )
+
+    # Days entirely past retention are merged into one file each
+    for dataset in RETENTION_DAYS:
+        archive.compact(dataset, retention_cutoff(dataset, now)[:10])
+        if archived[dataset]:
+            response_cache.bump(ARCHIVE_COLLECTIONS[dataset])
+
+    return archived
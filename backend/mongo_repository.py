@@ -0,0 +1,226 @@
+"""
+MongoDB repository over the collections that app.py and services.py use, so
+app_enhanced.py can run against the same database (STORAGE_BACKEND = 'mongo').
+Threats and response logs are stored with the createdAt date their TTL
+indexes expire on; createdAt and _id are projected out of every read. History
+pages keep app.py's (timestamp, _id) cursors and THREAT_HISTORY_INDEXES.
+"""
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from pagination import encode_cursor
+from repository import Repository
+import config
+
+PROJECTION = {'_id': 0, 'createdAt': 0}
+DUPLICATE_KEY = 11000
+
+
+def build_history_query(page):
+    """Mongo filter for a history page; served by the THREAT_HISTORY_INDEXES"""
+    clauses = [dict(page['filters'])]
+
+    if page['since'] or page['until']:
+        time_range = {}
+        if page['since']:
+            time_range['$gte'] = page['since']
+        if page['until']:
+            time_range['$lt'] = page['until']
+        clauses.append({'timestamp': time_range})
+
+    if page['cursor']:
+        timestamp, last_id = page['cursor']
+        try:
+            last_id = ObjectId(last_id)
+        except (InvalidId, TypeError):
+            raise ValueError('Invalid cursor')
+        # Strictly after the last row of the previous page in (timestamp, _id) order
+        clauses.append({'$or': [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': last_id}}
+        ]})
+
+    return {'$and': clauses} if len(clauses) > 1 else clauses[0]
+
+
+def _after(after, id_field):
+    """Filter for documents sorting after (timestamp, id)"""
+    if after is None:
+        return {}
+    timestamp, last_id = after
+    return {'$or': [{'timestamp': {'$gt': timestamp}}, {'timestamp': timestamp, id_field: {'$gt': last_id}}]}
+
+
+def _insert_new(collection, documents):
+    """
+    insert_many that ignores documents already stored (duplicate threatId /
+    logId), so a retried batch that partly landed the first time succeeds
+    """
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        details = e.details
+        if details.get('writeConcernErrors') or any(
+            error['code'] != DUPLICATE_KEY for error in details['writeErrors']
+        ):
+            raise
+
+
+def _with_created_at(document):
+    """Copy for insertion, stamped for the TTL index (insert_many adds _id to what it is given)"""
+    return dict(document, createdAt=datetime.fromisoformat(document['timestamp']))
+
+
+class MongoRepository(Repository):
+    """Backend on an initialized database (database.init_db)"""
+
+    name = 'mongo'
+    persistent = True
+
+    def __init__(self, db):
+        self.threats = db[config.COLLECTIONS['THREAT_HISTORY']]
+        self.live = db[config.COLLECTIONS['LIVE_THREATS']]
+        self.blocks = db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']]
+        self.responses = db[config.COLLECTIONS['RESPONSE_LOGS']]
+        self.nodes = db[config.COLLECTIONS['NODES_STATUS']]
+        self.ai_status = db[config.COLLECTIONS['AI_STATUS']]
+
+    def _expire(self, collection, cutoff, archive_rows):
+        """Delete and return the documents older than cutoff, a batch at a time, once archive_rows has taken them"""
+        rows = list(collection.find({'timestamp': {'$lt': cutoff}}, {'createdAt': 0}).sort(
+            [('timestamp', ASCENDING), ('_id', ASCENDING)]
+        ).batch_size(config.ARCHIVE_BATCH_ROWS))
+        ids = [row.pop('_id') for row in rows]
+        if rows:
+            archive_rows(rows)
+        for start in range(0, len(ids), config.ARCHIVE_BATCH_ROWS):
+            collection.delete_many({'_id': {'$in': ids[start:start + config.ARCHIVE_BATCH_ROWS]}})
+        return rows
+
+    @staticmethod
+    def _update(fields, increments):
+        update = {}
+        if fields:
+            update['$set'] = fields
+        if increments:
+            update['$inc'] = increments
+        return update
+
+    # ==================== THREATS ====================
+
+    def add_threats(self, threats):
+        if threats:
+            _insert_new(self.threats, [_with_created_at(threat) for threat in threats])
+
+    def add_live_threats(self, threats):
+        """app.py's live window: a capped collection that evicts the oldest itself (MongoDB only)"""
+        if threats:
+            self.live.insert_many([dict(threat) for threat in threats], ordered=False)
+
+    def get_threat(self, threat_id):
+        return self.threats.find_one({'threatId': threat_id}, PROJECTION)
+
+    def threat_page(self, query):
+        # One extra row tells us whether another page exists
+        threats = list(self.threats.find(build_history_query(query), {'createdAt': 0}).sort(
+            [('timestamp', DESCENDING), ('_id', DESCENDING)]
+        ).limit(query['limit'] + 1))
+
+        next_cursor = None
+        if len(threats) > query['limit']:
+            threats = threats[:query['limit']]
+            next_cursor = encode_cursor(threats[-1]['timestamp'], str(threats[-1]['_id']))
+        for threat in threats:
+            del threat['_id']
+        return threats, next_cursor
+
+    def iter_threats(self, after=None):
+        return self.threats.find(_after(after, 'threatId'), PROJECTION).sort(
+            [('timestamp', ASCENDING), ('_id', ASCENDING)]
+        ).batch_size(config.EXPORT_BATCH_ROWS)
+
+    def count_threats(self):
+        return self.threats.estimated_document_count()
+
+    def expire_threats(self, cutoff, archive_rows):
+        return self._expire(self.threats, cutoff, archive_rows)
+
+    # ==================== LEDGER ====================
+
+    def append_block(self, block):
+        self.blocks.insert_one(dict(block))
+
+    def get_block(self, block_number):
+        return self.blocks.find_one({'blockNumber': block_number}, {'_id': 0})
+
+    def last_block(self):
+        return self.blocks.find_one({}, {'_id': 0}, sort=[('blockNumber', DESCENDING)])
+
+    def first_block_number(self):
+        block = self.blocks.find_one({}, {'_id': 0, 'blockNumber': 1}, sort=[('blockNumber', ASCENDING)])
+        return block['blockNumber'] if block else None
+
+    def count_blocks(self):
+        return self.blocks.estimated_document_count()
+
+    def latest_blocks(self, count):
+        return list(self.blocks.find({}, {'_id': 0}).sort('blockNumber', DESCENDING).limit(count))
+
+    def iter_blocks(self, after=0):
+        return self.blocks.find({'blockNumber': {'$gt': after}}, {'_id': 0}).sort(
+            'blockNumber', ASCENDING
+        ).batch_size(config.EXPORT_BATCH_ROWS)
+
+    def block_number_of(self, threat_id):
+        block = self.blocks.find_one({'threatIds': threat_id}, {'_id': 0, 'blockNumber': 1})
+        return block['blockNumber'] if block else None
+
+    def expire_blocks(self, through, cutoff, archive_rows):
+        # The first block that has to stay bounds the removable prefix
+        keep = self.blocks.find_one(
+            {'$or': [{'blockNumber': {'$gt': through}}, {'timestamp': {'$gte': cutoff}}]},
+            {'_id': 0, 'blockNumber': 1},
+            sort=[('blockNumber', ASCENDING)]
+        )
+        query = {'blockNumber': {'$lt': keep['blockNumber']}} if keep else {}
+        blocks = list(self.blocks.find(query, {'_id': 0}).sort('blockNumber', ASCENDING))
+        if blocks:
+            archive_rows(blocks)
+            self.blocks.delete_many({'blockNumber': {'$lte': blocks[-1]['blockNumber']}})
+        return blocks
+
+    # ==================== RESPONSE LOGS ====================
+
+    def add_responses(self, response_logs):
+        if response_logs:
+            _insert_new(self.responses, [_with_created_at(log) for log in response_logs])
+
+    def latest_responses(self, count):
+        return list(self.responses.find({}, PROJECTION).sort('timestamp', DESCENDING).limit(count))
+
+    def iter_responses(self, after=None):
+        return self.responses.find(_after(after, 'logId'), PROJECTION).sort(
+            [('timestamp', ASCENDING), ('_id', ASCENDING)]
+        ).batch_size(config.EXPORT_BATCH_ROWS)
+
+    def count_responses(self):
+        return self.responses.estimated_document_count()
+
+    def expire_responses(self, cutoff, archive_rows):
+        return self._expire(self.responses, cutoff, archive_rows)
+
+    # ==================== NODES & AI STATUS ====================
+
+    def list_nodes(self):
+        return list(self.nodes.find({}, {'_id': 0}))
+
+    def update_node(self, node_id, fields=None, increments=None):
+        self.nodes.update_one({'nodeId': node_id}, self._update(fields, increments))
+
+    def get_ai_status(self):
+        return self.ai_status.find_one({}, {'_id': 0})
+
+    def update_ai_status(self, fields=None, increments=None):
+        self.ai_status.update_one({}, self._update(fields, increments))
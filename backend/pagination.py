@@ -0,0 +1,114 @@
+"""
+Keyset (cursor) pagination for threat history: opaque cursors on
+(timestamp, id), query-string parsing and filtering shared by both servers
+"""
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+FILTER_FIELDS = ('severity', 'type', 'nodeId', 'ip')
+
+
+def encode_cursor(timestamp, tiebreak):
+    """Opaque cursor pointing just past the row with this (timestamp, id)"""
+    raw = json.dumps([timestamp, tiebreak], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, tiebreak = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    # Compared against stored (timestamp, id) strings: anything else would fail deep in a query
+    if not isinstance(timestamp, str) or not isinstance(tiebreak, str):
+        raise ValueError('Invalid cursor')
+    try:
+        datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    return timestamp, tiebreak
+
+
+def _parse_time(value, name):
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid {name}: expected an ISO 8601 timestamp")
+
+
+def parse_history_query(args):
+    """
+    Read limit, cursor, field filters and since/until from request args.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Invalid limit: expected an integer')
+    if limit < 1:
+        raise ValueError('Invalid limit: must be at least 1')
+
+    cursor = args.get('cursor')
+    since = args.get('since')
+    until = args.get('until')
+
+    return {
+        'limit': min(limit, MAX_PAGE_SIZE),
+        'cursor': decode_cursor(cursor) if cursor else None,
+        'filters': {field: args[field] for field in FILTER_FIELDS if args.get(field)},
+        'since': _parse_time(since, 'since') if since else None,
+        'until': _parse_time(until, 'until') if until else None
+    }
+
+
+def bisect_key(items, position_key, key):
+    """First index in items (ascending by key) whose key is not less than position_key"""
+    low, high = 0, len(items)
+    while low < high:
+        middle = (low + high) // 2
+        if key(items[middle]) < position_key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def keyset_page(items, query, id_field):
+    """
+    Newest-first page over a list kept sorted ascending by (timestamp, id).
+    Walks backwards from the cursor and stops once the page is full, so the
+    cost depends on the page size and filter selectivity, not on len(items).
+    Returns (rows, next_cursor).
+    """
+    key = lambda row: (row['timestamp'], row[id_field])
+    filters = query['filters']
+    limit = query['limit']
+
+    end = len(items)
+    if query['cursor']:
+        end = bisect_key(items, tuple(query['cursor']), key)
+    if query['until']:
+        end = min(end, bisect_key(items, (query['until'], ''), key))
+
+    rows = []
+    index = end - 1
+    while index >= 0 and len(rows) <= limit:
+        row = items[index]
+        if query['since'] and row['timestamp'] < query['since']:
+            break
+        if all(row.get(field) == value for field, value in filters.items()):
+            rows.append(row)
+        index -= 1
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['timestamp'], last[id_field])
+    return rows, next_cursor
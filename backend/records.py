@@ -0,0 +1,208 @@
+"""
+Compact record types for the in-memory stores (app_enhanced.py).
+
+A threat kept as a dict costs a full hash table per event, and every fresh
+copy of a categorical string ("DDoS Attack", "Node-A", ...) costs its own
+object. Records keep fixed fields in __slots__ and store categorical fields as
+small integer codes against the enums in config.py; values outside an enum
+(user-submitted types, ad-hoc statuses) are added to that field's table on
+first sight. Tables fed by clients are bounded (CATEGORY_TABLE_LIMIT): once
+one is full, new values are stored as they are. Free-form fields (location,
+description) and numbers (port) are never encoded. Records read like read-only mappings, so pagination, analytics,
+hashing and the PDF report work on them unchanged; to_dict() is only called
+at the API edge.
+"""
+import threading
+from array import array
+from collections.abc import Mapping
+import config
+
+_MISSING = object()
+
+
+class CategoryTable:
+    """Two-way mapping between a categorical field's values and integer codes"""
+
+    def __init__(self, values=(), limit=None):
+        self.lock = threading.Lock()
+        self.values = []
+        self.codes = {}
+        self.limit = limit  # Values past this many are not encoded (tables clients can grow)
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value):
+        """The value's code, or the (string) value itself once a bounded table is full"""
+        code = self.codes.get(value)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(value)
+                if code is None:
+                    if self.limit is not None and len(self.values) >= self.limit:
+                        return value
+                    # Append first: a reader that finds the code can always decode it
+                    code = len(self.values)
+                    self.values.append(value)
+                    self.codes[value] = code
+        return code
+
+    def decode(self, code):
+        return self.values[code] if type(code) is int else code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class CompactRecord(Mapping):
+    """
+    Base for fixed-field records. FIELDS lists the field names in API order;
+    CATEGORIES maps categorical fields to their CategoryTable. Absent optional
+    fields are left out of the mapping, exactly as in the source dict.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+    CATEGORIES = {}
+    FIELD_SET = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELD_SET = frozenset(cls.FIELDS)
+
+    @classmethod
+    def from_dict(cls, data):
+        unknown = set(data) - cls.FIELD_SET
+        if unknown:
+            raise ValueError(f"Unknown {cls.__name__} fields: {', '.join(sorted(unknown))}")
+
+        record = cls.__new__(cls)
+        for field in cls.FIELDS:
+            value = data.get(field, _MISSING)
+            table = cls.CATEGORIES.get(field)
+            if table is not None and value is not _MISSING:
+                value = table.encode(value)
+            object.__setattr__(record, field, value)
+        return record
+
+    def __getitem__(self, field):
+        if field not in self.FIELD_SET:
+            raise KeyError(field)
+        value = object.__getattribute__(self, field)
+        if value is _MISSING:
+            raise KeyError(field)
+        table = self.CATEGORIES.get(field)
+        return table.decode(value) if table is not None else value
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if object.__getattribute__(self, field) is not _MISSING:
+                yield field
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def to_dict(self):
+        """Plain dict for JSON responses, events and exports"""
+        return {field: self[field] for field in self}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    @classmethod
+    def to_columns(cls, records):
+        """
+        Column-wise, marshal-able form of records (snapshots): categorical
+        fields as packed codes plus their table, the rest as value lists.
+        Rows missing a field are listed per column.
+        """
+        columns = {}
+        for field in cls.FIELDS:
+            get = cls.__dict__[field].__get__
+            values = [get(record) for record in records]
+            missing = [index for index, value in enumerate(values) if value is _MISSING]
+            for index in missing:
+                values[index] = None
+            table = cls.CATEGORIES.get(field)
+            if table is not None:
+                for index in missing:
+                    values[index] = 0
+                # Values a full table left unencoded
+                raw = {index: value for index, value in enumerate(values) if type(value) is not int}
+                for index in raw:
+                    values[index] = 0
+                # The table may grow meanwhile; every code in use is already in it
+                columns[field] = {'table': list(table.values), 'codes': array('I', values).tobytes(),
+                                  'raw': raw, 'missing': missing}
+            else:
+                columns[field] = {'values': values, 'missing': missing}
+        return {'count': len(records), 'columns': columns}
+
+    @classmethod
+    def from_columns(cls, state):
+        """Records back from to_columns, with codes translated to this process's tables"""
+        records = [cls.__new__(cls) for _ in range(state['count'])]
+        for field in cls.FIELDS:
+            column = state['columns'][field]
+            set_value = cls.__dict__[field].__set__
+            table = cls.CATEGORIES.get(field)
+            if 'table' in column:
+                # A field that is no longer encoded (snapshots from older versions) decodes to plain values
+                translate = [table.encode(value) for value in column['table']] if table is not None else column['table']
+                codes = array('I')
+                codes.frombytes(column['codes'])
+                values = [translate[code] for code in codes]
+                for index, value in column.get('raw', {}).items():
+                    values[index] = table.encode(value) if table is not None else value
+            else:
+                values = column['values']
+            for record, value in zip(records, values):
+                set_value(record, value)
+            for index in column['missing']:
+                set_value(records[index], _MISSING)
+        return records
+
+
+THREAT_CATEGORIES = {
+    'type': CategoryTable(config.THREAT_TYPES, limit=config.CATEGORY_TABLE_LIMIT),
+    'severity': CategoryTable(config.THREAT_SEVERITIES),
+    'source': CategoryTable(config.THREAT_SOURCES, limit=config.CATEGORY_TABLE_LIMIT),
+    'status': CategoryTable(config.THREAT_STATUSES),
+    'nodeId': CategoryTable(node['nodeId'] for node in config.NODES),
+    'protocol': CategoryTable(config.THREAT_PROTOCOLS, limit=config.CATEGORY_TABLE_LIMIT),
+    'attackVector': CategoryTable(config.ATTACK_VECTORS, limit=config.CATEGORY_TABLE_LIMIT)
+}
+
+
+class ThreatRecord(CompactRecord):
+    """One threat, as produced by generate_realistic_threat or submit-threat"""
+
+    FIELDS = (
+        'threatId', 'type', 'severity', 'source', 'ip', 'timestamp', 'status',
+        'description', 'nodeId', 'location', 'protocol', 'port', 'attackVector',
+        'confidence', 'userSubmitted'
+    )
+    __slots__ = FIELDS
+    CATEGORIES = THREAT_CATEGORIES
+
+
+class ResponseRecord(CompactRecord):
+    """One automated response log"""
+
+    FIELDS = (
+        'logId', 'action', 'targetIp', 'threatType', 'threatId', 'timestamp',
+        'status', 'nodeId', 'severity', 'responseTime', 'automated'
+    )
+    __slots__ = FIELDS
+    CATEGORIES = {
+        'action': CategoryTable(dict.fromkeys(
+            action for actions in config.RESPONSE_ACTIONS.values() for action in actions
+        )),
+        'threatType': THREAT_CATEGORIES['type'],
+        'status': CategoryTable(config.RESPONSE_STATUSES),
+        'nodeId': THREAT_CATEGORIES['nodeId'],
+        'severity': THREAT_CATEGORIES['severity'],
+        'responseTime': CategoryTable()  # "123ms": a few hundred distinct values
+    }
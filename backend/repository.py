@@ -0,0 +1,434 @@
+"""
+Storage repository: one interface over threats, the blockchain ledger,
+response logs, nodes and the AI status, with interchangeable backends chosen
+by config.STORAGE_BACKEND:
+
+- memory: segmented in-process stores (stores.py), gone when the process exits
+- sqlite: one embedded SQLite file (sqlite_repository.py)
+- log: append-only segment logs with memory-mapped reads (log_repository.py)
+- mongo: the MongoDB collections app.py serves (mongo_repository.py)
+
+Rows go in and come out as plain dicts in API shape. Threats and response
+logs are ordered by (timestamp, id) and blocks by blockNumber. Every backend
+answers the same history query (pagination.parse_history_query); a cursor
+only means something to the backend that issued it.
+
+The caller serializes writers (write_lock in app_enhanced); reads are safe
+while a write is in progress. Expiry hands the rows to an archive callback
+before removing anything, so a failed archive write loses no rows. batch()
+groups a caller's writes into one transaction where the backend has them.
+"""
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pagination import bisect_key, keyset_page
+from records import ThreatRecord, ResponseRecord
+from stores import SegmentedStore
+import config
+
+BACKENDS = ('memory', 'sqlite', 'log', 'mongo')
+
+
+def by_time(id_field):
+    """Sort key: timestamp, with the record id breaking ties"""
+    return lambda item: (item['timestamp'], item[id_field])
+
+
+def default_nodes():
+    """Initial status of every configured node"""
+    return [
+        {
+            'nodeId': node['nodeId'],
+            'location': node['location'],
+            'status': node['status'],
+            'lastSyncTime': datetime.now().isoformat(),
+            'threatsDetected': 0,
+            'uptime': '99.9%',
+            'latency': '25ms'
+        }
+        for node in config.NODES
+    ]
+
+
+def default_ai_status():
+    """Initial AI model status"""
+    return {
+        'modelType': config.AI_MODEL['modelType'],
+        'accuracy': config.AI_MODEL['accuracy'],
+        'trainingStatus': config.AI_MODEL['trainingStatus'],
+        'lastRetrainTime': (datetime.now() - timedelta(days=config.AI_MODEL['lastRetrainDaysAgo'])).isoformat(),
+        'modelVersion': config.AI_MODEL['modelVersion'],
+        'activeModels': config.AI_MODEL['activeModels'],
+        'threatsAnalyzed': 0,
+        'falsePositiveRate': 1.5,
+        'nextRetrainScheduled': (datetime.now() + timedelta(hours=12)).isoformat(),
+        'updatedAt': datetime.now().isoformat()
+    }
+
+
+def apply_update(document, fields=None, increments=None):
+    """Set fields and add increments on a document in place, like $set / $inc"""
+    document.update(fields or {})
+    for field, amount in (increments or {}).items():
+        document[field] = document.get(field, 0) + amount
+    return document
+
+
+class Repository(ABC):
+    """Storage interface shared by every backend; one missing a method fails when constructed, not when called"""
+
+    name = None
+    persistent = False  # True if rows survive a restart
+
+    @contextmanager
+    def batch(self):
+        """Group the writes made inside into one transaction (one commit / fsync) where supported"""
+        yield
+
+    # ==================== THREATS ====================
+
+    @abstractmethod
+    def add_threats(self, threats):
+        """Store a batch of threats"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_threat(self, threat_id):
+        """One threat by threatId, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def threat_page(self, query):
+        """Newest-first page for a parse_history_query query; returns (threats, next_cursor)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_threats(self, after=None):
+        """Every threat, oldest first; with after=(timestamp, threatId), only those sorting after it"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_threats(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire_threats(self, cutoff, archive_rows):
+        """
+        Remove and return the threats older than cutoff (ISO timestamp), oldest
+        first. archive_rows(rows) is called before anything is removed; if it
+        raises, nothing is.
+        """
+        raise NotImplementedError
+
+    # ==================== LEDGER ====================
+
+    @abstractmethod
+    def append_block(self, block):
+        """Store a sealed block; blocks arrive in blockNumber order with no gaps"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_block(self, block_number):
+        raise NotImplementedError
+
+    @abstractmethod
+    def last_block(self):
+        """The chain tip, or None when the ledger is empty"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def first_block_number(self):
+        """Number of the oldest stored block, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_blocks(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest_blocks(self, count):
+        """Up to count blocks, newest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_blocks(self, after=0):
+        """Blocks numbered above after, in chain order"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def block_number_of(self, threat_id):
+        """Number of the stored block holding a threat, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire_blocks(self, through, cutoff, archive_rows):
+        """
+        Remove and return the oldest blocks, stopping at the first one numbered
+        above through or not older than cutoff, so the chain stays contiguous
+        (archive_rows as for expire_threats)
+        """
+        raise NotImplementedError
+
+    # ==================== RESPONSE LOGS ====================
+
+    @abstractmethod
+    def add_responses(self, response_logs):
+        """Store a batch of response logs"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest_responses(self, count):
+        """Up to count response logs, newest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_responses(self, after=None):
+        """Every response log, oldest first; with after=(timestamp, logId), only those sorting after it"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_responses(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire_responses(self, cutoff, archive_rows):
+        """Remove and return the response logs older than cutoff, oldest first (archive_rows as above)"""
+        raise NotImplementedError
+
+    # ==================== NODES & AI STATUS ====================
+
+    @abstractmethod
+    def list_nodes(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_node(self, node_id, fields=None, increments=None):
+        """Set fields and add increments on one node's status"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_ai_status(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_ai_status(self, fields=None, increments=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryRepository(Repository):
+    """In-process backend: sorted segmented stores of compact records, lock-free reads"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.threats = SegmentedStore(key=by_time('threatId'))
+        self.blocks = SegmentedStore()  # blockNumber order
+        self.responses = SegmentedStore(key=by_time('logId'))
+        self.threats_by_id = {}  # threatId -> ThreatRecord
+        self.threat_blocks = {}  # threatId -> number of the block holding it
+        self.status_lock = threading.Lock()
+        self.nodes = {node['nodeId']: node for node in default_nodes()}
+        self.ai_status = default_ai_status()
+
+    # ==================== THREATS ====================
+
+    def add_threats(self, threats):
+        for threat in threats:
+            record = ThreatRecord.from_dict(threat)
+            self.threats.append(record)
+            self.threats_by_id[record['threatId']] = record
+
+    def get_threat(self, threat_id):
+        record = self.threats_by_id.get(threat_id)
+        return record.to_dict() if record is not None else None
+
+    def threat_page(self, query):
+        threats, next_cursor = keyset_page(self.threats.snapshot(), query, 'threatId')
+        return [threat.to_dict() for threat in threats], next_cursor
+
+    def iter_threats(self, after=None):
+        return self._iter(self.threats, after)
+
+    def count_threats(self):
+        return len(self.threats)
+
+    def expire_threats(self, cutoff, archive_rows):
+        rows = self._expire(self.threats, cutoff, archive_rows)
+        for row in rows:
+            self.threats_by_id.pop(row['threatId'], None)
+        return rows
+
+    @staticmethod
+    def _iter(store, after):
+        snapshot = store.snapshot()
+        start = 0
+        if after is not None:
+            after = tuple(after)
+            start = bisect_key(snapshot, after, store.key)
+            if start < len(snapshot) and store.key(snapshot[start]) == after:
+                start += 1
+        return (snapshot[index].to_dict() for index in range(start, len(snapshot)))
+
+    def _expire(self, store, cutoff, archive_rows):
+        snapshot = store.snapshot()
+        count = bisect_key(snapshot, (cutoff, ''), store.key)
+        rows = [row.to_dict() for row in snapshot.range(0, count)]
+        if rows:
+            archive_rows(rows)
+        store.drop_before(count)
+        return rows
+
+    # ==================== LEDGER ====================
+
+    def append_block(self, block):
+        self.blocks.append(block)
+        for threat_id in block['threatIds']:
+            self.threat_blocks[threat_id] = block['blockNumber']
+
+    def get_block(self, block_number):
+        # Block numbers are contiguous, so a number is also an offset from the first block
+        ledger = self.blocks.snapshot()
+        if not len(ledger):
+            return None
+        index = block_number - ledger[0]['blockNumber']
+        return ledger[index] if 0 <= index < len(ledger) else None
+
+    def last_block(self):
+        return self.blocks.last()
+
+    def first_block_number(self):
+        ledger = self.blocks.snapshot()
+        return ledger[0]['blockNumber'] if len(ledger) else None
+
+    def count_blocks(self):
+        return len(self.blocks)
+
+    def latest_blocks(self, count):
+        return self.blocks.snapshot().newest(count)
+
+    def iter_blocks(self, after=0):
+        ledger = self.blocks.snapshot()
+        if not len(ledger):
+            return iter(())
+        start = max(after - ledger[0]['blockNumber'] + 1, 0)
+        return (ledger[index] for index in range(start, len(ledger)))
+
+    def block_number_of(self, threat_id):
+        return self.threat_blocks.get(threat_id)
+
+    def expire_blocks(self, through, cutoff, archive_rows):
+        ledger = self.blocks.snapshot()
+        count = 0
+        while (count < len(ledger)
+               and ledger[count]['blockNumber'] <= through
+               and ledger[count]['timestamp'] < cutoff):
+            count += 1
+        blocks = ledger.range(0, count)
+        if blocks:
+            archive_rows(blocks)
+        self.blocks.drop_before(count)
+        for block in blocks:
+            for threat_id in block['threatIds']:
+                self.threat_blocks.pop(threat_id, None)
+        return blocks
+
+    # ==================== RESPONSE LOGS ====================
+
+    def add_responses(self, response_logs):
+        for response_log in response_logs:
+            self.responses.append(ResponseRecord.from_dict(response_log))
+
+    def latest_responses(self, count):
+        return [log.to_dict() for log in self.responses.snapshot().newest(count)]
+
+    def iter_responses(self, after=None):
+        return self._iter(self.responses, after)
+
+    def count_responses(self):
+        return len(self.responses)
+
+    def expire_responses(self, cutoff, archive_rows):
+        return self._expire(self.responses, cutoff, archive_rows)
+
+    # ==================== NODES & AI STATUS ====================
+
+    def list_nodes(self):
+        with self.status_lock:
+            return [dict(node) for node in self.nodes.values()]
+
+    def update_node(self, node_id, fields=None, increments=None):
+        with self.status_lock:
+            node = self.nodes.get(node_id)
+            if node is not None:
+                apply_update(node, fields, increments)
+
+    def get_ai_status(self):
+        with self.status_lock:
+            return dict(self.ai_status)
+
+    def update_ai_status(self, fields=None, increments=None):
+        with self.status_lock:
+            apply_update(self.ai_status, fields, increments)
+
+    # ==================== SNAPSHOTS (snapshot.py) ====================
+
+    def snapshot_views(self):
+        """Point-in-time views of every store plus the status documents (call under the writer's lock)"""
+        return {
+            'threats': self.threats.snapshot(),
+            'responses': self.responses.snapshot(),
+            'blocks': self.blocks.snapshot(),
+            'nodes': self.list_nodes(),
+            'aiStatus': self.get_ai_status()
+        }
+
+    def restore(self, threats, responses, blocks, nodes, ai_status):
+        """Load snapshot rows (records and block dicts, oldest first) into this empty repository"""
+        with self.status_lock:
+            self.nodes = {node['nodeId']: node for node in nodes}
+            self.ai_status = ai_status
+        self.restore_older(threats, responses, blocks)
+
+    def restore_older(self, threats, responses, blocks):
+        """
+        Put snapshot rows older than everything stored in front of it. Each
+        list must be empty or a whole number of segments unless the store is
+        still empty.
+        """
+        for store, rows in ((self.threats, threats), (self.responses, responses), (self.blocks, blocks)):
+            if not len(store):
+                store.load(rows)
+            elif rows:
+                store.prepend(rows)
+        by_id = ((record['threatId'], record) for record in threats)
+        numbers = ((threat_id, block['blockNumber']) for block in blocks for threat_id in block['threatIds'])
+        for index, entries in ((self.threats_by_id, by_id), (self.threat_blocks, numbers)):
+            if index:
+                # Older rows never replace what newer ones already mapped
+                for key, value in entries:
+                    index.setdefault(key, value)
+            else:
+                index.update(entries)
+
+
+def open_repository(backend=None):
+    """Repository for the given backend name (default config.STORAGE_BACKEND)"""
+    backend = backend or config.STORAGE_BACKEND
+    if backend == 'memory':
+        return MemoryRepository()
+    if backend == 'sqlite':
+        from sqlite_repository import SqliteRepository
+        return SqliteRepository(config.SQLITE_PATH)
+    if backend == 'log':
+        from log_repository import LogRepository
+        return LogRepository(config.LOG_DIR)
+    if backend == 'mongo':
+        # Imported only here: the memory and SQLite backends do not need pymongo
+        from database import get_db, init_db
+        from mongo_repository import MongoRepository
+        return MongoRepository(get_db() if get_db() is not None else init_db())
+    raise ValueError(f"Unknown storage backend: expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,135 @@
+"""
+Response cache for read endpoints: serialized JSON bodies are kept per
+endpoint + query string and served again until one of the data sources they
+were built from changes. Writers bump a version counter per source (threat
+ingest, block append, node update, ...); entries carry a content ETag so an
+unchanged dashboard poll is answered with 304 Not Modified. Compressed
+variants of an entry are produced once per encoding and kept with it.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, make_response, request
+from flask.json.provider import DefaultJSONProvider
+from compression import compress, mark_encoded, negotiate
+import config
+
+try:
+    import orjson
+except ImportError:  # Optional: jsonify falls back to the standard library encoder
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson (sorted keys, like the default)"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def install_json_provider(app):
+    """Use orjson for jsonify when it is installed and enabled in config"""
+    if orjson is not None and config.RESPONSE_CACHE_USE_ORJSON:
+        app.json = OrjsonProvider(app)
+
+
+class ResponseCache:
+    """Version-invalidated, TTL-bounded LRU of encoded JSON responses"""
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = config.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or config.RESPONSE_CACHE_MAX_ENTRIES
+        self.lock = threading.Lock()
+        self.versions = {}  # source -> write counter
+        self.entries = OrderedDict()  # (path, query) -> (versions, expires, etag, body, {encoding: body})
+        self.metrics = {'hits': 0, 'misses': 0, 'notModified': 0}
+
+    def bump(self, *sources):
+        """Record a write to the given sources; entries built from them go stale"""
+        with self.lock:
+            for source in sources:
+                self.versions[source] = self.versions.get(source, 0) + 1
+
+    def cached(self, *sources):
+        """
+        Decorator for a GET view whose JSON depends only on the given sources
+        (and the query string). Non-200 responses are never cached.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                return self._serve(view, args, kwargs, sources)
+            return wrapper
+        return decorator
+
+    def _serve(self, view, args, kwargs, sources):
+        key = (request.path, request.query_string)
+        now = time.monotonic()
+
+        with self.lock:
+            # Versions are read before the view runs: a write landing meanwhile
+            # leaves this entry one version behind, so it is rebuilt next time
+            versions = tuple(self.versions.get(source, 0) for source in sources)
+            entry = self.entries.get(key)
+            if entry and entry[0] == versions and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.metrics['hits'] += 1
+                hit = True
+            else:
+                self.metrics['misses'] += 1
+                hit = False
+
+        if not hit:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or not response.is_json:
+                return response
+            body = response.get_data()
+            entry = (versions, now + self.ttl, hashlib.blake2b(body, digest_size=16).hexdigest(), body, {})
+            with self.lock:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+        body = entry[3]
+        encoding = negotiate() if len(body) >= config.COMPRESSION_MIN_SIZE else None
+        if encoding:
+            variants = entry[4]
+            if encoding not in variants:
+                variants[encoding] = compress(body, encoding)  # A racing duplicate is harmless
+            body = variants[encoding]
+
+        response = Response(body, mimetype='application/json')
+        response.set_etag(entry[2])
+        if encoding:
+            mark_encoded(response, encoding)
+        else:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'no-cache'  # Browsers revalidate with If-None-Match
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            with self.lock:
+                self.metrics['notModified'] += 1
+        return response
+
+    def get_metrics(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['entries'] = len(self.entries)
+            metrics['capacity'] = self.max_entries
+        return metrics
+
+
+# Global instance
+response_cache = ResponseCache()
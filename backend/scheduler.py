@@ -0,0 +1,265 @@
+"""
+Periodic job scheduler: one timer thread keeps every job in a heap ordered by
+its next run time and hands due runs to a fixed pool of worker threads, so
+adding a job adds no thread.
+
+Schedules are fixed-rate: tick n of a job is due at first + n * interval
+however long earlier runs took, so the period never drifts by the work time.
+A job's jitter delays each run by a random amount up to that many seconds,
+drawn per run and never carried into the grid; it spreads out identical
+schedules in different processes. A tick is missed when the job's previous
+run is still going or the timer fell behind (busy workers, a suspended
+process); the job's missed policy decides what happens then:
+
+    skip      drop the missed ticks and resume on the grid (default)
+    catch-up  run once more per missed tick, back to back
+
+A job never runs concurrently with itself. cancel() and stop() wake the timer
+at once, so neither waits out an interval. Each job keeps a histogram of its
+run times, its start lag and counts of runs, errors and missed ticks
+(metrics()).
+"""
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+import config
+
+SKIP = 'skip'
+CATCH_UP = 'catch-up'
+MISSED_POLICIES = (SKIP, CATCH_UP)
+
+# Upper bounds (ms) of the run time histogram buckets; one more bucket takes the rest
+RUNTIME_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Job:
+    """One periodic job: its schedule, run state and metrics"""
+
+    def __init__(self, name, func, interval, jitter=0.0, missed=SKIP, when=None):
+        if interval <= 0:
+            raise ValueError(f"{name}: interval must be positive")
+        if not 0 <= jitter < interval:
+            raise ValueError(f"{name}: jitter must be at least 0 and below the interval")
+        if missed not in MISSED_POLICIES:
+            raise ValueError(f"{name}: missed policy must be one of {', '.join(MISSED_POLICIES)}")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.missed = missed
+        self.when = when  # Ticks where this returns False pass without a run (e.g. not the leader)
+        self.cancelled = threading.Event()
+
+        # Guarded by the scheduler's condition
+        self.due = None  # Grid time (monotonic) of the next tick
+        self.running = False
+        self.backlog = 0  # Catch-up runs owed
+
+        self.lock = threading.Lock()
+        self.histogram = [0] * (len(RUNTIME_BUCKETS_MS) + 1)
+        self.counts = {'runs': 0, 'errors': 0, 'idleTicks': 0, 'missedTicks': 0}
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_run_at = None
+        self.last_error = None
+
+    def record(self, elapsed_ms, lag_ms, error):
+        with self.lock:
+            self.histogram[bisect_left(RUNTIME_BUCKETS_MS, elapsed_ms)] += 1
+            self.counts['runs'] += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            if lag_ms is not None:
+                self.last_lag_ms = lag_ms
+                self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self.last_run_at = datetime.now().isoformat()
+            if error is not None:
+                self.counts['errors'] += 1
+                self.last_error = str(error)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] += n
+
+    def _percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of runs"""
+        target = fraction * self.counts['runs']
+        seen = 0
+        for bound, count in zip(RUNTIME_BUCKETS_MS, self.histogram):
+            seen += count
+            if seen >= target:
+                return min(bound, round(self.max_ms, 3))
+        return round(self.max_ms, 3)
+
+    def metrics(self):
+        """Schedule, counters and run time histogram, in API shape"""
+        with self.lock:
+            runs = self.counts['runs']
+            return dict(
+                self.counts,
+                name=self.name,
+                intervalSeconds=self.interval,
+                jitterSeconds=self.jitter,
+                missedPolicy=self.missed,
+                running=self.running,
+                backlog=self.backlog,
+                lastRunAt=self.last_run_at,
+                lastError=self.last_error,
+                avgMs=round(self.total_ms / runs, 3) if runs else 0.0,
+                maxMs=round(self.max_ms, 3),
+                p50Ms=self._percentile(0.5) if runs else 0.0,
+                p95Ms=self._percentile(0.95) if runs else 0.0,
+                p99Ms=self._percentile(0.99) if runs else 0.0,
+                lastLagMs=round(self.last_lag_ms, 3),
+                maxLagMs=round(self.max_lag_ms, 3),
+                histogram=[
+                    {'leMs': bound, 'count': count}
+                    for bound, count in zip(RUNTIME_BUCKETS_MS + (None,), self.histogram)
+                ]
+            )
+
+
+class Scheduler:
+    """Fixed-rate periodic jobs on one timer thread and a fixed worker pool"""
+
+    def __init__(self, workers=None, name='scheduler'):
+        self.workers = workers or config.SCHEDULER_WORKERS
+        self.name = name
+        self.condition = threading.Condition()
+        self.heap = []  # (run at, sequence, job); cancelled jobs are dropped when they surface
+        self.sequence = itertools.count()
+        self.jobs = {}  # name -> Job
+        self.ready = queue.Queue()  # (job, lag ms) handed to the workers; None stops one
+        self.running = False
+        self.threads = []
+
+    def add(self, name, func, interval, jitter=0.0, missed=SKIP, when=None, delay=None):
+        """
+        Run func every interval seconds, first after delay (default: one
+        interval). Returns the Job; raises ValueError for a duplicate name or
+        an invalid schedule.
+        """
+        job = Job(name, func, interval, jitter, missed, when)
+        with self.condition:
+            if name in self.jobs:
+                raise ValueError(f"Job {name} is already scheduled")
+            self.jobs[name] = job
+            job.due = time.monotonic() + (interval if delay is None else delay)
+            self._push(job)
+            self.condition.notify()
+        return job
+
+    def cancel(self, name):
+        """Unschedule a job (a run in progress finishes); returns whether it was scheduled"""
+        with self.condition:
+            job = self.jobs.pop(name, None)
+            if job is None:
+                return False
+            job.cancelled.set()
+            job.backlog = 0
+            self.condition.notify()
+        return True
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.threads = [threading.Thread(target=self._timer_loop, name=f"{self.name}-timer", daemon=True)]
+        self.threads += [
+            threading.Thread(target=self._work_loop, name=f"{self.name}-worker-{n}", daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Stop scheduling and wait up to timeout seconds for runs in progress to finish"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for _ in range(self.workers):
+            self.ready.put(None)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        self.threads = []
+
+    def metrics(self):
+        """Per-job metrics, in schedule order"""
+        with self.condition:
+            jobs = list(self.jobs.values())
+        return {'workers': self.workers, 'jobs': [job.metrics() for job in jobs]}
+
+    # ==================== TIMER ====================
+
+    def _push(self, job):
+        run_at = job.due + (random.uniform(0, job.jitter) if job.jitter else 0.0)
+        heapq.heappush(self.heap, (run_at, next(self.sequence), job))
+
+    def _timer_loop(self):
+        with self.condition:
+            while self.running:
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    run_at, _, job = heapq.heappop(self.heap)
+                    if not job.cancelled.is_set():
+                        self._dispatch(job, run_at, now)
+                timeout = self.heap[0][0] - now if self.heap else None
+                self.condition.wait(timeout)
+
+    def _dispatch(self, job, run_at, now):
+        """Serve the tick due at job.due and schedule the next one (condition held)"""
+        # Later ticks that have already passed as well
+        behind = int((now - job.due) // job.interval)
+        if job.running:
+            # The previous run is still going: this tick is missed too
+            missed = behind + 1
+        else:
+            missed = behind
+            job.running = True
+            self.ready.put((job, (now - run_at) * 1000))
+        if missed:
+            job.count('missedTicks', missed)
+            if job.missed == CATCH_UP:
+                job.backlog += missed
+        job.due += (behind + 1) * job.interval
+        self._push(job)
+
+    # ==================== WORKERS ====================
+
+    def _work_loop(self):
+        while True:
+            item = self.ready.get()
+            if item is None:
+                return
+            job, lag_ms = item
+            while True:
+                self._run(job, lag_ms)
+                with self.condition:
+                    if job.backlog and self.running and not job.cancelled.is_set():
+                        job.backlog -= 1
+                        lag_ms = None  # A catch-up run has no tick of its own to lag behind
+                        continue
+                    job.running = False
+                    break
+
+    def _run(self, job, lag_ms):
+        if job.when is not None and not job.when():
+            job.count('idleTicks')
+            return
+        started = time.perf_counter()
+        error = None
+        try:
+            job.func()
+        except Exception as e:
+            error = e
+            print(f"❌ Error in {job.name}: {e}")
+        job.record((time.perf_counter() - started) * 1000, lag_ms, error)
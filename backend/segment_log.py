@@ -0,0 +1,361 @@
+"""
+Embedded append-only log: records are appended to fixed-size segment files
+and read back through mmap. It is the storage engine of the 'log' repository
+backend (log_repository.py).
+
+Record layout (little-endian):
+
+    u32 payload length | u32 crc32(key + payload) | u16 key length | key | payload
+
+Segment files are preallocated to LOG_SEGMENT_BYTES and zero-filled, so an
+all-zero header marks the end of the written data. Appends are pwrite()s at
+the write offset. fsync is left to the caller (sync()), which batches every
+append made since the previous sync into one group commit. A segment that
+fills up is truncated to its real size, synced and sealed, and the next one
+is preallocated.
+
+Keys must be appended in order: append() rejects a batch holding a key below
+the last one written, since seeks, scan(until) and truncate_before() all rely
+on it. Each segment keeps a sparse index in memory: the key and offset of
+every LOG_INDEX_INTERVAL-th record. A seek bisects it and then scans at most
+one chunk of records.
+
+Opening a log is its crash recovery: every segment is scanned and its
+checksums are checked. A torn or corrupt tail of the active segment is cut at
+the last valid record and the rest of the file zeroed, so stale bytes can
+never pass for records later; in a sealed segment, reads stop at the damage. truncate_before() retires a key prefix: whole segments are
+deleted, and a persisted start key hides the retired records in the first
+remaining one.
+
+One process at a time: opening takes an exclusive flock on the directory's
+LOCK file (recovery would otherwise cut a live writer's tail), and a second
+opener gets LogLockedError.
+
+Records are addressed by position: segment number << 32 | offset. The caller
+serializes appends; the log's own lock only keeps sync() from running in the
+middle of one. Readers take no lock: a segment's end offset only grows and is
+published after its bytes are written, and a retired segment's map stays
+valid for readers still holding it.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+from bisect import bisect_left
+import config
+
+HEADER = struct.Struct('<IIH')
+START_FILE = 'START'  # The first visible key, after truncate_before()
+LOCK_FILE = 'LOCK'  # flock()ed by the process that has the log open
+
+
+class LogLockedError(RuntimeError):
+    """The log directory is open in another process"""
+
+
+class Segment:
+    """One segment file: its map, written length and sparse index"""
+
+    def __init__(self, number, path, size):
+        self.number = number
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ) if size else None
+        self.size = size
+        self.end = 0  # Bytes of valid records; readers never look past it
+        self.count = 0
+        self.index_keys = []  # Running maximum key at the start of each chunk
+        self.index_offsets = []
+        self.last_key = None  # Highest key in the segment
+
+    def record_at(self, offset):
+        """(key, payload, next offset) of the record at offset"""
+        view = self.map
+        length, _, key_length = HEADER.unpack_from(view, offset)
+        start = offset + HEADER.size
+        key = bytes(view[start:start + key_length]).decode()
+        payload = bytes(view[start + key_length:start + key_length + length])
+        return key, payload, start + key_length + length
+
+    def chunk(self, index, end):
+        """Records of sparse index chunk index, up to end, oldest first"""
+        offset = self.index_offsets[index]
+        stop = self.index_offsets[index + 1] if index + 1 < len(self.index_offsets) else end
+        records = []
+        while offset < min(stop, end):
+            key, payload, offset = self.record_at(offset)
+            records.append((key, payload))
+        return records
+
+    def note(self, key, offset, interval):
+        """Account for a record written at offset (writer only)"""
+        if self.last_key is None or key > self.last_key:
+            self.last_key = key
+        if self.count % interval == 0:
+            self.index_keys.append(self.last_key)
+            self.index_offsets.append(offset)
+        self.count += 1
+
+    def seal(self):
+        """Cut the file to its written length and map just that"""
+        os.ftruncate(self.fd, self.end)
+        os.fsync(self.fd)
+        # Readers holding the old (longer) map only read below end, which is still backed
+        self.map = mmap.mmap(self.fd, self.end, access=mmap.ACCESS_READ) if self.end else None
+        self.size = self.end
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SegmentLog:
+    """Append-only, key-ordered record log in a directory of segment files"""
+
+    def __init__(self, directory, segment_bytes=None, index_interval=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes or config.LOG_SEGMENT_BYTES
+        self.index_interval = index_interval or config.LOG_INDEX_INTERVAL
+        os.makedirs(directory, exist_ok=True)
+        self.lock_fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self.lock_fd)
+            raise LogLockedError(f"{directory} is open in another process")
+
+        self.start_key = ''
+        start_path = os.path.join(directory, START_FILE)
+        if os.path.exists(start_path):
+            with open(start_path) as f:
+                self.start_key = f.read()
+
+        self.segments = []
+        self.count = 0  # Visible records (key >= start_key)
+        self.repairs = []  # (segment path, byte offset) of torn or corrupt data found when opening
+        self.unsynced = set()
+        self.lock = threading.Lock()
+        numbers = sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith('.log'))
+        for position, number in enumerate(numbers):
+            last = position == len(numbers) - 1
+            self.segments.append(self._recover(number, last))
+        if not self.segments:
+            self.segments.append(self._new_segment(0))
+        # Highest key written (retired records included): appends may not go below it
+        self.tail_key = max((segment.last_key for segment in self.segments if segment.last_key is not None),
+                            default=None)
+
+    def _path(self, number):
+        return os.path.join(self.directory, f"{number:010d}.log")
+
+    def _new_segment(self, number):
+        return Segment(number, self._path(number), self.segment_bytes)
+
+    def _recover(self, number, last):
+        """Open a segment, rebuilding its index and cutting it at the last valid record"""
+        path = self._path(number)
+        segment = Segment(number, path, max(os.path.getsize(path), self.segment_bytes if last else 0))
+        view = segment.map
+        offset = 0
+        while view is not None and offset + HEADER.size <= segment.size:
+            length, checksum, key_length = HEADER.unpack_from(view, offset)
+            start = offset + HEADER.size
+            stop = start + key_length + length
+            if not (length or checksum or key_length) or stop > segment.size:
+                break
+            if zlib.crc32(view[start:stop]) != checksum:
+                break
+            key = bytes(view[start:start + key_length]).decode()
+            segment.note(key, offset, self.index_interval)
+            if key >= self.start_key:
+                self.count += 1
+            offset = stop
+        segment.end = offset
+
+        if last:
+            if any(view[offset:offset + HEADER.size]):
+                self.repairs.append((path, offset))
+            # Zero everything past the last valid record (shrink, then grow back): cheaper than
+            # reading the preallocated tail to find out whether a lost write left records beyond a gap
+            os.ftruncate(segment.fd, offset)
+            os.ftruncate(segment.fd, segment.size)
+            os.fsync(segment.fd)
+        elif offset < segment.size:
+            # Left on disk for inspection; reads stop at the corrupt record
+            self.repairs.append((path, offset))
+        return segment
+
+    # ==================== WRITES ====================
+
+    def append(self, records):
+        """
+        Append (key, payload bytes) records and return their positions.
+        They are visible to readers once this returns, durable after sync().
+        """
+        with self.lock:
+            return self._append(records)
+
+    def _append(self, records):
+        tail = self.tail_key
+        for key, _ in records:
+            if tail is not None and key < tail:
+                raise ValueError(f"Key {key!r} sorts below the last appended key {tail!r}")
+            tail = key
+        positions = []
+        segment = self.segments[-1]
+        buffer = bytearray()
+        notes = []
+        offset = segment.end
+        for key, payload in records:
+            encoded = key.encode()
+            size = HEADER.size + len(encoded) + len(payload)
+            if size > self.segment_bytes:
+                raise ValueError(f"Record of {size} bytes does not fit in a {self.segment_bytes}-byte segment")
+            if offset + len(buffer) + size > segment.size:
+                # Segment full: write out what fits, then continue in a fresh one
+                self._write(segment, buffer, notes, positions)
+                segment = self._roll()
+                buffer = bytearray()
+                notes = []
+                offset = segment.end
+            notes.append((key, offset + len(buffer)))
+            buffer += HEADER.pack(len(payload), zlib.crc32(encoded + payload), len(encoded))
+            buffer += encoded
+            buffer += payload
+        self._write(segment, buffer, notes, positions)
+        self.tail_key = tail
+        return positions
+
+    def _write(self, segment, buffer, notes, positions):
+        if not buffer:
+            return
+        view = memoryview(buffer)
+        written = 0
+        while written < len(buffer):
+            written += os.pwrite(segment.fd, view[written:], segment.end + written)
+        for key, offset in notes:
+            segment.note(key, offset, self.index_interval)
+            positions.append(segment.number << 32 | offset)
+        segment.end += len(buffer)  # Published last: readers see whole records only
+        self.count += len(notes)
+        self.unsynced.add(segment)
+
+    def _roll(self):
+        sealed = self.segments[-1]
+        sealed.seal()
+        self.unsynced.discard(sealed)
+        segment = self._new_segment(sealed.number + 1)
+        self.segments = self.segments + [segment]  # Replaced whole for lock-free readers
+        return segment
+
+    def sync(self):
+        """fsync every segment written since the last sync (one group commit)"""
+        with self.lock:
+            for segment in self.unsynced:
+                os.fdatasync(segment.fd)
+            self.unsynced = set()
+
+    def truncate_before(self, key):
+        """Retire every record below key: whole segments are deleted, the rest hidden"""
+        with self.lock:
+            return self._truncate_before(key)
+
+    def _truncate_before(self, key):
+        if key <= self.start_key:
+            return 0
+        retired = sum(1 for _ in self.scan(until=key))
+
+        path = os.path.join(self.directory, START_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write(key)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self.start_key = key
+        self.count -= retired
+
+        # The active segment always stays, even when everything in it is retired
+        keep = next(
+            (position for position, segment in enumerate(self.segments[:-1])
+             if segment.last_key is not None and segment.last_key >= key),
+            len(self.segments) - 1
+        )
+        dropped, self.segments = self.segments[:keep], self.segments[keep:]
+        for segment in dropped:
+            os.unlink(segment.path)
+            segment.close()
+        return retired
+
+    def close(self):
+        self.sync()
+        for segment in self.segments:
+            segment.close()
+        os.close(self.lock_fd)  # Releases the flock
+
+    # ==================== READS ====================
+
+    def read(self, position):
+        """Payload of the record at a position append() returned, or None once it is retired"""
+        segments = self.segments
+        index = (position >> 32) - segments[0].number
+        if index < 0:
+            return None
+        return segments[index].record_at(position & 0xFFFFFFFF)[1]
+
+    def keys(self):
+        """(position, key) of every visible record in append order, without copying payloads"""
+        for segment in self.segments:
+            view = segment.map
+            offset = 0
+            end = segment.end
+            while offset < end:
+                length, _, key_length = HEADER.unpack_from(view, offset)
+                start = offset + HEADER.size
+                key = bytes(view[start:start + key_length]).decode()
+                if key >= self.start_key:
+                    yield segment.number << 32 | offset, key
+                offset = start + key_length + length
+
+    def scan(self, since='', until=None):
+        """(key, payload) of visible records with since <= key < until, in append order"""
+        since = max(since, self.start_key)
+        for segment in self.segments:
+            end = segment.end
+            if segment.last_key is None or segment.last_key < since:
+                continue
+            # The last chunk starting below since: nothing before it can reach since
+            chunk = max(bisect_left(segment.index_keys, since) - 1, 0)
+            offset = segment.index_offsets[chunk]
+            while offset < end:
+                key, payload, offset = segment.record_at(offset)
+                if until is not None and key >= until:
+                    return
+                if key >= since:
+                    yield key, payload
+
+    def scan_reverse(self, before=None):
+        """(key, payload) of visible records with key < before, newest first"""
+        segments = self.segments
+        for segment in reversed(segments):
+            end = segment.end
+            chunks = len(segment.index_offsets)
+            if before is not None:
+                chunks = bisect_left(segment.index_keys, before)
+            for index in range(chunks - 1, -1, -1):
+                for key, payload in reversed(segment.chunk(index, end)):
+                    if key < self.start_key:
+                        return
+                    if before is None or key < before:
+                        yield key, payload
+
+    def first_key(self):
+        return next((key for key, _ in self.scan()), None)
+
+    def last_key(self):
+        return next((key for key, _ in self.scan_reverse()), None)
+
+    def __len__(self):
+        return self.count
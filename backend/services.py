@@ -1,234 +1,521 @@
 """
 Background services for automated threat generation, blockchain simulation,
 response automation, and node status updates
+
+The periodic work runs as jobs on one fixed-rate scheduler (scheduler.py)
+instead of a sleeping thread per loop.
+
+Every app.py process starts them, but only the holder of the leader lease
+(leader.py) runs the generator, node updater, rollup and archiver loops.
+Every process tails threat_history, response_logs and the ledger for rows
+it did not write itself and feeds its own live window, IP index,
+enforcement rules, chain head, push stream and response cache from them.
+The leader also sweeps for stored threats that no block holds (left by a
+previous leader) and seals them.
 """
 import threading
-import time
 import random
-import hashlib
-from datetime import datetime, timedelta
-from database import get_db
+from itertools import islice
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from database import get_db, indexes_ready, initialize_static_data
+from ingest import IngestPipeline, RejectedWrite, RETRY_UNTIL_WRITTEN, RETRY_NEVER
+from ledger import ChainHead, unsealed_threats
+from blockchain import BlockBuilder, block_event
+import mongo_analytics
+import mongo_archive
+from events import event_broker, ChangeTracker
+from response_cache import response_cache
+from simulation import generate_threat, generate_response
+from ip_index import IpIndex
+from enforcement import EnforcementEngine
+from leader import LeaderLease
+from scheduler import Scheduler
 import config
 
+
+class CollectionTail:
+    """
+    Documents inserted into one collection, each returned once. Reads go by
+    insertion order (_id) from FOLLOWER_TAIL_OVERLAP seconds before the newest
+    _id seen, which also catches rows flushed late and writers whose clocks
+    disagree; ids already seen (or written by this process) are skipped.
+    """
+
+    def __init__(self, collection, id_field):
+        self.collection = collection
+        self.id_field = id_field
+        self.since = datetime.now(timezone.utc)  # Newest insertion time seen
+        self.seen = {}  # record id -> insertion time, for rows inside the overlap
+
+    def _window_start(self):
+        return self.since - timedelta(seconds=config.FOLLOWER_TAIL_OVERLAP)
+
+    def start_id(self):
+        """_id the first read starts from: a startup load takes the rows before it"""
+        return ObjectId.from_datetime(self._window_start())
+
+    def remember(self, record_id):
+        """A row this process is writing itself"""
+        self.seen[record_id] = datetime.now(timezone.utc)
+
+    def read(self):
+        """New rows, oldest timestamp first"""
+        rows = []
+        for document in get_db()[self.collection].find(
+            {'_id': {'$gte': ObjectId.from_datetime(self._window_start())}},
+            {'createdAt': 0}
+        ).sort('_id', 1):
+            inserted = document.pop('_id').generation_time
+            self.since = max(self.since, inserted)
+            if document[self.id_field] in self.seen:
+                continue
+            self.seen[document[self.id_field]] = inserted
+            rows.append(document)
+        start = self._window_start()
+        self.seen = {record_id: inserted for record_id, inserted in self.seen.items() if inserted >= start}
+        rows.sort(key=lambda row: row['timestamp'])
+        return rows
+
+
 class BackgroundServices:
     """Manages all background automation services"""
     
     def __init__(self):
-        self.running = False
-        self.threads = []
-        self.block_counter = 1
-        
-    def start(self):
-        """Start all background services"""
-        self.running = True
-        
-        # Start threat generator
-        threat_thread = threading.Thread(target=self._threat_generator_loop, daemon=True)
-        threat_thread.start()
-        self.threads.append(threat_thread)
-        print("🔄 Started: Threat Generator (every 10s)")
-        
-        # Start node status updater
-        node_thread = threading.Thread(target=self._node_updater_loop, daemon=True)
-        node_thread.start()
-        self.threads.append(node_thread)
-        print("🔄 Started: Node Status Updater (every 5s)")
+        # Every periodic job below, on one timer thread and a small worker pool
+        self.scheduler = Scheduler(name='background')
+        # Tip of the ledger, so appending a block needs no read
+        self.chain_head = ChainHead()
+        
+        # Batched writer for threats, blocks, response logs and counters (routed to the repository in start())
+        self.repository = None
+        self.pipeline = IngestPipeline()
+        self.pipeline.on_error(config.COLLECTIONS['BLOCKCHAIN_LEDGER'], self._on_ledger_error)
+        # Cached API responses built from a collection go stale once a flush lands in it
+        for collection in ('THREAT_HISTORY', 'BLOCKCHAIN_LEDGER', 'RESPONSE_LOGS', 'NODES_STATUS', 'AI_STATUS'):
+            name = config.COLLECTIONS[collection]
+            self.pipeline.on_written(name, lambda name=name: response_cache.bump(name))
+        
+        # Batches threats into Merkle blocks; none is sealed while an earlier one waits for a retry
+        self.block_builder = BlockBuilder(
+            self._append_block,
+            ready=lambda: not self.pipeline.backlog(config.COLLECTIONS['BLOCKCHAIN_LEDGER'])
+        )
+        
+        # In-process mirror of the live_threats capped collection (oldest -> newest)
+        self.live_threats = deque(maxlen=config.LIVE_THREATS_LIMIT)
+        self.live_threats_lock = threading.Lock()
+        
+        # Per-IP / per-network stats; written by the threat generator (leader) or the follower
+        self.ip_index = IpIndex()
+        # Set once the rows stored before startup are counted (loaded in the background)
+        self.ip_index_loaded = threading.Event()
+        # Blocklist / rate limits derived from automated responses
+        self.enforcement = EnforcementEngine()
+        
+        # Set while this process holds the leader lease and runs the writer loops
+        self.lease = LeaderLease()
+        self.leading = threading.Event()
+        # Serializes the writers of the in-process indexes: the tail, the generator and elections
+        self.follow_lock = threading.Lock()
+        # Rows other processes inserted (created in start(), before the startup loads)
+        self.threat_tail = None
+        self.response_tail = None
+        # Leader only: every threat stored before this timestamp is known to be in a block
+        self.sweep_watermark = None
+        # Oldest threat of a block the ledger rejected, moved into the watermark by the next sweep
+        self.sweep_lock = threading.Lock()
+        self.sweep_rewind = None
+        # Node states last refreshed: node events are published only when they change
+        self.node_changes = ChangeTracker(config.NODE_EVENT_FIELDS)
+        
+    def start(self, repository):
+        """Start all background services, writing through the given MongoRepository"""
+        self.repository = repository
+        collections = config.COLLECTIONS
+        self.pipeline.route(collections['THREAT_HISTORY'], repository.add_threats)
+        # Best-effort mirror with no unique key: a retry would insert copies of what partly landed
+        self.pipeline.route(collections['LIVE_THREATS'], repository.add_live_threats, retry=RETRY_NEVER)
+        self.pipeline.route(collections['RESPONSE_LOGS'], repository.add_responses)
+        # A dropped block would leave a gap the next one is already linked across
+        self.pipeline.route(collections['BLOCKCHAIN_LEDGER'], self._write_blocks, retry=RETRY_UNTIL_WRITTEN)
+        self.pipeline.route_counter(
+            collections['NODES_STATUS'],
+            lambda query, increments, fields: repository.update_node(query['nodeId'], fields, increments)
+        )
+        self.pipeline.route_counter(
+            collections['AI_STATUS'],
+            lambda query, increments, fields: repository.update_ai_status(fields, increments)
+        )
+        
+        # Tails start now; the IP index load takes every row stored before their first read
+        self.threat_tail = CollectionTail(config.COLLECTIONS['THREAT_HISTORY'], 'threatId')
+        self.response_tail = CollectionTail(config.COLLECTIONS['RESPONSE_LOGS'], 'logId')
+        self._load_live_threats()
+        # A full scan of both collections: every worker would otherwise wait it out before serving
+        threading.Thread(
+            target=self._load_ip_index,
+            args=(self.threat_tail.start_id(), self.response_tail.start_id()),
+            name='ip-index-load',
+            daemon=True
+        ).start()
+        self._load_enforcement()
+        self.chain_head.load()
+        self.pipeline.start()
+        
+        # Leader election (first attempt right away), and tailing what other processes wrote.
+        # Every process polls MongoDB for these, so their runs are jittered apart.
+        self.scheduler.add('leader-lease', self._renew_lease, config.LEADER_RENEW_INTERVAL,
+                           jitter=config.LEADER_RENEW_INTERVAL * config.SCHEDULER_JITTER, delay=0)
+        self.scheduler.add('follower', self._follow_tick, config.FOLLOWER_REFRESH_INTERVAL,
+                           jitter=config.FOLLOWER_REFRESH_INTERVAL * config.SCHEDULER_JITTER)
+        print(f"🔄 Started: Leader Lease (process {self.lease.owner})")
+        
+        # Writer jobs: they tick in every process but run only in the leader
+        self.scheduler.add('threat-generator', self._generate_tick, config.THREAT_GENERATION_INTERVAL,
+                           when=self.is_leader)
+        print(f"🔄 Started: Threat Generator (every {config.THREAT_GENERATION_INTERVAL}s)")
+        
+        self.scheduler.add('ledger-sweep', self._sweep_unsealed, config.LEDGER_SWEEP_INTERVAL,
+                           when=self.is_leader)
         
+        self.scheduler.add('node-updater', self._update_node_status, config.NODE_SYNC_INTERVAL,
+                           when=self.is_leader)
+        print(f"🔄 Started: Node Status Updater (every {config.NODE_SYNC_INTERVAL}s)")
+        
+        if config.ANALYTICS_USE_ROLLUPS:
+            # $merge needs the unique rollup index, which init_db may still be building
+            self.scheduler.add('analytics-rollups', self._refresh_rollups, config.ANALYTICS_ROLLUP_INTERVAL,
+                               when=lambda: self.is_leader() and indexes_ready.is_set())
+            print(f"🔄 Started: Analytics Rollups (every {config.ANALYTICS_ROLLUP_INTERVAL}s)")
+        
+        if config.ARCHIVE_ENABLED:
+            self.scheduler.add('retention-archiver', self._archive_expired, config.ARCHIVE_INTERVAL,
+                               when=self.is_leader)
+            print(f"🔄 Started: Retention Archiver (every {config.ARCHIVE_INTERVAL}s)")
+        
+        self.scheduler.start()
         print("✅ All background services started\n")
     
     def stop(self):
         """Stop all background services"""
-        self.running = False
-        for thread in self.threads:
-            thread.join(timeout=2)
+        # Runs in progress get a moment to finish; nothing waits out an interval
+        self.scheduler.stop(timeout=2)
+        if self.is_leader():
+            self.block_builder.flush()
+        self.pipeline.stop()
+        # After the last flush: a successor must not start before our writes land
+        self.leading.clear()
+        self.lease.release()
         print("🛑 All background services stopped")
     
+    def is_leader(self):
+        """Whether this process runs the writer loops right now"""
+        return self.leading.is_set() and self.lease.valid()
+    
+    # ==================== LEADER ELECTION ====================
+    
+    def _renew_lease(self):
+        """Take or renew the leader lease (every LEADER_RENEW_INTERVAL seconds)"""
+        if self.lease.try_acquire():
+            if not self.leading.is_set():
+                self._become_leader()
+        elif self.leading.is_set():
+            self._step_down()
+    
+    def _become_leader(self):
+        with self.follow_lock:
+            # Whatever the previous leader wrote since our last follow
+            self._follow()
+            self.chain_head.load()
+            initialize_static_data()
+            # Threats the previous leader stored but never sealed are found by the sweep
+            self.sweep_watermark = (datetime.now() - timedelta(seconds=config.LEADER_RECOVERY_WINDOW)).isoformat()
+            self.leading.set()
+        print("👑 Elected leader: running the background loops in this process")
+    
+    def _step_down(self):
+        self.leading.clear()
+        # Sealing them now would race the new leader for a block number. They are
+        # in threat_history, so the new leader's sweep seals them instead.
+        dropped = self.block_builder.discard()
+        print(f"👥 Lost the leader lease: following ({len(dropped)} unsealed threats left to the new leader)")
+    
+    # ==================== LEDGER SWEEP ====================
+    
+    def _sweep_unsealed(self):
+        """Queue stored threats that no block holds (a crashed or deposed leader's batch, a dropped block)"""
+        # Younger threats may still be on their way into a block
+        settled = (datetime.now() - timedelta(seconds=config.LEDGER_SWEEP_SETTLE)).isoformat()
+        with self.sweep_lock:
+            rewind, self.sweep_rewind = self.sweep_rewind, None
+        if rewind is not None and self.sweep_watermark is not None:
+            self.sweep_watermark = min(self.sweep_watermark, rewind)
+        if self.sweep_watermark is None or self.sweep_watermark >= settled:
+            return
+        threats = list(get_db()[config.COLLECTIONS['THREAT_HISTORY']].find(
+            {'timestamp': {'$gte': self.sweep_watermark, '$lt': settled}},
+            {'_id': 0, 'createdAt': 0}
+        ).sort('timestamp', 1))
+        pending = set(self.block_builder.pending_ids())
+        missing = [threat for threat in unsealed_threats(threats) if threat['threatId'] not in pending]
+        for threat in missing:
+            self.block_builder.add(threat, threat['nodeId'])
+        # The re-queued threats are checked again next time, in case their block is dropped too
+        self.sweep_watermark = missing[0]['timestamp'] if missing else settled
+        if missing:
+            print(f"🧹 Ledger sweep: queued {len(missing)} stored threats that no block holds")
+    
+    # ==================== FOLLOWER ====================
+    
+    def _follow_tick(self):
+        """Apply what other processes wrote (every FOLLOWER_REFRESH_INTERVAL seconds)"""
+        with self.follow_lock:
+            self._follow()
+    
+    def _follow(self):
+        """Feed this process's in-memory state and push stream from rows other processes stored"""
+        db = get_db()
+        
+        threats = self.threat_tail.read()
+        for threat in threats:
+            self.ip_index.record_threat(threat)
+            event_broker.publish('threat', threat)
+        if threats:
+            with self.live_threats_lock:
+                self.live_threats.extend(threats)
+            response_cache.bump(
+                config.COLLECTIONS['LIVE_THREATS'],
+                config.COLLECTIONS['THREAT_HISTORY'],
+                config.COLLECTIONS['AI_STATUS']
+            )
+        
+        response_logs = self.response_tail.read()
+        for response_log in response_logs:
+            self.ip_index.record_response(response_log)
+            self.enforcement.apply_response(response_log)
+            event_broker.publish('response', response_log)
+        if response_logs:
+            response_cache.bump(config.COLLECTIONS['RESPONSE_LOGS'])
+        
+        blocks = list(db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].find(
+            {'blockNumber': {'$gt': self.chain_head.block_number}},
+            {'_id': 0}
+        ).sort('blockNumber', 1))
+        for block in blocks:
+            event_broker.publish('block', block_event(block))
+        if blocks:
+            self.chain_head.advance(blocks[-1])
+            response_cache.bump(config.COLLECTIONS['BLOCKCHAIN_LEDGER'])
+        
+        # The node updater changes these every few seconds without leaving a trail to tail
+        response_cache.bump(config.COLLECTIONS['NODES_STATUS'], config.COLLECTIONS['THREAT_ROLLUPS'])
+    
     # ==================== THREAT GENERATOR ====================
     
-    def _threat_generator_loop(self):
-        """Background loop to generate threats every 10 seconds"""
-        while self.running:
-            try:
-                self._generate_threat()
-                time.sleep(config.THREAT_GENERATION_INTERVAL)
-            except Exception as e:
-                print(f"❌ Error in threat generator: {e}")
-                time.sleep(config.THREAT_GENERATION_INTERVAL)
+    def _generate_tick(self):
+        """One threat every THREAT_GENERATION_INTERVAL seconds, then seal the block if it is due"""
+        with self.follow_lock:
+            self._generate_threat()
+            self.block_builder.tick()
     
     def _generate_threat(self):
         """Generate a single dummy threat and trigger related actions"""
-        db = get_db()
+        # Generate threat data (shared with app_enhanced.py)
+        threat = generate_threat()
+        
+        # 1. Queue for threat_history
+        self.pipeline.insert(config.COLLECTIONS['THREAT_HISTORY'], threat)
         
-        # Generate threat data
-        threat_type = random.choice(config.THREAT_TYPES)
-        severity = random.choice(config.THREAT_SEVERITIES)
-        source_ip = self._generate_random_ip()
-        timestamp = datetime.now()
-        
-        threat = {
-            'threatId': f"THR-{random.randint(1000, 9999)}",
-            'type': threat_type,
-            'severity': severity,
-            'source': random.choice(config.THREAT_SOURCES),
-            'ip': source_ip,
-            'timestamp': timestamp.isoformat(),
-            'status': random.choice(config.THREAT_STATUSES),
-            'description': f'Suspicious {threat_type.lower()} activity detected from {source_ip}',
-            'nodeId': random.choice(config.NODES)['nodeId']
-        }
-        
-        # 1. Insert into threat_history (permanent storage)
-        db[config.COLLECTIONS['THREAT_HISTORY']].insert_one(threat.copy())
-        
-        # 2. Insert into live_threats (keep only last 10)
-        db[config.COLLECTIONS['LIVE_THREATS']].insert_one(threat.copy())
-        
-        # Keep only last 10 live threats
-        live_threats_count = db[config.COLLECTIONS['LIVE_THREATS']].count_documents({})
-        if live_threats_count > config.LIVE_THREATS_LIMIT:
-            # Delete oldest threats
-            oldest_threats = db[config.COLLECTIONS['LIVE_THREATS']].find().sort('timestamp', 1).limit(live_threats_count - config.LIVE_THREATS_LIMIT)
-            for old_threat in oldest_threats:
-                db[config.COLLECTIONS['LIVE_THREATS']].delete_one({'_id': old_threat['_id']})
-        
-        # 3. Create blockchain block for this threat
-        self._create_blockchain_block(threat)
+        # 2. Queue for live_threats (capped collection evicts the oldest itself)
+        self.pipeline.insert(config.COLLECTIONS['LIVE_THREATS'], threat)
+        self.ip_index.record_threat(threat)
+        self.threat_tail.remember(threat['threatId'])
+        with self.live_threats_lock:
+            self.live_threats.append(threat)
+        response_cache.bump(config.COLLECTIONS['LIVE_THREATS'])
+        event_broker.publish('threat', threat)
+        
+        # 3. Add the threat to the next blockchain block
+        self.block_builder.add(threat, threat['nodeId'])
         
         # 4. Generate automated response based on severity
         self._generate_automated_response(threat)
         
-        # 5. Update AI status (increment threats analyzed)
-        db[config.COLLECTIONS['AI_STATUS']].update_one(
+        # 5. Update AI status (increment threats analyzed, coalesced per flush)
+        self.pipeline.increment(
+            config.COLLECTIONS['AI_STATUS'],
             {},
-            {'$inc': {'threatsAnalyzed': 1}, '$set': {'updatedAt': datetime.now().isoformat()}}
+            {'threatsAnalyzed': 1},
+            {'updatedAt': datetime.now().isoformat()}
         )
         
         # 6. Update node threat counter
-        db[config.COLLECTIONS['NODES_STATUS']].update_one(
+        self.pipeline.increment(
+            config.COLLECTIONS['NODES_STATUS'],
             {'nodeId': threat['nodeId']},
-            {'$inc': {'threatsDetected': 1}}
+            {'threatsDetected': 1}
         )
         
-        print(f"🚨 Generated Threat: [{severity}] {threat_type} from {source_ip}")
+        print(f"🚨 Generated Threat: [{threat['severity']}] {threat['type']} from {threat['ip']}")
     
-    # ==================== BLOCKCHAIN SIMULATION ====================
+    # ==================== LIVE THREAT WINDOW ====================
     
-    def _create_blockchain_block(self, threat):
-        """Create a blockchain block for the given threat"""
+    def _load_live_threats(self):
+        """Warm the in-process live window from the capped collection"""
         db = get_db()
         
-        # Generate threat hash
-        threat_hash = self._generate_threat_hash(threat['type'], threat['timestamp'])
+        # $natural order on a capped collection is insertion order
+        latest = list(db[config.COLLECTIONS['LIVE_THREATS']].find(
+            {},
+            {'_id': 0}
+        ).sort('$natural', -1).limit(config.LIVE_THREATS_LIMIT))
         
-        # Get previous block hash
-        last_block = db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].find_one(
-            sort=[('blockNumber', -1)]
-        )
-        previous_hash = last_block['currentHash'] if last_block else '0' * 16
-        
-        # Create new block
-        block = {
-            'blockNumber': self.block_counter,
-            'threatHash': threat_hash,
-            'currentHash': self._generate_block_hash(str(self.block_counter), threat_hash),
-            'previousHash': previous_hash,
-            'threatType': threat['type'],
-            'threatId': threat['threatId'],
-            'timestamp': threat['timestamp'],
-            'verificationStatus': '✅ Verified',
-            'nodeId': threat['nodeId'],
-            'severity': threat['severity']
-        }
-        
-        db[config.COLLECTIONS['BLOCKCHAIN_LEDGER']].insert_one(block)
-        print(f"   ⛓️  Block #{self.block_counter} created | Hash: {threat_hash}")
-        
-        self.block_counter += 1
+        with self.live_threats_lock:
+            self.live_threats.clear()
+            self.live_threats.extend(reversed(latest))
     
-    # ==================== AUTOMATED RESPONSE ====================
-    
-    def _generate_automated_response(self, threat):
-        """Generate automated response based on threat severity"""
+    def _load_ip_index(self, threats_before, responses_before):
+        """
+        Count the history and response logs stored before the tails' first reads
+        into the IP index (the tails count everything from there on). Runs in
+        the background, a batch at a time under follow_lock, the index's writer lock.
+        """
         db = get_db()
-        
-        # Select appropriate actions based on severity
-        severity = threat['severity']
-        possible_actions = config.RESPONSE_ACTIONS.get(severity, ['Alert Sent'])
-        
-        # For High and Critical, always take action
-        if severity in ['Critical', 'High']:
-            action = random.choice(possible_actions)
-            self._create_response_log(threat, action)
-            print(f"   🛡️  Response: {action} for {threat['ip']}")
-        
-        # For Medium, 70% chance of action
-        elif severity == 'Medium' and random.random() < 0.7:
-            action = random.choice(possible_actions)
-            self._create_response_log(threat, action)
-            print(f"   🛡️  Response: {action} for {threat['ip']}")
+        try:
+            for collection, before, fields, record in (
+                (config.COLLECTIONS['THREAT_HISTORY'], threats_before,
+                 {'_id': 0, 'ip': 1, 'severity': 1, 'timestamp': 1}, self.ip_index.record_threat),
+                (config.COLLECTIONS['RESPONSE_LOGS'], responses_before,
+                 {'_id': 0, 'targetIp': 1, 'action': 1, 'timestamp': 1}, self.ip_index.record_response)
+            ):
+                cursor = db[collection].find({'_id': {'$lt': before}}, fields).batch_size(config.EXPORT_BATCH_ROWS)
+                while True:
+                    rows = list(islice(cursor, config.EXPORT_BATCH_ROWS))
+                    if not rows:
+                        break
+                    with self.follow_lock:
+                        for row in rows:
+                            record(row)
+            print(f"🌐 IP index: {len(self.ip_index)} addresses")
+        except PyMongoError as e:
+            print(f"❌ IP index load failed, counts cover new rows only: {e}")
+        finally:
+            self.ip_index_loaded.set()
     
-    def _create_response_log(self, threat, action):
-        """Create a response log entry"""
+    def _load_enforcement(self):
+        """Re-apply the responses recent enough to still be in force"""
         db = get_db()
+        longest = max(duration for _, duration in config.ENFORCED_ACTIONS.values())
+        since = (datetime.now() - timedelta(seconds=longest)).isoformat()
+        for response_log in db[config.COLLECTIONS['RESPONSE_LOGS']].find(
+            {'timestamp': {'$gte': since}, 'action': {'$in': list(config.ENFORCED_ACTIONS)}},
+            {'_id': 0, 'createdAt': 0}
+        ):
+            self.enforcement.apply_response(response_log)
+        print(f"🚫 Enforcement: {self.enforcement.get_metrics()['rules']} active rules")
+    
+    def get_live_threats(self):
+        """Return the live window newest first without touching the database"""
+        with self.live_threats_lock:
+            threats = list(self.live_threats)
+        threats.reverse()
+        return threats
+    
+    # ==================== BLOCKCHAIN SIMULATION ====================
+    
+    def _append_block(self, build_block):
+        """Link a sealed batch to the chain head and queue it for the ledger"""
+        # Number and previousHash come from the in-memory chain head
+        block = self.chain_head.append(build_block)
         
-        response_log = {
-            'logId': f"LOG-{random.randint(1000, 9999)}",
-            'action': action,
-            'targetIp': threat['ip'],
-            'threatType': threat['type'],
-            'threatId': threat['threatId'],
-            'timestamp': datetime.now().isoformat(),
-            'status': 'Success' if random.random() > 0.1 else 'Pending',  # 90% success rate
-            'nodeId': threat['nodeId'],
-            'severity': threat['severity']
-        }
+        event_broker.publish('block', block_event(block))
+        self.pipeline.insert(config.COLLECTIONS['BLOCKCHAIN_LEDGER'], block)
+        print(f"   ⛓️  Block #{block['blockNumber']} sealed | {block['transactionCount']} threats | "
+              f"Merkle root: {block['merkleRoot'][:16]}")
+        return block
+    
+    def _write_blocks(self, blocks):
+        """
+        Pipeline writer for the ledger: blocks are appended one at a time, in
+        order, each only onto the stored block it links to
+        """
+        for block in blocks:
+            rejected = RejectedWrite(f"block #{block['blockNumber']} does not extend the stored ledger")
+            stored = self.repository.get_block(block['blockNumber'])
+            if stored is not None:
+                # A retry of a block an earlier attempt stored is done; any other block there is a fork
+                if stored['currentHash'] != block['currentHash']:
+                    raise rejected
+                continue
+            tip = self.repository.last_block()
+            if tip is not None and (
+                tip['blockNumber'] + 1 != block['blockNumber'] or tip['currentHash'] != block['previousHash']
+            ):
+                raise rejected
+            try:
+                self.repository.append_block(block)
+            except DuplicateKeyError:
+                raise rejected
+    
+    def _on_ledger_error(self, error, blocks):
+        """Rejected blocks are dropped: rewind the chain head and have the sweep re-seal their threats"""
+        if not isinstance(error, RejectedWrite):
+            return  # Retried until it is written
+        self.chain_head.rewind()
+        oldest = min(block['firstTimestamp'] for block in blocks)
+        with self.sweep_lock:
+            self.sweep_rewind = min(oldest, self.sweep_rewind or oldest)
+        print(f"⚠️  Ledger rejected {len(blocks)} blocks ({error}); their threats go back to the sweep")
+    
+    # ==================== AUTOMATED RESPONSE ====================
+    
+    def _generate_automated_response(self, threat):
+        """Log the automated response to a threat, if its severity calls for one"""
+        response_log = generate_response(threat)
+        if response_log is None:
+            return
         
-        db[config.COLLECTIONS['RESPONSE_LOGS']].insert_one(response_log)
+        self.ip_index.record_response(response_log)
+        self.enforcement.apply_response(response_log)
+        self.response_tail.remember(response_log['logId'])
+        event_broker.publish('response', response_log)
+        self.pipeline.insert(config.COLLECTIONS['RESPONSE_LOGS'], response_log)
+        print(f"   🛡️  Response: {response_log['action']} for {threat['ip']}")
     
     # ==================== NODE STATUS UPDATER ====================
     
-    def _node_updater_loop(self):
-        """Background loop to update node sync times every 5 seconds"""
-        while self.running:
-            try:
-                self._update_node_status()
-                time.sleep(config.NODE_SYNC_INTERVAL)
-            except Exception as e:
-                print(f"❌ Error in node updater: {e}")
-                time.sleep(config.NODE_SYNC_INTERVAL)
-    
     def _update_node_status(self):
-        """Update last sync time for all nodes"""
-        db = get_db()
-        
+        """Update last sync time for all nodes (every NODE_SYNC_INTERVAL seconds)"""
         for node in config.NODES:
-            db[config.COLLECTIONS['NODES_STATUS']].update_one(
-                {'nodeId': node['nodeId']},
-                {
-                    '$set': {
-                        'lastSyncTime': datetime.now().isoformat(),
-                        'status': node['status'],  # Always online
-                        'latency': f"{random.randint(10, 100)}ms",
-                        'uptime': f"{random.randint(98, 100)}.{random.randint(0, 9)}%"
-                    }
-                }
-            )
+            update = {
+                'lastSyncTime': datetime.now().isoformat(),
+                'status': node['status'],  # Always online
+                'latency': f"{random.randint(10, 100)}ms",
+                'uptime': f"{random.randint(98, 100)}.{random.randint(0, 9)}%"
+            }
+            self.repository.update_node(node['nodeId'], update)
+            # Pushed only when the node's state changed, not on every refresh
+            if self.node_changes.changed(node['nodeId'], update):
+                event_broker.publish('node', dict(update, nodeId=node['nodeId']))
+        response_cache.bump(config.COLLECTIONS['NODES_STATUS'])
     
-    # ==================== UTILITY FUNCTIONS ====================
+    # ==================== ANALYTICS ROLLUPS ====================
     
-    def _generate_random_ip(self):
-        """Generate a random IP address"""
-        return f"{random.randint(1, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 255)}"
+    def _refresh_rollups(self):
+        """$merge fresh per-day counts into threat_rollups"""
+        mongo_analytics.refresh_rollups()
+        response_cache.bump(config.COLLECTIONS['THREAT_ROLLUPS'])
     
-    def _generate_threat_hash(self, threat_type, timestamp):
-        """Generate a simulated threat hash"""
-        data = f"{threat_type}{timestamp}{random.random()}"
-        return hashlib.sha256(data.encode()).hexdigest()[:16]
+    # ==================== RETENTION ARCHIVER ====================
     
-    def _generate_block_hash(self, block_number, threat_hash):
-        """Generate a simulated block hash"""
-        data = f"{block_number}{threat_hash}{random.random()}"
-        return hashlib.sha256(data.encode()).hexdigest()[:16]
+    def _archive_expired(self):
+        """Move rows past retention to the on-disk archive"""
+        archived = mongo_archive.archive_expired()
+        if any(archived.values()):
+            print(f"🗄️  Archived {archived}")
 
 
 # Global instance
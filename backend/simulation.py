@@ -0,0 +1,65 @@
+"""
+Simulated sensor data shared by both servers: random threats and the
+automated response each one triggers
+"""
+import random
+from datetime import datetime
+from ids import new_id
+import config
+
+
+def random_ip():
+    """Random IPv4 address"""
+    return f"{random.randint(1, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 255)}"
+
+
+def generate_threat(node=None):
+    """Random threat detected by node (a config.NODES entry, random if omitted)"""
+    node = node or random.choice(config.NODES)
+    threat_type = random.choice(config.THREAT_TYPES)
+    source_ip = random_ip()
+
+    return {
+        'threatId': new_id('THR', node['nodeId']),
+        'type': threat_type,
+        'severity': random.choice(config.THREAT_SEVERITIES),
+        'source': random.choice(config.THREAT_SOURCES),
+        'ip': source_ip,
+        'timestamp': datetime.now().isoformat(),
+        'status': random.choice(config.THREAT_STATUSES),
+        'description': f'Suspicious {threat_type.lower()} activity detected from {source_ip}',
+        'nodeId': node['nodeId'],
+        'location': node['location'],
+        'protocol': random.choice(config.THREAT_PROTOCOLS),
+        'port': random.choice(config.THREAT_PORTS),
+        'attackVector': random.choice(config.ATTACK_VECTORS),
+        'confidence': round(random.uniform(75, 99), 2)
+    }
+
+
+def response_action(severity):
+    """Action taken for a threat of this severity: always for Critical / High, 70% of the time for Medium"""
+    if severity in ('Critical', 'High') or (severity == 'Medium' and random.random() < 0.7):
+        return random.choice(config.RESPONSE_ACTIONS.get(severity, ['Alert Sent']))
+    return None
+
+
+def generate_response(threat):
+    """Response log of the automated response to a threat, or None if it gets none"""
+    action = response_action(threat['severity'])
+    if action is None:
+        return None
+
+    return {
+        'logId': new_id('LOG', threat['nodeId']),
+        'action': action,
+        'targetIp': threat['ip'],
+        'threatType': threat['type'],
+        'threatId': threat['threatId'],
+        'timestamp': datetime.now().isoformat(),
+        'status': 'Success' if random.random() > 0.1 else 'Pending',  # 90% success rate
+        'nodeId': threat['nodeId'],
+        'severity': threat['severity'],
+        'responseTime': f"{random.randint(10, 500)}ms",
+        'automated': True
+    }
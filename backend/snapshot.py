@@ -0,0 +1,115 @@
+"""
+Snapshot files: app_enhanced's in-process state written to one binary file
+and read back on boot instead of being rebuilt from the history.
+
+Layout:
+
+    MAGIC | u32 header length | header | section | section | ...
+
+The header is a marshal'd dict with the format version, the creation time
+and each section's (offset, length). Every section is one marshal'd value:
+plain dicts, lists, numbers, strings and bytes. Records are stored column-wise
+(CompactRecord.to_columns). A reader loads sections one at a time, so boot can
+restore the hot state first and leave cold history for a background thread.
+Cold history is cut into several sections: decoding one holds the GIL, and a
+single huge section would stall the threads serving meanwhile.
+
+A snapshot is written to a temporary file, fsync'd, and renamed over the
+previous one, so a crash leaves either the old or the new snapshot, never a
+mix of both.
+"""
+import marshal
+import os
+import struct
+from datetime import datetime
+
+MAGIC = b'CDMSNAP\x01'
+LENGTH = struct.Struct('<I')
+VERSION = 3
+
+
+class SnapshotError(ValueError):
+    """The file is not a snapshot this version can read"""
+
+
+def split_hot(rows, hot_rows, segment_size):
+    """
+    (cold, hot) split of rows, oldest first, with at least hot_rows newest in
+    hot and cold a whole number of store segments (SegmentedStore.prepend)
+    """
+    cold = max(len(rows) - hot_rows, 0) // segment_size * segment_size
+    return rows[:cold], rows[cold:]
+
+
+def split_chunks(rows, chunk_rows, segment_size):
+    """Cold rows (whole store segments) cut into chunks of whole segments, oldest first"""
+    size = max(chunk_rows // segment_size, 1) * segment_size
+    return [rows[offset:offset + size] for offset in range(0, len(rows), size)]
+
+
+def write_snapshot(path, sections):
+    """Write sections (name -> marshal-able value) as a snapshot at path; returns its size in bytes"""
+    blobs = [(name, marshal.dumps(value)) for name, value in sections.items()]
+    offsets = {}
+    offset = 0
+    for name, blob in blobs:
+        offsets[name] = (offset, len(blob))
+        offset += len(blob)
+    header = marshal.dumps({'version': VERSION, 'createdAt': datetime.now().isoformat(), 'sections': offsets})
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        f.write(LENGTH.pack(len(header)))
+        f.write(header)
+        for _, blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    return len(MAGIC) + LENGTH.size + len(header) + offset
+
+
+class SnapshotReader:
+    """Lazily loaded sections of a snapshot file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SnapshotError(f"{path} is not a snapshot")
+            (length,) = LENGTH.unpack(self._read(f, LENGTH.size, 'header'))
+            data = self._read(f, length, 'header')
+        try:
+            header = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            raise SnapshotError(f"{path}: corrupt header")
+        if not isinstance(header, dict) or not {'version', 'createdAt', 'sections'} <= header.keys():
+            raise SnapshotError(f"{path}: corrupt header")
+        if header['version'] != VERSION:
+            raise SnapshotError(f"{path}: unsupported snapshot version {header['version']}")
+        self.created_at = header['createdAt']
+        self.sections = header['sections']
+        self.base = len(MAGIC) + LENGTH.size + length
+
+    def _read(self, f, length, part):
+        """Exactly length bytes; a file that ends sooner was cut short"""
+        data = f.read(length)
+        if len(data) != length:
+            raise SnapshotError(f"{self.path}: truncated {part}")
+        return data
+
+    def load(self, name):
+        """One section's value; raises SnapshotError if it is missing or damaged"""
+        if name not in self.sections:
+            raise SnapshotError(f"{self.path}: no section {name}")
+        offset, length = self.sections[name]
+        with open(self.path, 'rb') as f:
+            f.seek(self.base + offset)
+            data = self._read(f, length, f"section {name}")
+        try:
+            return marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            raise SnapshotError(f"{self.path}: corrupt section {name}")
@@ -0,0 +1,367 @@
+"""
+SQLite repository: threats, ledger, response logs, nodes and the AI status in
+one embedded database file.
+
+Each row is stored as its JSON document plus the columns it is ordered and
+filtered on. The threat indexes mirror database.THREAT_HISTORY_INDEXES, so a
+history page is a single index range scan. The file runs in WAL mode with
+these connections:
+- one writer connection, which commits each batch as one transaction (and
+  everything written inside batch() as one)
+- a pool of reader connections, which keep reading the last committed state
+  while a write is in progress
+
+Row counts are kept in memory, so only one process may write a file at a time.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pagination import encode_cursor
+from repository import Repository, default_nodes, default_ai_status, apply_update
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threats (
+    threat_id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    severity TEXT,
+    type TEXT,
+    node_id TEXT,
+    ip TEXT,
+    document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threats_timestamp ON threats (timestamp, threat_id);
+CREATE INDEX IF NOT EXISTS threats_severity ON threats (severity, timestamp, threat_id);
+CREATE INDEX IF NOT EXISTS threats_type ON threats (type, timestamp, threat_id);
+CREATE INDEX IF NOT EXISTS threats_node_id ON threats (node_id, timestamp, threat_id);
+CREATE INDEX IF NOT EXISTS threats_ip ON threats (ip, timestamp, threat_id);
+
+CREATE TABLE IF NOT EXISTS blocks (
+    block_number INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    document TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS block_threats (
+    threat_id TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS block_threats_block_number ON block_threats (block_number);
+
+CREATE TABLE IF NOT EXISTS responses (
+    log_id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_timestamp ON responses (timestamp, log_id);
+
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id TEXT PRIMARY KEY,
+    document TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ai_status (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    document TEXT NOT NULL
+);
+"""
+
+# History filter field -> threats column
+FILTER_COLUMNS = {'severity': 'severity', 'type': 'type', 'nodeId': 'node_id', 'ip': 'ip'}
+
+
+def _encode(document):
+    return json.dumps(document, separators=(',', ':'))
+
+
+class SqliteRepository(Repository):
+    """Embedded single-file backend"""
+
+    name = 'sqlite'
+    persistent = True
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.write_lock = threading.Lock()
+        self.batch_thread = None  # Thread inside batch(): its writes join that transaction
+        self.writer = self._connect()
+        self.writer.executescript(SCHEMA)
+        self.readers = queue.SimpleQueue()
+
+        with self._transaction() as connection:
+            if not connection.execute('SELECT 1 FROM nodes LIMIT 1').fetchone():
+                connection.executemany(
+                    'INSERT INTO nodes (node_id, document) VALUES (?, ?)',
+                    [(node['nodeId'], _encode(node)) for node in default_nodes()]
+                )
+            connection.execute(
+                'INSERT OR IGNORE INTO ai_status (id, document) VALUES (1, ?)',
+                (_encode(default_ai_status()),)
+            )
+        # COUNT(*) walks a whole index, so it runs once here and the writer keeps the totals
+        self.counts = {
+            table: self.writer.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('threats', 'blocks', 'responses')
+        }
+
+    def _connect(self):
+        # Autocommit mode: transactions are opened explicitly with BEGIN
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(f'PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}')
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """The writer connection inside one transaction, committed on success"""
+        if self.batch_thread == threading.get_ident():
+            # Part of the enclosing batch(), which commits or rolls back
+            yield self.writer
+            return
+        with self.write_lock:
+            self.writer.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.writer
+            except BaseException:
+                self.writer.execute('ROLLBACK')
+                raise
+            self.writer.execute('COMMIT')
+
+    @contextmanager
+    def batch(self):
+        """One transaction (one commit) for every write this thread makes inside"""
+        if self.batch_thread == threading.get_ident():
+            yield
+            return
+        with self._transaction():
+            counts = dict(self.counts)
+            self.batch_thread = threading.get_ident()
+            try:
+                yield
+            except BaseException:
+                self.counts = counts  # The rollback undoes the rows they counted
+                raise
+            finally:
+                self.batch_thread = None
+
+    @contextmanager
+    def _reader(self):
+        """A pooled read connection; the pool grows to the number of concurrent readers"""
+        try:
+            connection = self.readers.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        try:
+            yield connection
+        finally:
+            self.readers.put(connection)
+
+    def _documents(self, sql, params=()):
+        """Decoded first column of every row, streamed from one read connection"""
+        with self._reader() as connection:
+            for (document,) in connection.execute(sql, params):
+                yield json.loads(document)
+
+    def _document(self, sql, params=()):
+        with self._reader() as connection:
+            row = connection.execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _expire(self, connection, table, cutoff, order, archive_rows):
+        """Delete and return the rows of table older than cutoff, once archive_rows has taken them"""
+        rows = [
+            json.loads(document) for (document,) in connection.execute(
+                f'SELECT document FROM {table} WHERE timestamp < ? ORDER BY {order}', (cutoff,)
+            )
+        ]
+        if rows:
+            archive_rows(rows)  # Raising rolls the transaction back
+        connection.execute(f'DELETE FROM {table} WHERE timestamp < ?', (cutoff,))
+        self.counts[table] -= len(rows)
+        return rows
+
+    # ==================== THREATS ====================
+
+    def add_threats(self, threats):
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT INTO threats (threat_id, timestamp, severity, type, node_id, ip, document) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (threat['threatId'], threat['timestamp'], threat.get('severity'), threat.get('type'),
+                     threat.get('nodeId'), threat.get('ip'), _encode(threat))
+                    for threat in threats
+                ]
+            )
+            self.counts['threats'] += len(threats)
+
+    def get_threat(self, threat_id):
+        return self._document('SELECT document FROM threats WHERE threat_id = ?', (threat_id,))
+
+    def threat_page(self, query):
+        clauses = []
+        params = []
+        for field, value in query['filters'].items():
+            clauses.append(f'{FILTER_COLUMNS[field]} = ?')
+            params.append(value)
+        if query['since']:
+            clauses.append('timestamp >= ?')
+            params.append(query['since'])
+        if query['until']:
+            clauses.append('timestamp < ?')
+            params.append(query['until'])
+        if query['cursor']:
+            # Strictly after the last row of the previous page in (timestamp, threatId) order
+            clauses.append('(timestamp, threat_id) < (?, ?)')
+            params.extend(query['cursor'])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        # One extra row tells us whether another page exists
+        threats = list(self._documents(
+            f'SELECT document FROM threats {where} ORDER BY timestamp DESC, threat_id DESC LIMIT ?',
+            params + [query['limit'] + 1]
+        ))
+
+        next_cursor = None
+        if len(threats) > query['limit']:
+            threats = threats[:query['limit']]
+            next_cursor = encode_cursor(threats[-1]['timestamp'], threats[-1]['threatId'])
+        return threats, next_cursor
+
+    def iter_threats(self, after=None):
+        if after is None:
+            return self._documents('SELECT document FROM threats ORDER BY timestamp, threat_id')
+        return self._documents(
+            'SELECT document FROM threats WHERE (timestamp, threat_id) > (?, ?) ORDER BY timestamp, threat_id',
+            tuple(after)
+        )
+
+    def count_threats(self):
+        return self.counts['threats']
+
+    def expire_threats(self, cutoff, archive_rows):
+        with self._transaction() as connection:
+            return self._expire(connection, 'threats', cutoff, 'timestamp, threat_id', archive_rows)
+
+    # ==================== LEDGER ====================
+
+    def append_block(self, block):
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO blocks (block_number, timestamp, document) VALUES (?, ?, ?)',
+                (block['blockNumber'], block['timestamp'], _encode(block))
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO block_threats (threat_id, block_number) VALUES (?, ?)',
+                [(threat_id, block['blockNumber']) for threat_id in block['threatIds']]
+            )
+            self.counts['blocks'] += 1
+
+    def get_block(self, block_number):
+        return self._document('SELECT document FROM blocks WHERE block_number = ?', (block_number,))
+
+    def last_block(self):
+        return self._document('SELECT document FROM blocks ORDER BY block_number DESC LIMIT 1')
+
+    def first_block_number(self):
+        with self._reader() as connection:
+            return connection.execute('SELECT MIN(block_number) FROM blocks').fetchone()[0]
+
+    def count_blocks(self):
+        return self.counts['blocks']
+
+    def latest_blocks(self, count):
+        return list(self._documents('SELECT document FROM blocks ORDER BY block_number DESC LIMIT ?', (count,)))
+
+    def iter_blocks(self, after=0):
+        return self._documents('SELECT document FROM blocks WHERE block_number > ? ORDER BY block_number', (after,))
+
+    def block_number_of(self, threat_id):
+        with self._reader() as connection:
+            row = connection.execute(
+                'SELECT block_number FROM block_threats WHERE threat_id = ?', (threat_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def expire_blocks(self, through, cutoff, archive_rows):
+        with self._transaction() as connection:
+            # The first block that has to stay bounds the removable prefix
+            (keep,) = connection.execute(
+                'SELECT MIN(block_number) FROM blocks WHERE block_number > ? OR timestamp >= ?',
+                (through, cutoff)
+            ).fetchone()
+            clause, params = ('block_number < ?', (keep,)) if keep is not None else ('1', ())
+            blocks = [
+                json.loads(document) for (document,) in connection.execute(
+                    f'SELECT document FROM blocks WHERE {clause} ORDER BY block_number', params
+                )
+            ]
+            if blocks:
+                archive_rows(blocks)
+            connection.execute(f'DELETE FROM blocks WHERE {clause}', params)
+            connection.execute(f'DELETE FROM block_threats WHERE {clause}', params)
+            self.counts['blocks'] -= len(blocks)
+            return blocks
+
+    # ==================== RESPONSE LOGS ====================
+
+    def add_responses(self, response_logs):
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT INTO responses (log_id, timestamp, document) VALUES (?, ?, ?)',
+                [(log['logId'], log['timestamp'], _encode(log)) for log in response_logs]
+            )
+            self.counts['responses'] += len(response_logs)
+
+    def latest_responses(self, count):
+        return list(self._documents(
+            'SELECT document FROM responses ORDER BY timestamp DESC, log_id DESC LIMIT ?', (count,)
+        ))
+
+    def iter_responses(self, after=None):
+        if after is None:
+            return self._documents('SELECT document FROM responses ORDER BY timestamp, log_id')
+        return self._documents(
+            'SELECT document FROM responses WHERE (timestamp, log_id) > (?, ?) ORDER BY timestamp, log_id',
+            tuple(after)
+        )
+
+    def count_responses(self):
+        return self.counts['responses']
+
+    def expire_responses(self, cutoff, archive_rows):
+        with self._transaction() as connection:
+            return self._expire(connection, 'responses', cutoff, 'timestamp, log_id', archive_rows)
+
+    # ==================== NODES & AI STATUS ====================
+
+    def list_nodes(self):
+        return list(self._documents('SELECT document FROM nodes ORDER BY rowid'))
+
+    def update_node(self, node_id, fields=None, increments=None):
+        with self._transaction() as connection:
+            row = connection.execute('SELECT document FROM nodes WHERE node_id = ?', (node_id,)).fetchone()
+            if row:
+                node = apply_update(json.loads(row[0]), fields, increments)
+                connection.execute('UPDATE nodes SET document = ? WHERE node_id = ?', (_encode(node), node_id))
+
+    def get_ai_status(self):
+        return self._document('SELECT document FROM ai_status WHERE id = 1')
+
+    def update_ai_status(self, fields=None, increments=None):
+        with self._transaction() as connection:
+            (document,) = connection.execute('SELECT document FROM ai_status WHERE id = 1').fetchone()
+            ai_status = apply_update(json.loads(document), fields, increments)
+            connection.execute('UPDATE ai_status SET document = ? WHERE id = 1', (_encode(ai_status),))
+
+    def close(self):
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.writer.close()
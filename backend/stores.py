@@ -0,0 +1,190 @@
+"""
+In-memory stores for the standalone server (app_enhanced.py).
+
+Single writer, many readers: writers append under a lock, readers take an
+immutable snapshot and work on it without locking. Items live in fixed-size
+segments; a full segment is never touched again, and the open segment only
+grows, so everything below a snapshot's length stays exactly as it was.
+Retention drops whole segments from the front; the first remaining segment is
+read from an offset, so no live item is copied.
+
+Stores given a sort key stay in ascending key order, so endpoints serve the
+newest items by walking back from the end instead of sorting per request. An
+item that arrives out of order is placed with copy-on-write: the segments from
+its position onwards are rebuilt as new lists, and existing snapshots keep the
+old ones.
+"""
+import threading
+from collections import deque
+import config
+from pagination import bisect_key
+
+
+class Snapshot:
+    """Read-only, point-in-time view of a SegmentedStore"""
+
+    __slots__ = ('segments', 'segment_size', 'start', 'length')
+
+    def __init__(self, segments, segment_size, start, length):
+        self.segments = segments
+        self.segment_size = segment_size
+        self.start = start  # Offset of the first live item in segments[0]
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('snapshot index out of range')
+        index += self.start
+        return self.segments[index // self.segment_size][index % self.segment_size]
+
+    def __iter__(self):
+        remaining = self.length
+        offset = self.start
+        for segment in self.segments:
+            if remaining <= 0:
+                break
+            # Always slice: the open segment may grow while we iterate
+            part = segment[offset:offset + remaining]
+            yield from part
+            remaining -= len(part)
+            offset = 0
+
+    def range(self, start, stop):
+        """Items with start <= index < stop, oldest first"""
+        return [self[index] for index in range(max(start, 0), min(stop, self.length))]
+
+    def newest(self, count):
+        """Up to count items, newest first"""
+        return [self[index] for index in range(self.length - 1, max(self.length - count, 0) - 1, -1)]
+
+
+class SegmentedStore:
+    """Append-only store of fixed-size segments with lock-free snapshots"""
+
+    def __init__(self, key=None, segment_size=None):
+        self.key = key
+        self.segment_size = segment_size or config.STORE_SEGMENT_SIZE
+        self.write_lock = threading.Lock()
+        self._segments = [[]]
+        # (segments tuple, start, length) is replaced as one reference, so
+        # readers always see a consistent view
+        self._view = (tuple(self._segments), 0, 0)
+
+    def append(self, item):
+        """Add an item; with a sort key, out-of-order items are placed in order"""
+        with self.write_lock:
+            segments, start, length = self._view
+            if self.key and length and self.key(item) < self.key(segments[-1][-1]):
+                self._insert(item)
+                return
+            tail = self._segments[-1]
+            if len(tail) == self.segment_size:
+                tail = []
+                self._segments.append(tail)
+                segments = tuple(self._segments)
+            tail.append(item)
+            self._view = (segments, start, length + 1)
+
+    def _insert(self, item):
+        """Copy-on-write insert of an item that sorts before the current last item"""
+        snapshot = self.snapshot()
+        position = bisect_key(snapshot, self.key(item), self.key)
+        first = (snapshot.start + position) // self.segment_size
+
+        if first == 0:
+            # Rebuilding from the first segment also drops its retired prefix
+            start, keep = 0, 0
+        else:
+            start, keep = snapshot.start, first * self.segment_size - snapshot.start
+        moved = [snapshot[index] for index in range(keep, len(snapshot))]
+        moved.insert(position - keep, item)
+        rebuilt = [
+            moved[offset:offset + self.segment_size]
+            for offset in range(0, len(moved), self.segment_size)
+        ]
+        self._segments = self._segments[:first] + rebuilt
+        self._view = (tuple(self._segments), start, len(snapshot) + 1)
+
+    def drop_before(self, count):
+        """Retire the oldest count items; snapshots already taken keep them"""
+        with self.write_lock:
+            _, start, length = self._view
+            count = min(count, length)
+            physical = start + count
+            self._segments = self._segments[physical // self.segment_size:] or [[]]
+            self._view = (tuple(self._segments), physical % self.segment_size, length - count)
+
+    def load(self, items):
+        """Fill an empty store with items already in order (restoring a snapshot), a segment at a time"""
+        with self.write_lock:
+            if self._view[2]:
+                raise ValueError('load into a non-empty store')
+            self._segments = [list(items[offset:offset + self.segment_size])
+                              for offset in range(0, len(items), self.segment_size)] or [[]]
+            self._view = (tuple(self._segments), 0, len(items))
+
+    def prepend(self, items):
+        """
+        Put items that sort before everything stored in front of it (restoring
+        older rows after newer ones). Only whole segments can go in front, and
+        only while nothing has been dropped.
+        """
+        if len(items) % self.segment_size:
+            raise ValueError('prepend takes a whole number of segments')
+        with self.write_lock:
+            _, start, length = self._view
+            if start:
+                raise ValueError('prepend after drop_before')
+            front = [list(items[offset:offset + self.segment_size])
+                     for offset in range(0, len(items), self.segment_size)]
+            self._segments = front + self._segments
+            self._view = (tuple(self._segments), 0, length + len(items))
+
+    def snapshot(self):
+        segments, start, length = self._view
+        return Snapshot(segments, self.segment_size, start, length)
+
+    def last(self):
+        """Most recent item, or None when empty"""
+        snapshot = self.snapshot()
+        return snapshot[-1] if len(snapshot) else None
+
+    def __len__(self):
+        return self._view[2]
+
+
+class LiveWindow:
+    """Fixed-size window of the newest items; readers get an immutable tuple"""
+
+    def __init__(self, size, key=None):
+        self.key = key
+        self.write_lock = threading.Lock()
+        self._items = deque(maxlen=size)
+        self._snapshot = ()
+
+    def append(self, item):
+        """Add an item, keeping the window in key order; the oldest one falls out"""
+        with self.write_lock:
+            if self.key and self._items and self.key(item) < self.key(self._items[0]):
+                if len(self._items) == self._items.maxlen:
+                    return  # Older than everything in a full window
+            self._items.append(item)
+            if self.key:
+                # Window is small; an out-of-order item just bubbles back into place
+                index = len(self._items) - 1
+                while index > 0 and self.key(self._items[index - 1]) > self.key(self._items[index]):
+                    self._items[index - 1], self._items[index] = self._items[index], self._items[index - 1]
+                    index -= 1
+            self._snapshot = tuple(self._items)
+
+    def snapshot(self):
+        """Items oldest first"""
+        return self._snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
@@ -0,0 +1,229 @@
+"""
+Asynchronous threat submission for the in-memory server: submissions are
+validated against a schema compiled once at import, queued, and ingested by
+background workers in batches (one write_lock acquisition per batch), so the
+request only pays for parsing and validation.
+
+Batches arrive as a JSON array or as NDJSON (one object per line).
+"""
+import ipaddress
+import json
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+import config
+
+try:
+    import orjson
+except ImportError:  # Optional: standard library decoder
+    orjson = None
+
+IPV4_PATTERN = re.compile(r'^(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(\.(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)){3}$')
+
+# field -> rules; compiled into per-field check functions by compile_schema
+SUBMISSION_SCHEMA = {
+    'ip': {'type': str, 'required': True, 'format': 'ip'},
+    'threatType': {'type': str, 'required': True, 'minLength': 1, 'maxLength': 100},
+    'severity': {'type': str, 'required': True, 'enum': config.THREAT_SEVERITIES},
+    'source': {'type': str, 'maxLength': 100},
+    'description': {'type': str, 'maxLength': 1000},
+    'location': {'type': str, 'maxLength': 100},
+    'protocol': {'type': str, 'maxLength': 20},
+    'port': {'type': int, 'minimum': 0, 'maximum': 65535},
+    'attackVector': {'type': str, 'maxLength': 100}
+}
+
+
+def _is_ip(value):
+    if IPV4_PATTERN.match(value):
+        return True
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _compile_rules(field, rules):
+    """One check(value) per rule; each returns an error message or None"""
+    checks = []
+    expected = rules['type']
+    # bool is an int subclass, but never a valid port or count
+    checks.append(lambda value: None if isinstance(value, expected) and not isinstance(value, bool)
+                  else f"{field}: expected {expected.__name__}")
+    if 'enum' in rules:
+        allowed = frozenset(rules['enum'])
+        message = f"{field}: expected one of {', '.join(rules['enum'])}"
+        checks.append(lambda value: None if value in allowed else message)
+    if 'minLength' in rules or 'maxLength' in rules:
+        shortest, longest = rules.get('minLength', 0), rules['maxLength']
+        checks.append(lambda value: None if shortest <= len(value) <= longest
+                      else f"{field}: must be {shortest} to {longest} characters")
+    if 'minimum' in rules or 'maximum' in rules:
+        low, high = rules.get('minimum'), rules.get('maximum')
+        checks.append(lambda value: None if (low is None or value >= low) and (high is None or value <= high)
+                      else f"{field}: must be between {low} and {high}")
+    if rules.get('format') == 'ip':
+        checks.append(lambda value: None if _is_ip(value) else f"{field}: not an IP address")
+    return checks
+
+
+def compile_schema(schema):
+    """
+    Turn a schema dict into validate(item), which raises ValueError with the
+    first problem found. Rules are resolved once here, not per submission.
+    """
+    required = tuple(field for field, rules in schema.items() if rules.get('required'))
+    checks = {field: _compile_rules(field, rules) for field, rules in schema.items()}
+
+    def validate(item):
+        if not isinstance(item, dict):
+            raise ValueError('expected a JSON object')
+        missing = [field for field in required if field not in item]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        for field, value in item.items():
+            field_checks = checks.get(field)
+            if field_checks is None:
+                raise ValueError(f"Unknown field: {field}")
+            for check in field_checks:
+                error = check(value)
+                if error:
+                    raise ValueError(error)
+
+    return validate
+
+
+validate_submission = compile_schema(SUBMISSION_SCHEMA)
+
+
+def coerce_submission(data):
+    """
+    Lenient form of a submission (/api/submit-threat): unknown fields are
+    dropped, numbers are accepted for text fields and numeric strings for the
+    port. The result still has to pass validate_submission.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('expected a JSON object')
+    coerced = {}
+    for field, value in data.items():
+        rules = SUBMISSION_SCHEMA.get(field)
+        if rules is None:
+            continue
+        if rules['type'] is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif rules['type'] is int and isinstance(value, str) and value.strip().isdecimal():
+            value = int(value)
+        coerced[field] = value
+    return coerced
+
+
+def parse_batch(body, mimetype):
+    """
+    Submissions in a request body: a JSON array, or NDJSON when the mimetype
+    says so. Raises ValueError for a body that cannot be parsed.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    try:
+        if mimetype == 'application/x-ndjson':
+            return [loads(line) for line in body.splitlines() if line.strip()]
+        items = loads(body)
+    except ValueError as e:  # orjson.JSONDecodeError and json.JSONDecodeError are both ValueErrors
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(items, list):
+        raise ValueError('Invalid body: expected a JSON array or NDJSON')
+    return items
+
+
+class SubmissionQueue:
+    """Bounded queue of validated threats drained in batches by worker threads"""
+
+    def __init__(self, handler, workers=None, batch_size=None, max_queue=None):
+        self.handler = handler  # handler(threats) ingests one batch
+        self.workers = workers or config.SUBMIT_WORKERS
+        self.batch_size = batch_size or config.SUBMIT_WORKER_BATCH
+        self.queue = queue.Queue(maxsize=max_queue or config.SUBMIT_QUEUE_MAX)
+        self.put_lock = threading.Lock()
+        self.threads = []
+        self.metrics_lock = threading.Lock()
+        self.metrics = {
+            'accepted': 0,
+            'rejected': 0,
+            'refusedFull': 0,
+            'processed': 0,
+            'failed': 0,
+            'batches': 0,
+            'lastBatchMs': 0.0,
+            'maxBatchMs': 0.0,
+            'lastBatchAt': None
+        }
+
+    def start(self):
+        """Start the worker threads"""
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work_loop, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        print(f"🔄 Started: Submission Workers ({self.workers} x batch {self.batch_size})")
+
+    # ==================== PRODUCER API ====================
+
+    def submit(self, threats, rejected=0):
+        """
+        Queue a request's threats all or nothing; raises queue.Full when they
+        do not fit, so the caller can answer 503 instead of blocking
+        """
+        with self.put_lock:
+            if self.queue.maxsize - self.queue.qsize() < len(threats):
+                with self.metrics_lock:
+                    self.metrics['refusedFull'] += len(threats)
+                raise queue.Full
+            for threat in threats:
+                self.queue.put_nowait(threat)
+        with self.metrics_lock:
+            self.metrics['accepted'] += len(threats)
+            self.metrics['rejected'] += rejected
+
+    def join(self):
+        """Block until every queued threat has been ingested"""
+        self.queue.join()
+
+    # ==================== WORKERS ====================
+
+    def _work_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            try:
+                self.handler(batch)
+                failed = 0
+            except Exception as e:
+                failed = len(batch)
+                print(f"❌ Error in submission worker ({len(batch)} threats): {e}")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self.metrics_lock:
+                self.metrics['processed'] += len(batch) - failed
+                self.metrics['failed'] += failed
+                self.metrics['batches'] += 1
+                self.metrics['lastBatchMs'] = round(elapsed_ms, 3)
+                self.metrics['maxBatchMs'] = round(max(self.metrics['maxBatchMs'], elapsed_ms), 3)
+                self.metrics['lastBatchAt'] = datetime.now().isoformat()
+            for _ in batch:
+                self.queue.task_done()
+
+    def get_metrics(self):
+        """Snapshot of submission counters and batch latency"""
+        with self.metrics_lock:
+            metrics = dict(self.metrics)
+        metrics['queueDepth'] = self.queue.qsize()
+        metrics['queueCapacity'] = self.queue.maxsize
+        return metrics
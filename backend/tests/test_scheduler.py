@@ -0,0 +1,151 @@
+"""
+Scheduler timing: fixed-rate ticks, the skip and catch-up missed-tick
+policies, no job running alongside itself, and cancel()/stop() taking effect
+at once. Intervals are tens of milliseconds and the tolerances wide, so a
+busy machine does not fail them.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import CATCH_UP, SKIP, Scheduler
+
+INTERVAL = 0.05
+TOLERANCE = 0.03
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(workers=3, name='test')
+    scheduler.start()
+    yield scheduler
+    scheduler.stop(timeout=1)
+
+
+class Recorder:
+    """Job function noting when each run started and ended; run n sleeps durations.get(n, 0)"""
+
+    def __init__(self, durations=None):
+        self.durations = durations or {}
+        self.starts = []
+        self.ends = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            run = len(self.starts)
+            self.starts.append(time.monotonic())
+        time.sleep(self.durations.get(run, 0))
+        with self.lock:
+            self.active -= 1
+            self.ends.append(time.monotonic())
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+def test_ticks_stay_on_the_grid_whatever_the_run_time(scheduler):
+    # Each run takes 60% of the interval; fixed-delay scheduling would drift by that every tick
+    recorder = Recorder({run: INTERVAL * 0.6 for run in range(100)})
+    added = time.monotonic()
+    scheduler.add('grid', recorder, INTERVAL)
+    wait_for(lambda: len(recorder.starts) >= 8)
+
+    for n, started in enumerate(recorder.starts[:8]):
+        assert started - (added + (n + 1) * INTERVAL) == pytest.approx(0, abs=TOLERANCE)
+
+
+def test_skip_drops_missed_ticks_and_resumes_on_the_grid(scheduler):
+    recorder = Recorder({0: INTERVAL * 3.5})  # The first run overlaps three more ticks
+    added = time.monotonic()
+    job = scheduler.add('skip', recorder, INTERVAL, missed=SKIP)
+    wait_for(lambda: len(recorder.starts) >= 3)
+
+    assert job.metrics()['missedTicks'] >= 3
+    assert job.metrics()['backlog'] == 0
+    # The next run waits for the first grid tick after the long one, not for an extra interval
+    resumed = recorder.starts[1]
+    assert resumed >= recorder.ends[0]
+    ticks = (resumed - added) / INTERVAL
+    assert ticks == pytest.approx(round(ticks), abs=TOLERANCE / INTERVAL)
+    assert resumed - recorder.ends[0] < INTERVAL + TOLERANCE
+
+
+def test_catch_up_runs_every_missed_tick_back_to_back(scheduler):
+    recorder = Recorder({0: INTERVAL * 3.5})
+    job = scheduler.add('catch-up', recorder, INTERVAL, missed=CATCH_UP)
+    wait_for(lambda: len(recorder.starts) >= 4)
+
+    assert job.metrics()['missedTicks'] >= 3
+    # The owed runs start as soon as the one before them ends
+    for previous_end, started in zip(recorder.ends[:3], recorder.starts[1:4]):
+        assert started - previous_end < TOLERANCE
+    wait_for(lambda: job.metrics()['backlog'] == 0)
+
+
+@pytest.mark.parametrize('missed', (SKIP, CATCH_UP))
+def test_a_job_never_runs_alongside_itself(scheduler, missed):
+    # Every run outlasts two intervals while idle workers are free to pick up its ticks
+    recorder = Recorder({run: INTERVAL * 2.5 for run in range(100)})
+    scheduler.add('slow', recorder, INTERVAL, missed=missed)
+    wait_for(lambda: len(recorder.starts) >= 4)
+    assert recorder.max_active == 1
+
+
+def test_cancel_stops_further_runs(scheduler):
+    recorder = Recorder()
+    scheduler.add('cancelled', recorder, INTERVAL)
+    wait_for(lambda: len(recorder.starts) >= 2)
+
+    assert scheduler.cancel('cancelled')
+    runs = len(recorder.starts)
+    time.sleep(INTERVAL * 4)
+    assert len(recorder.starts) <= runs + 1  # At most the run already handed to a worker
+    assert not scheduler.cancel('cancelled')
+    assert [job['name'] for job in scheduler.metrics()['jobs']] == []
+
+
+def test_cancel_wakes_the_timer_for_sooner_jobs(scheduler):
+    scheduler.add('hourly', Recorder(), 3600)
+    scheduler.cancel('hourly')
+    recorder = Recorder()
+    added = time.monotonic()
+    scheduler.add('soon', recorder, INTERVAL)
+    wait_for(lambda: recorder.starts, timeout=1)
+    assert recorder.starts[0] - added < INTERVAL + TOLERANCE
+
+
+def test_stop_returns_without_waiting_out_the_interval():
+    scheduler = Scheduler(workers=2, name='test')
+    scheduler.add('hourly', Recorder(), 3600)
+    scheduler.start()
+    started = time.monotonic()
+    scheduler.stop(timeout=5)
+    assert time.monotonic() - started < 0.5
+
+
+def test_stop_gives_up_on_a_long_run_after_the_timeout():
+    scheduler = Scheduler(workers=1, name='test')
+    recorder = Recorder({0: 2})
+    scheduler.add('long', recorder, INTERVAL, delay=0)
+    scheduler.start()
+    wait_for(lambda: recorder.starts)
+    started = time.monotonic()
+    scheduler.stop(timeout=0.2)
+    assert time.monotonic() - started == pytest.approx(0.2, abs=0.15)
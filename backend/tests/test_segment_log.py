@@ -0,0 +1,154 @@
+"""
+Crash recovery of the segment log: reopening a log after a crash keeps every
+whole record, cuts a torn tail, stops at a corrupt sealed segment, remembers
+truncate_before() and refuses a second opener.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segment_log import HEADER, LogLockedError, SegmentLog
+
+SEGMENT_BYTES = 4096
+
+
+def key(number):
+    return f"{number:08d}"
+
+
+def record(number):
+    return key(number), f"payload {number}".encode() * 4
+
+
+def written(directory, count, segment_bytes=SEGMENT_BYTES):
+    """Directory holding count records, closed cleanly"""
+    log = SegmentLog(str(directory), segment_bytes=segment_bytes, index_interval=4)
+    log.append([record(number) for number in range(count)])
+    log.close()
+    return str(directory)
+
+
+def reopened(directory, segment_bytes=SEGMENT_BYTES):
+    return SegmentLog(directory, segment_bytes=segment_bytes, index_interval=4)
+
+
+def segment_paths(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.log'))
+
+
+def test_torn_tail_is_cut_at_the_last_whole_record(tmp_path):
+    directory = written(tmp_path, 10)
+    log = reopened(directory)
+    end = log.segments[-1].end
+    log.close()
+
+    # A crash in the middle of an append: header and half the key of the next record
+    encoded, payload = key(10).encode(), b'lost' * 8
+    torn = HEADER.pack(len(payload), zlib.crc32(encoded + payload), len(encoded)) + encoded[:4]
+    with open(segment_paths(directory)[-1], 'r+b') as f:
+        f.seek(end)
+        f.write(torn)
+
+    log = reopened(directory)
+    assert log.repairs == [(segment_paths(directory)[-1], end)]
+    assert [k for k, _ in log.scan()] == [key(number) for number in range(10)]
+
+    # The torn bytes were zeroed, so the next append lands cleanly and survives another reopen
+    log.append([record(10)])
+    log.close()
+    log = reopened(directory)
+    assert log.repairs == []
+    assert log.last_key() == key(10)
+    assert len(log) == 11
+    log.close()
+
+
+def test_garbage_after_the_tail_is_zeroed(tmp_path):
+    directory = written(tmp_path, 3)
+    log = reopened(directory)
+    end = log.segments[-1].end
+    log.close()
+
+    with open(segment_paths(directory)[-1], 'r+b') as f:
+        f.seek(end + 100)  # Past a gap: a later write that reached disk before an earlier one
+        f.write(b'\xff' * 64)
+
+    log = reopened(directory)
+    assert len(log) == 3
+    log.close()
+    with open(segment_paths(directory)[-1], 'rb') as f:
+        f.seek(end)
+        assert not any(f.read())
+
+
+def test_corrupt_sealed_segment_stops_reads_at_the_damage(tmp_path):
+    directory = written(tmp_path, 200)
+    paths = segment_paths(directory)
+    assert len(paths) > 2
+
+    log = reopened(directory)
+    first = log.segments[0]
+    records_in_first = first.count
+    damaged_offset = first.index_offsets[2]  # Record 8: the index holds every 4th
+    log.close()
+
+    size = os.path.getsize(paths[0])
+    with open(paths[0], 'r+b') as f:
+        f.seek(damaged_offset + HEADER.size + 2)
+        f.write(b'X')
+
+    log = reopened(directory)
+    assert log.repairs == [(paths[0], damaged_offset)]
+    keys = [k for k, _ in log.scan()]
+    # The first segment is readable up to the damaged record; later segments in full
+    assert keys[:8] == [key(number) for number in range(8)]
+    assert key(8) not in keys
+    assert keys[8:] == [key(number) for number in range(records_in_first, 200)]
+    log.close()
+    # A sealed segment is left on disk as it was, for inspection
+    assert os.path.getsize(paths[0]) == size
+
+
+def test_truncate_before_survives_reopen(tmp_path):
+    directory = written(tmp_path, 200)
+    log = reopened(directory)
+    before = segment_paths(directory)
+    assert log.truncate_before(key(120)) == 120
+    after = segment_paths(directory)
+    assert len(after) < len(before)
+    log.close()
+
+    log = reopened(directory)
+    assert log.repairs == []
+    assert len(log) == 80
+    assert log.first_key() == key(120)
+    assert [k for k, _ in log.scan()] == [key(number) for number in range(120, 200)]
+    assert [k for k, _ in log.scan_reverse()][-1] == key(120)
+    assert segment_paths(directory) == after
+    # Retired keys still count as written: appends may not go below them
+    with pytest.raises(ValueError):
+        log.append([record(50)])
+    log.append([record(200)])
+    assert len(log) == 81
+    log.close()
+
+
+def test_second_opener_is_refused_until_the_first_closes(tmp_path):
+    directory = written(tmp_path, 5)
+    log = reopened(directory)
+    with pytest.raises(LogLockedError):
+        reopened(directory)
+    # The refused opener recovered nothing: the records are all still there
+    assert len(log) == 5
+    log.close()
+
+    log = reopened(directory)
+    assert len(log) == 5
+    log.close()
@@ -0,0 +1,74 @@
+"""
+Snapshots of the in-memory stores are point-in-time views: whatever the
+writer does after one is taken, the snapshot keeps returning the same items.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stores import SegmentedStore, LiveWindow
+
+
+def filled(count, segment_size=4, key=None):
+    store = SegmentedStore(key=key, segment_size=segment_size)
+    for item in range(count):
+        store.append(item)
+    return store
+
+
+def test_snapshot_ignores_appends_to_open_segment():
+    store = filled(6)  # The second segment is half full
+    snapshot = store.snapshot()
+    for item in range(6, 20):
+        store.append(item)
+    assert list(snapshot) == list(range(6))
+    assert len(snapshot) == 6
+    assert snapshot[-1] == 5
+
+
+def test_snapshot_ignores_appends_during_iteration():
+    store = filled(6)
+    snapshot = store.snapshot()
+    seen = []
+    for item in snapshot:
+        seen.append(item)
+        store.append(100 + item)
+    assert seen == list(range(6))
+
+
+def test_snapshot_keeps_dropped_items():
+    store = filled(10)
+    snapshot = store.snapshot()
+    store.drop_before(7)
+    assert list(snapshot) == list(range(10))
+    assert list(store.snapshot()) == [7, 8, 9]
+
+
+def test_snapshot_ignores_out_of_order_insert():
+    store = filled(10, key=lambda item: item)
+    snapshot = store.snapshot()
+    store.append(2.5)  # Rebuilds the segments from the insert point (copy-on-write)
+    assert list(snapshot) == list(range(10))
+    assert list(store.snapshot()) == [0, 1, 2, 2.5, 3, 4, 5, 6, 7, 8, 9]
+
+
+def test_snapshot_range_and_newest_are_stable():
+    store = filled(6)
+    snapshot = store.snapshot()
+    store.append(6)
+    assert snapshot.range(4, 10) == [4, 5]
+    assert snapshot.newest(3) == [5, 4, 3]
+
+
+def test_live_window_snapshot_is_immutable():
+    window = LiveWindow(3)
+    for item in range(3):
+        window.append(item)
+    snapshot = window.snapshot()
+    window.append(3)
+    assert snapshot == (0, 1, 2)
+    assert window.snapshot() == (1, 2, 3)
@@ -34,9 +34,22 @@ const LiveThreats = () => {
 
   useEffect(() => {
     fetchThreats();
-    // Auto-refresh every 5 seconds
-    const interval = setInterval(fetchThreats, 5000);
-    return () => clearInterval(interval);
+
+    // Browsers without EventSource fall back to polling every 5 seconds
+    if (typeof EventSource === 'undefined') {
+      const interval = setInterval(fetchThreats, 5000);
+      return () => clearInterval(interval);
+    }
+
+    // Push stream: only new threats arrive; EventSource reconnects with Last-Event-ID
+    const stream = new EventSource(`${API_BASE}/stream`);
+    stream.addEventListener('threat', (event) => {
+      const threat = JSON.parse(event.data);
+      setThreats((current) => [threat, ...current.filter((t) => t.threatId !== threat.threatId)].slice(0, 10));
+    });
+    // Missed events could not be replayed, so reload the full list
+    stream.addEventListener('resync', fetchThreats);
+    return () => stream.close();
   }, []);
 
   const handleInputChange = (e) => {